@@ -0,0 +1,287 @@
+"""
+Makes synthetic data for the benchmarks, in the same files and with the same columns as the sample data in data/, but at
+any scale: any number of months, any number of CCG-level geographies (with regions and STPs to match), and as many
+appointments rows as you like.
+
+The appointments file has the daily breakdowns used by Tables 2a to 2d, with a row per category per day, and the
+geography breakdowns used by Tables 3a to 3d, with a row per category per area. To reach the number of rows asked for,
+the geography breakdowns are given a row per day as well as per area, for as many days as it takes; the real data is
+split the same way before it is summarised. The number of rows asked for is therefore a target: the file is never
+smaller than the daily breakdowns and one day of the geography breakdowns, nor bigger than every day of both.
+
+Table 1's data is written for each month, with the same rows as the sample file, so that it matches the template's tags.
+
+Run it from the root of the repo, for example:
+
+    python -m benchmarks.generate_data benchmarks/data/example --rows 1000000 --geographies 1000 --months 36
+
+and read the data from there by setting the PUBLICATION_DATA_DIR environment variable (see config.get_data_dir()).
+"""
+import argparse
+import json
+import math
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import config
+import utils
+
+# The columns of the appointments file, in the same order as the sample file
+appointments_columns = [
+    "appt_date",
+    "geog_name",
+    "geog_code",
+    "time_between_booking_and_appt",
+    "geog_ons_code",
+    "weekday",
+    "breakdown",
+    "appt_mode",
+    "appt_count",
+    "hcp_type",
+    "appt_status",
+    "geog_type",
+]
+
+# The level of geography each geography breakdown is for, by the start of its name
+breakdown_levels = {
+    "national_count": "National",
+    "by_region": "Region",
+    "by_stp": "STP",
+    "by_ccg": "CCG",
+}
+
+# The number of regions, and the number of STPs for each CCG, as in the sample data
+number_of_regions = 7
+stps_per_ccg = 42 / 106
+
+# The largest number of rows written to the appointments file at once
+chunk_rows = 1_000_000
+
+sample_table1_path = Path("data/table1_data.csv")
+
+
+def get_dates(months: int) -> pd.DatetimeIndex:
+    """
+    Gives every day in the given number of months, up to the end of the report month.
+    """
+    report_month = pd.Timestamp(config.get_report_month())
+    first_month = report_month - pd.DateOffset(months=months - 1)
+    return pd.date_range(first_month, report_month + pd.offsets.MonthEnd(0), freq="D")
+
+
+def make_geographies(geographies: int) -> pd.DataFrame:
+    """
+    Makes the areas at each level of geography: England, the regions, and the given number of CCGs, with STPs to match.
+
+    Returns:
+        pd.DataFrame: A row for each area, with its geog_type, geog_name, geog_code and geog_ons_code
+    """
+    stps = max(1, round(geographies * stps_per_ccg))
+    levels = [
+        ("National", 1, lambda n: "England", lambda n: "ENG", lambda n: "ENG"),
+        ("Region", number_of_regions, lambda n: f"Region {n}", lambda n: f"Y{n:02d}", lambda n: f"E40{n:06d}"),
+        ("STP", stps, lambda n: f"STP {n}", lambda n: f"QS{n:04d}", lambda n: f"E54{n:06d}"),
+        ("CCG", geographies, lambda n: f"NHS CCG {n}", lambda n: f"C{n:05d}", lambda n: f"E38{n:06d}"),
+    ]
+    rows = [
+        {"geog_type": level, "geog_name": name(n), "geog_code": code(n), "geog_ons_code": ons_code(n)}
+        for level, count, name, code, ons_code in levels
+        for n in range(1, count + 1)
+    ]
+    return pd.DataFrame(rows)
+
+
+def make_practices_data(df_geographies: pd.DataFrame, rng: np.random.Generator) -> pd.DataFrame:
+    """
+    Makes the practices data: a row for each area, with its practice counts and list size.
+    """
+    breakdowns = {"National": "national_counts_by_geog", "Region": "by_region", "STP": "by_stp", "CCG": "by_ccg"}
+    df = df_geographies.copy()
+    df["breakdown"] = df["geog_type"].map(breakdowns)
+    df["count_of_open_practice"] = rng.integers(5, 100, len(df))
+    df["count_of_included_practice"] = (df["count_of_open_practice"] * rng.uniform(0.6, 1, len(df))).astype(int)
+    df["patient_list_size"] = df["count_of_open_practice"] * rng.integers(5_000, 12_000, len(df))
+    return df[
+        [
+            "geog_name",
+            "count_of_included_practice",
+            "count_of_open_practice",
+            "geog_code",
+            "patient_list_size",
+            "geog_ons_code",
+            "breakdown",
+            "geog_type",
+        ]
+    ]
+
+
+def make_daily_rows(dates: pd.DatetimeIndex) -> pd.DataFrame:
+    """
+    Makes one row per category per day for each of the daily breakdowns in utils.daily_tables, and one per day for
+    the 'by_date' breakdown, without counts.
+    """
+    splits = [("by_date", None, ["ALL"])]
+    splits += [(table["breakdown"], table["column"], table["categories"]) for table in utils.daily_tables.values()]
+
+    blocks = []
+    for breakdown, column, categories in splits:
+        block = pd.DataFrame(
+            {
+                "appt_date": np.repeat(dates.strftime("%Y-%m-%d"), len(categories)),
+                "weekday": np.repeat(dates.strftime("%a"), len(categories)),
+                "breakdown": breakdown,
+            }
+        )
+        if column is not None:
+            block[column] = np.tile(categories, len(dates))
+        blocks.append(block)
+    return pd.concat(blocks, ignore_index=True).reindex(columns=appointments_columns).fillna("ALL")
+
+
+def make_geography_rows(df_geographies: pd.DataFrame) -> pd.DataFrame:
+    """
+    Makes one row per category per area for each of the geography breakdowns in utils.geography_tables, and one per
+    area for the breakdowns by area alone ('by_ccg' and so on), without dates or counts.
+    """
+    splits = [(breakdown, None, ["ALL"]) for breakdown in breakdown_levels]
+    splits += [
+        (breakdown, table["column"], table["categories"])
+        for table in utils.geography_tables.values()
+        for breakdown in table["breakdowns"]
+    ]
+
+    blocks = []
+    for breakdown, column, categories in splits:
+        level = next(level for prefix, level in breakdown_levels.items() if breakdown.startswith(prefix))
+        areas = df_geographies[df_geographies["geog_type"] == level]
+        block = areas.loc[areas.index.repeat(len(categories))].reset_index(drop=True)
+        block["breakdown"] = breakdown
+        if column is not None:
+            block[column] = np.tile(categories, len(areas))
+        else:
+            block["geog_type"] = "ALL"
+        blocks.append(block)
+    return pd.concat(blocks, ignore_index=True).reindex(columns=appointments_columns).fillna("ALL")
+
+
+def write_appointments_data(
+    filepath: Path, dates: pd.DatetimeIndex, df_geographies: pd.DataFrame, rows: int, rng: np.random.Generator
+) -> int:
+    """
+    Writes the appointments data, a chunk at a time. The geography rows are repeated for as many days as it takes to
+    reach the given number of rows.
+
+    Returns:
+        int: The number of rows written
+    """
+    df_daily = make_daily_rows(dates)
+    df_daily["appt_count"] = rng.integers(1_000, 200_000, len(df_daily))
+    df_daily.to_csv(filepath, index=False)
+
+    df_geography = make_geography_rows(df_geographies)
+    geography_days = math.ceil(max(rows - len(df_daily), 0) / len(df_geography))
+    geography_days = min(max(geography_days, 1), len(dates))
+    days_per_chunk = max(1, chunk_rows // len(df_geography))
+    for start in range(0, geography_days, days_per_chunk):
+        chunk_dates = dates[start : min(start + days_per_chunk, geography_days)]
+        chunk = df_geography.iloc[np.tile(np.arange(len(df_geography)), len(chunk_dates))].copy()
+        chunk["appt_date"] = np.repeat(chunk_dates.strftime("%Y-%m-%d"), len(df_geography))
+        chunk["weekday"] = np.repeat(chunk_dates.strftime("%a"), len(df_geography))
+        chunk["appt_count"] = rng.integers(10, 20_000, len(chunk))
+        chunk.to_csv(filepath, mode="a", header=False, index=False)
+    return len(df_daily) + geography_days * len(df_geography)
+
+
+def make_table1_data(months: int, rng: np.random.Generator) -> pd.DataFrame:
+    """
+    Makes Table 1's data: the same rows as the sample file, with a value for each month up to the report month.
+    Percentages are between 0 and 1; everything else is a count.
+    """
+    df_keys = pd.read_csv(sample_table1_path, usecols=["breakdown_1", "breakdown_2", "breakdown_3"])
+    report_month = pd.Timestamp(config.get_report_month())
+    month_names = [(report_month - pd.DateOffset(months=n)).strftime("%b-%y") for n in range(months)]
+    is_percent = (df_keys["breakdown_3"] == "percent").to_numpy()[:, None]
+    values = np.where(
+        is_percent,
+        rng.uniform(0, 1, (len(df_keys), months)),
+        rng.integers(1_000, 30_000_000, (len(df_keys), months)),
+    )
+    return pd.concat([df_keys, pd.DataFrame(values, columns=month_names)], axis=1)
+
+
+def make_easy_data(dates: pd.DatetimeIndex, categories: list, rng: np.random.Generator) -> pd.DataFrame:
+    """
+    Makes the data for one of the easy project's sheets: a count for each category on each day, and their total.
+    """
+    df = pd.DataFrame({"appt_date": dates.strftime("%d/%b/%y")})
+    for category in categories:
+        df[category] = rng.integers(100, 500_000, len(dates))
+    df["total"] = df[categories].sum(axis=1)
+    df["weekday"] = dates.strftime("%a")
+    return df
+
+
+def generate_data(data_dir: Path, rows: int, geographies: int, months: int, seed: int = 0) -> dict:
+    """
+    Writes a full set of synthetic data files to a folder, along with a 'parameters.json' file describing them.
+
+    Args:
+        data_dir (Path): The folder to write to
+        rows (int): The number of appointments rows to aim for
+        geographies (int): The number of CCG-level areas
+        months (int): The number of months of data, up to the report month. This should be at least
+            config.get_number_of_months().
+        seed (int, optional): The seed for the random counts. Defaults to 0.
+
+    Returns:
+        dict: The parameters the data was made with, and the number of rows in each file
+    """
+    data_dir = Path(data_dir)
+    data_dir.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    dates = get_dates(months)
+    df_geographies = make_geographies(geographies)
+
+    df_practices = make_practices_data(df_geographies, rng)
+    df_practices.to_csv(data_dir / "practices_data.csv", index=False)
+    appointments_rows = write_appointments_data(
+        data_dir / "appointment_data.csv", dates, df_geographies, rows, rng
+    )
+    df_table1 = make_table1_data(months, rng)
+    df_table1.to_csv(data_dir / "table1_data.csv", index=False)
+    make_easy_data(dates, utils.daily_tables["Table 2a"]["categories"], rng).to_csv(
+        data_dir / "data_for_sheet_easy_a.csv"
+    )
+    make_easy_data(dates, utils.daily_tables["Table 2b"]["categories"], rng).to_csv(
+        data_dir / "data_for_sheet_easy_b.csv"
+    )
+
+    parameters = {
+        "parameters": {"rows": rows, "geographies": geographies, "months": months, "seed": seed},
+        "file_rows": {
+            "appointment_data.csv": appointments_rows,
+            "practices_data.csv": len(df_practices),
+            "table1_data.csv": len(df_table1),
+            "data_for_sheet_easy_a.csv": len(dates),
+            "data_for_sheet_easy_b.csv": len(dates),
+        },
+    }
+    (data_dir / "parameters.json").write_text(json.dumps(parameters, indent=2))
+    return parameters
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Make synthetic data files for the benchmarks.")
+    parser.add_argument("data_dir", type=Path, help="The folder to write the data files to.")
+    parser.add_argument("--rows", type=int, default=100_000, help="The number of appointments rows to aim for.")
+    parser.add_argument("--geographies", type=int, default=106, help="The number of CCG-level areas.")
+    parser.add_argument("--months", type=int, default=12, help="The number of months of data.")
+    parser.add_argument("--seed", type=int, default=0, help="The seed for the random counts.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    print(json.dumps(generate_data(args.data_dir, args.rows, args.geographies, args.months, args.seed), indent=2))
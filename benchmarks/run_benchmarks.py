@@ -0,0 +1,281 @@
+"""
+Times each stage of building the example projects on synthetic data, at one or more scales, and writes the timings as JSON
+so that runs can be compared from one release to the next.
+
+For each scale, a full set of data files is made with generate_data.py (or re-used, if the same data has been made before)
+and read through config.get_data_dir(). Then, for each project, these stages are timed:
+    - load: reading the data files the project uses,
+    - prepare: making each table, one at a time, by sheet name,
+    - load_template: loading the template with openpyxl,
+    - write: writing each table to the workbook, by sheet name,
+    - save: saving the workbook.
+With the streaming output engine (see config.get_output_engine()), the workbook is written and saved in one pass, which
+is timed as 'write_and_save' instead of the last three stages. Tables are always made afresh, whatever the frame cache
+and incremental build settings. With --repeat, each stage's fastest time is kept.
+
+Run it from the root of the repo, for example:
+
+    python -m benchmarks.run_benchmarks --rows 10000 1000000 --geographies 1000 --months 36
+
+Passing --baseline with an earlier results file lists every stage which has got slower by more than --tolerance,
+and exits with an error if there are any.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import openpyxl
+import pandas as pd
+
+import config
+import stream_writer
+import utils
+from benchmarks import generate_data
+from templates.advanced_project import advanced_project, table_1
+from templates.easy_project import easy_project
+from templates.medium_project import medium_project
+
+projects = {
+    "easy": easy_project,
+    "medium": medium_project,
+    "advanced": advanced_project,
+}
+
+# The data each project reads, timed as its 'load' stage
+project_data = {
+    "easy": [config.get_easy_a_data, config.get_easy_b_data],
+    "medium": [config.get_appointments_data, config.get_practices_data, config.get_table1_data],
+    "advanced": [config.get_appointments_data, config.get_practices_data, config.get_table1_data],
+}
+
+# Slowdowns of less than this many seconds are never reported as regressions, however large they are relative to the baseline
+noise_seconds = 0.05
+
+data_root = Path("benchmarks/data")
+
+
+def get_data_dir(rows: int, geographies: int, months: int, seed: int) -> Path:
+    """
+    Gives the folder for the data at a scale, making the data first if it isn't already there.
+    """
+    data_dir = data_root / f"rows_{rows}_geographies_{geographies}_months_{months}_seed_{seed}"
+    parameters = {"rows": rows, "geographies": geographies, "months": months, "seed": seed}
+    parameters_path = data_dir / "parameters.json"
+    if not parameters_path.exists() or json.loads(parameters_path.read_text())["parameters"] != parameters:
+        generate_data.generate_data(data_dir, rows, geographies, months, seed)
+    return data_dir
+
+
+def write_sheet(wb: openpyxl.Workbook, sheet_name: str, table) -> openpyxl.Workbook:
+    if sheet_name == "Table 1":
+        return table_1.write_table1(wb=wb, table1_values=table)
+    return utils.write_tables(wb=wb, tables={sheet_name: table})
+
+
+def benchmark_project(project_name: str, output_dir: Path) -> dict:
+    """
+    Builds one project, timing each of its stages.
+
+    Args:
+        project_name (str): The project, from `projects`
+        output_dir (Path): The folder to write the output file to
+
+    Returns:
+        dict: The number of seconds each stage took, by stage, and by sheet name within the prepare and write stages
+    """
+    project = projects[project_name]
+    output_path = output_dir / f"{project_name}_output.xlsx"
+    stages = {}
+    config.clear_data_cache()
+
+    start = time.perf_counter()
+    for get_data in project_data[project_name]:
+        get_data()
+    stages["load"] = time.perf_counter() - start
+
+    tables, stages["prepare"] = utils.prepare_tables(project.get_table_makers(), workers=1)
+
+    if config.get_output_engine() == "streaming":
+        start = time.perf_counter()
+        tag_values = {"Table 1": tables.pop("Table 1")} if "Table 1" in tables else None
+        stream_writer.write_workbook(
+            template_path=project.template_path, output_path=output_path, tables=tables, tag_values=tag_values
+        )
+        stages["write_and_save"] = time.perf_counter() - start
+        return stages
+
+    start = time.perf_counter()
+    wb = openpyxl.load_workbook(project.template_path)
+    stages["load_template"] = time.perf_counter() - start
+
+    stages["write"] = {}
+    for sheet_name, table in tables.items():
+        start = time.perf_counter()
+        wb = write_sheet(wb, sheet_name, table)
+        stages["write"][sheet_name] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    wb.save(output_path)
+    stages["save"] = time.perf_counter() - start
+    return stages
+
+
+def keep_fastest(first: dict, second: dict) -> dict:
+    """
+    Combines the stage timings of two runs, keeping the fastest time for each stage.
+    """
+    return {
+        stage: keep_fastest(seconds, second[stage]) if isinstance(seconds, dict) else min(seconds, second[stage])
+        for stage, seconds in first.items()
+    }
+
+
+def get_total(stages: dict) -> float:
+    return sum(get_total(seconds) if isinstance(seconds, dict) else seconds for seconds in stages.values())
+
+
+def run_benchmarks(
+    rows_list: list, geographies: int, months: int, project_names: list, repeat: int = 1, seed: int = 0
+) -> dict:
+    """
+    Times every stage of each project, at each scale.
+
+    Args:
+        rows_list (list): The numbers of appointments rows to time the projects at
+        geographies (int): The number of CCG-level areas in the data
+        months (int): The number of months of data
+        project_names (list): The projects to time, from `projects`
+        repeat (int, optional): The number of times to build each project, keeping the fastest time for each stage.
+            Defaults to 1.
+        seed (int, optional): The seed for the synthetic data. Defaults to 0.
+
+    Returns:
+        dict: The results, ready to be written as JSON
+    """
+    results = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "environment": {
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "openpyxl": openpyxl.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "output_engine": config.get_output_engine(),
+        "scales": [],
+    }
+    data_dir_variable = "PUBLICATION_DATA_DIR"
+    previous_data_dir = os.environ.get(data_dir_variable)
+    try:
+        for rows in rows_list:
+            data_dir = get_data_dir(rows, geographies, months, seed)
+            os.environ[data_dir_variable] = str(data_dir)
+            scale = json.loads((data_dir / "parameters.json").read_text())
+            scale["label"] = f"{rows}_rows"
+            scale["projects"] = {}
+            for project_name in project_names:
+                with tempfile.TemporaryDirectory() as output_dir:
+                    stages = benchmark_project(project_name, Path(output_dir))
+                    for _ in range(repeat - 1):
+                        stages = keep_fastest(stages, benchmark_project(project_name, Path(output_dir)))
+                scale["projects"][project_name] = {"stages": stages, "total": get_total(stages)}
+                print(f"{scale['label']}, {project_name} project: {scale['projects'][project_name]['total']:.2f}s")
+            results["scales"].append(scale)
+    finally:
+        if previous_data_dir is None:
+            os.environ.pop(data_dir_variable, None)
+        else:
+            os.environ[data_dir_variable] = previous_data_dir
+        config.clear_data_cache()
+    return results
+
+
+def flatten_timings(results: dict) -> dict:
+    """
+    Lists every timing in a set of results, keyed by 'scale/project/stage', with the sheet name after the stage where
+    there is one.
+    """
+    timings = {}
+
+    def add_timings(prefix: str, stages: dict) -> None:
+        for stage, seconds in stages.items():
+            if isinstance(seconds, dict):
+                add_timings(f"{prefix}/{stage}", seconds)
+            else:
+                timings[f"{prefix}/{stage}"] = seconds
+
+    for scale in results["scales"]:
+        for project_name, project_results in scale["projects"].items():
+            add_timings(f"{scale['label']}/{project_name}", project_results["stages"])
+            timings[f"{scale['label']}/{project_name}/total"] = project_results["total"]
+    return timings
+
+
+def find_regressions(results: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Compares a set of results with an earlier one.
+
+    Args:
+        results (dict): The results of this run
+        baseline (dict): The results to compare against
+        tolerance (float): How much slower, as a fraction, a stage can be than in the baseline before it's reported
+
+    Returns:
+        list: A (timing, baseline seconds, seconds) tuple for each timing which has got slower
+    """
+    timings = flatten_timings(results)
+    baseline_timings = flatten_timings(baseline)
+    return [
+        (name, baseline_timings[name], seconds)
+        for name, seconds in timings.items()
+        if name in baseline_timings
+        and seconds > baseline_timings[name] * (1 + tolerance)
+        and seconds - baseline_timings[name] > noise_seconds
+    ]
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Time each stage of building the example projects on synthetic data.")
+    parser.add_argument(
+        "--rows", type=int, nargs="+", default=[10_000, 1_000_000], help="The numbers of appointments rows to time at."
+    )
+    parser.add_argument("--geographies", type=int, default=106, help="The number of CCG-level areas.")
+    parser.add_argument("--months", type=int, default=12, help="The number of months of data.")
+    parser.add_argument("--seed", type=int, default=0, help="The seed for the synthetic data.")
+    parser.add_argument(
+        "--projects", nargs="+", default=list(projects), help=f"The projects to time, from {', '.join(projects)}."
+    )
+    parser.add_argument("--repeat", type=int, default=1, help="The number of times to build each project.")
+    parser.add_argument(
+        "--output", type=Path, default=Path("benchmarks/results/latest.json"), help="The file to write the results to."
+    )
+    parser.add_argument("--baseline", type=Path, default=None, help="An earlier results file to compare against.")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.2, help="How much slower a stage can get before it is reported, as a fraction."
+    )
+    args = parser.parse_args()
+    unknown_projects = [project_name for project_name in args.projects if project_name not in projects]
+    if unknown_projects:
+        parser.error(f"unknown project(s): {', '.join(unknown_projects)}")
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    results = run_benchmarks(args.rows, args.geographies, args.months, args.projects, args.repeat, args.seed)
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(results, indent=2))
+    print(f"Results written to {args.output}")
+
+    if args.baseline is not None:
+        regressions = find_regressions(results, json.loads(args.baseline.read_text()), args.tolerance)
+        for name, baseline_seconds, seconds in regressions:
+            print(f"Slower: {name} took {seconds:.3f}s, against {baseline_seconds:.3f}s in the baseline")
+        if regressions:
+            sys.exit(1)
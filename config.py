@@ -1,5 +1,10 @@
+import contextlib
 import datetime
+import hashlib
+import os
+import threading
 from pathlib import Path
+import numpy
 import pandas
 
 """
@@ -14,22 +19,448 @@ def get_report_month():
 def get_number_of_months():
     return 12
 
+# The folder the data files are read from. Set the PUBLICATION_DATA_DIR environment variable to read them from
+# somewhere else, such as the synthetic data made by the benchmarks (see benchmarks/generate_data.py).
+def get_data_dir():
+    return Path(os.environ.get("PUBLICATION_DATA_DIR", "data"))
+
+# The engine used to write the output Excel files: 'openpyxl', which loads the whole template into memory, or 'streaming',
+# which writes the output a row at a time (see stream_writer.py) and suits publications with very large tables.
+def get_output_engine():
+    return "openpyxl"
+
+# The number of projects main.py builds at once, each in its own process. Set this to 1 to build them one after another.
+def get_max_workers():
+    return os.cpu_count() or 1
+
+# The number of tables each project makes at once, and whether they are made in threads ('thread') or processes ('process').
+# Threads share the data read in by each other; processes each read the data for themselves, but don't compete for Python's GIL.
+def get_table_workers():
+    return 4
+
+def get_table_executor():
+    return "thread"
+
+# Set this to return True to load each project's template in a background thread while its tables are being made, rather
+# than once they are finished (see utils.start_loading_template()). Only the openpyxl output engine loads the template.
+# On a single core, the two only compete with each other, so this is off there.
+def load_template_in_background():
+    return (os.cpu_count() or 1) > 1
+
+# Set this to return True to print how long each table took to make
+def report_table_timings():
+    return False
+
+# Each project built by main.py writes a run report to the folder below: the time, CPU time and memory each stage of the
+# build took, and the rows and cells it wrote (see instrumentation.py). Set trace_memory to return True to also measure
+# the memory Python allocates in each stage with tracemalloc, which is more precise but slows the build down.
+def write_run_reports():
+    return True
+
+def get_run_report_dir():
+    return Path('outputs/.run_reports')
+
+def trace_memory():
+    return False
+
+# Profiles made with `python main.py <project> --profile` are written to the folder below (see profiling.py).
+# The sampling profiler looks at the build's stack this often, in seconds.
+def get_profile_dir():
+    return Path('outputs/profiles')
+
+def get_sampling_interval():
+    return 0.005
+
+# Set this to return True to keep each finished table in the frame cache below, and re-use it - in this or any other project -
+# for as long as the data it read, the code which made it and the report month are unchanged. Once the cache is bigger than
+# the given size, the tables used least recently are deleted. The cache is kept under outputs rather than with the data,
+# so the data folder can be read-only or shared.
+def use_frame_cache():
+    return False
+
+def get_frame_cache_dir():
+    return Path('outputs/.frame_cache')
+
+def get_frame_cache_max_bytes():
+    return 512 * 1024 * 1024
+
+# Set this to return True to build incrementally: tables are made through the frame cache, and if nothing in a project
+# has changed since its last run, its output file is not re-written at all. What each project last wrote is kept in the folder below.
+def use_incremental_build():
+    return False
+
+def get_build_state_dir():
+    return Path('outputs/.build_state')
+
+# Set this to return True to keep a compiled copy of each template in the folder below, which loads several times faster
+# than the template itself, and use it for as long as the template is unchanged (see template_cache.py).
+def use_template_cache():
+    return False
+
+def get_template_cache_dir():
+    return Path('outputs/.template_cache')
+
+# Schemas for the larger data sources. Only the listed columns are read in, with the given types;
+# the dimension columns are read as categoricals, which are much smaller in memory than strings and faster to filter and pivot on.
+# Date columns are parsed with the given format, and any entries which are not dates (such as 'ALL') become missing values.
+# If you need another column from one of these files, add it here.
+appointments_schema = {
+    "dtype": {
+        "breakdown": "category",
+        "geog_name": "category",
+        "geog_code": "category",
+        "geog_ons_code": "category",
+        "appt_status": "category",
+        "appt_mode": "category",
+        "hcp_type": "category",
+        "time_between_booking_and_appt": "category",
+        "appt_count": "int64",
+    },
+    "dates": {"appt_date": "%Y-%m-%d"},
+}
+
+practices_schema = {
+    "dtype": {
+        "geog_type": "category",
+        "geog_code": "str",
+        "geog_ons_code": "str",
+        "count_of_open_practice": "int32",
+        "count_of_included_practice": "int32",
+        "patient_list_size": "int64",
+    },
+    "dates": {},
+}
+
+# CSV files can be converted to Parquet the first time they are read, and the Parquet copy read on later runs instead.
+# The copies are kept in the folder below, named after a hash of the CSV file and schema, so a changed file is always re-read.
+# Reading and writing Parquet requires the pyarrow package to be installed.
+def use_columnar_cache():
+    return False
+
+def get_columnar_cache_dir():
+    return get_data_dir() / '.columnar_cache'
+
+def get_file_hash(filepath: Path) -> str:
+    """
+    Hashes the contents of a file, reading it in blocks so that large files are not held in memory.
+    """
+    file_hash = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            file_hash.update(block)
+    return file_hash.hexdigest()
+
+def apply_schema(df: pandas.DataFrame, schema: dict) -> pandas.DataFrame:
+    """
+    Gives an already-loaded frame the column types from the schema, parsing any date columns which are not yet dates.
+    """
+    df = df.astype(schema["dtype"])
+    for column, date_format in schema["dates"].items():
+        if not pandas.api.types.is_datetime64_any_dtype(df[column]):
+            df[column] = pandas.to_datetime(df[column], format=date_format, errors="coerce")
+    return df
+
+# The parser used for CSV files with a schema: 'pandas', pandas' own single-threaded parser, or 'pyarrow', Arrow's CSV
+# reader, which parses on every core and suits large files such as the appointments data. Either way, only the schema's
+# columns are read, with its types. Files without a schema are always read with pandas, as the tables rely on how it names
+# and types their columns. The pyarrow reader requires the pyarrow package.
+# With the pyarrow reader, set get_csv_dtype_backend to return 'pyarrow' to keep the columns Arrow-backed rather than
+# converting them to NumPy. This requires pandas 2.0 or later, newer than the version in requirements.txt, so upgrade pandas
+# first (pip install "pandas>=2.0" pyarrow); reading raises an error on older versions.
+def get_csv_reader():
+    return "pandas"
+
+def get_csv_dtype_backend():
+    return "numpy"
+
+def read_csv_with_schema(filepath: Path, schema: dict = None) -> pandas.DataFrame:
+    """
+    Reads a CSV file, applying the column selection and types given in the schema if there is one.
+    """
+    if schema is None:
+        return pandas.read_csv(filepath)
+    options = {"usecols": list(schema["dtype"]) + list(schema["dates"]), "dtype": schema["dtype"]}
+    if get_csv_reader() == "pyarrow":
+        # Arrow works out the types of date columns for itself, so they are read as text and parsed below, as with pandas
+        options.update(dtype={**schema["dtype"], **{column: "str" for column in schema["dates"]}}, engine="pyarrow")
+        if get_csv_dtype_backend() == "pyarrow":
+            if int(pandas.__version__.split(".")[0]) < 2:
+                raise RuntimeError(
+                    f"get_csv_dtype_backend() is 'pyarrow', which needs pandas 2.0 or later, but pandas "
+                    f"{pandas.__version__} is installed. Upgrade pandas, or set get_csv_dtype_backend() to return 'numpy'."
+                )
+            options["dtype_backend"] = "pyarrow"
+    df = pandas.read_csv(filepath, **options)
+    for column, date_format in schema["dates"].items():
+        df[column] = pandas.to_datetime(df[column], format=date_format, errors="coerce")
+    return df
+
+def read_csv_via_columnar_cache(filepath: Path, schema: dict = None) -> pandas.DataFrame:
+    """
+    Reads a CSV file from its Parquet copy in the columnar cache, making the copy first if there isn't one yet.
+    """
+    cache_key = hashlib.sha256((get_file_hash(filepath) + repr(schema)).encode()).hexdigest()
+    cache_path = get_columnar_cache_dir() / f"{filepath.stem}-{cache_key[:16]}.parquet"
+    if cache_path.exists():
+        return pandas.read_parquet(cache_path)
+
+    df = read_csv_with_schema(filepath, schema)
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    # Write to a temporary file first, so that a build running alongside this one never reads a half-written copy
+    temporary_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+    df.to_parquet(temporary_path, index=False)
+    os.replace(temporary_path, cache_path)
+    return df
+
+def read_data_file(filepath: Path, schema: dict = None) -> pandas.DataFrame:
+    """
+    Reads a data file in any of the supported formats: CSV, Parquet (.parquet) or Feather (.feather).
+    Only the columns in the schema are read from columnar files, and they are given the schema's types.
+    """
+    suffix = filepath.suffix.lower()
+    if suffix in (".parquet", ".feather"):
+        columns = None if schema is None else list(schema["dtype"]) + list(schema["dates"])
+        if suffix == ".parquet":
+            df = pandas.read_parquet(filepath, columns=columns)
+        else:
+            df = pandas.read_feather(filepath, columns=columns)
+        return df if schema is None else apply_schema(df, schema)
+    if use_columnar_cache():
+        return read_csv_via_columnar_cache(filepath, schema)
+    return read_csv_with_schema(filepath, schema)
+
+# Each data source is parsed once per run, and then re-used by every sheet which needs it.
+# Entries are keyed by file path, and are re-read if the file's modification time or size changes.
+# The cache's lock is only held to find or add an entry. Each entry has its own lock, held while the file is parsed or
+# grouped, which stops tables being made in different threads from reading the same file at the same time, while still
+# letting them read different files at once.
+_data_cache = {}
+_data_cache_lock = threading.Lock()
+
+def get_cache_entry(key, filepath: Path, **fields) -> dict:
+    """
+    Fetches the cache entry under a key for a data file, replacing it with a new entry holding the given fields if there
+    isn't one yet or the file has changed since it was made.
+    """
+    stat = filepath.stat()
+    file_stamp = (stat.st_mtime_ns, stat.st_size)
+    with _data_cache_lock:
+        entry = _data_cache.get(key)
+        if entry is None or entry["file_stamp"] != file_stamp:
+            entry = {"file_stamp": file_stamp, "lock": threading.Lock(), **fields}
+            _data_cache[key] = entry
+    return entry
+
+def load_data_source(filepath: Path, schema: dict = None) -> dict:
+    """
+    Fetches the cache entry for a data file, parsing the file if it has not been read yet or has changed since.
+    The entry holds the parsed data, and any partitions of it which have been built so far.
+    """
+    entry = get_cache_entry(filepath, filepath, data=None, partitions={})
+    with entry["lock"]:
+        if entry["data"] is None:
+            entry["data"] = read_data_file(filepath, schema)
+    return entry
+
+# While a table is being made, the data it reads can be recorded, so that a later run can tell whether it needs remaking.
+# Each thread records its own reads. Entries are keyed by (file path, column, values) - with no column for a whole file -
+# and hold the schema the file was read with.
+_input_recorder = threading.local()
+
+@contextlib.contextmanager
+def record_data_inputs():
+    """
+    Records every data file, or partition of one, read in this thread within the `with` block.
+    """
+    previous_inputs = getattr(_input_recorder, "inputs", None)
+    _input_recorder.inputs = {}
+    try:
+        yield _input_recorder.inputs
+    finally:
+        _input_recorder.inputs = previous_inputs
+
+def record_data_input(filepath: Path, schema: dict, column: str = None, values=None):
+    inputs = getattr(_input_recorder, "inputs", None)
+    if inputs is not None:
+        values = None if values is None else tuple(sorted(values))
+        inputs[(str(filepath), column, values)] = schema
+
+def read_data_source(filepath: Path, schema: dict = None) -> pandas.DataFrame:
+    """
+    Reads a data file, using the parsed copy from earlier in the run if the file has not changed since.
+    Callers are given their own copy of the data, so the cached version cannot be modified by any one sheet.
+    """
+    record_data_input(filepath, schema)
+    return load_data_source(filepath, schema)["data"].copy()
+
+# Set this to return True to read the appointments file in chunks of the given number of rows, rather than all at once.
+# Only the rows for the breakdowns asked for are kept, and as each chunk is read they are summed over every column the
+# tables don't use (such as the date, for tables by geography), so only these sums are ever held in memory.
+# Every read planned ahead with plan_partition_reads() is gathered in the same pass through the file.
+def use_chunked_reading():
+    return False
+
+def get_read_chunk_rows():
+    return 1_000_000
+
+# The reads planned for each file, as {file path: set of (column, values, columns, value column)}, which the next
+# chunked pass through the file gathers along with the one it was started for
+_read_plans = {}
+
+def get_aggregate_key(column: str, values, columns: list, value_column: str) -> tuple:
+    return (column, tuple(sorted(values)), tuple(columns), value_column)
+
+def plan_partition_reads(filepath: Path, reads: list) -> None:
+    """
+    Plans reads of a file in chunked mode, so that they are all gathered in one pass through the file.
+
+    Args:
+        filepath (Path): The file to be read
+        reads (list): The reads, as (column, values, columns, value column) - see read_data_aggregate()
+    """
+    with _data_cache_lock:
+        _read_plans.setdefault(filepath, set()).update(get_aggregate_key(*read) for read in reads)
+
+def sum_rows(df: pandas.DataFrame, column: str, columns: list, value_column: str) -> pandas.Series:
+    """
+    Sums `value_column` over every column but `column` and `columns`, keeping the groups in the order they first appear.
+    """
+    return df.groupby([column, *columns], observed=True, dropna=False, sort=False)[value_column].sum()
+
+def aggregate_csv_in_chunks(filepath: Path, schema: dict, keys: set) -> dict:
+    """
+    Reads a CSV file a chunk at a time, summing the rows for each read as it goes.
+
+    Args:
+        filepath (Path): The CSV file
+        schema (dict): The schema to read it with
+        keys (set): The reads, as made by get_aggregate_key()
+
+    Returns:
+        dict: The sums for each read, by key, with the partition column first, then the columns asked for, and then
+            the summed value column
+    """
+    chunk_rows = get_read_chunk_rows()
+    partial_sums = {key: [] for key in keys}
+    # Every value seen in each categorical column, so that the sums have the same categories as the whole file would
+    categories = {name: set() for name, dtype in schema["dtype"].items() if dtype == "category"}
+    chunks = pandas.read_csv(
+        filepath,
+        usecols=list(schema["dtype"]) + list(schema["dates"]),
+        dtype=schema["dtype"],
+        chunksize=chunk_rows,
+    )
+    for chunk in chunks:
+        for name, values in categories.items():
+            values.update(chunk[name].cat.categories)
+        for column, date_format in schema["dates"].items():
+            chunk[column] = pandas.to_datetime(chunk[column], format=date_format, errors="coerce")
+        for key in keys:
+            column, values, columns, value_column = key
+            rows = chunk[chunk[column].isin(values)]
+            if rows.empty:
+                continue
+            sums = sum_rows(rows, column, columns, value_column)
+            partial_sums[key].append(sums)
+            # Sum the sums so far once they add up to a chunk, so that they never take more memory than one
+            if sum(len(sums) for sums in partial_sums[key]) > chunk_rows:
+                partial_sums[key] = [sum_partial_sums(partial_sums[key])]
+
+    aggregates = {}
+    for key, sums in partial_sums.items():
+        column, _, columns, value_column = key
+        if sums:
+            df = sum_partial_sums(sums).reset_index()
+        else:
+            df = pandas.DataFrame(columns=[column, *columns, value_column])
+        dtypes = {name: dtype for name, dtype in schema["dtype"].items() if name in df.columns}
+        dtypes.update(
+            {name: pandas.CategoricalDtype(sorted(categories[name])) for name in categories if name in df.columns}
+        )
+        aggregates[key] = df.astype(dtypes)
+    return aggregates
+
+def sum_partial_sums(partial_sums: list) -> pandas.Series:
+    sums = pandas.concat(partial_sums)
+    return sums.groupby(level=list(range(sums.index.nlevels)), dropna=False, sort=False).sum()
+
+def read_data_aggregate(
+    filepath: Path, column: str, values, columns: list, value_column: str, schema: dict
+) -> pandas.DataFrame:
+    """
+    Reads the rows of a CSV file where `column` takes one of `values`, summing `value_column` over every column not in
+    `columns`, a chunk at a time (see use_chunked_reading()). The sums are kept for the rest of the run.
+
+    Returns:
+        pd.DataFrame: The sums, with `column` first, then `columns` and then `value_column`
+    """
+    # The sums depend on the whole file, so the whole file is recorded as read
+    record_data_input(filepath, schema)
+    key = get_aggregate_key(column, values, columns, value_column)
+    entry = get_cache_entry(("aggregates", filepath), filepath, aggregates={})
+    with entry["lock"]:
+        if key not in entry["aggregates"]:
+            with _data_cache_lock:
+                planned_keys = _read_plans.pop(filepath, set())
+            keys = ({key} | planned_keys) - set(entry["aggregates"])
+            entry["aggregates"].update(aggregate_csv_in_chunks(filepath, schema, keys))
+        return entry["aggregates"][key].copy()
+
+def read_data_partition(filepath: Path, column: str, values, schema: dict = None) -> pandas.DataFrame:
+    """
+    Reads only the rows of a data file where `column` takes one of `values`, in their original order.
+    The row positions for each value are worked out in one grouping pass the first time a column is used,
+    so each later call only has to gather its own rows rather than compare against the whole column.
+    """
+    record_data_input(filepath, schema, column, values)
+    entry = load_data_source(filepath, schema)
+    with entry["lock"]:
+        group_positions = entry["partitions"].get(column)
+        if group_positions is None:
+            group_positions = entry["data"].groupby(column, sort=False, observed=True).indices
+            entry["partitions"][column] = group_positions
+    positions = [group_positions[value] for value in values if value in group_positions]
+    positions = numpy.sort(numpy.concatenate(positions)) if positions else numpy.array([], dtype=int)
+    return entry["data"].take(positions)
+
+def clear_data_cache():
+    with _data_cache_lock:
+        _data_cache.clear()
+        _read_plans.clear()
+
 def get_easy_a_data():
-    filepath = Path('data/data_for_sheet_easy_a.csv')
-    return pandas.read_csv(filepath)
+    filepath = get_data_dir() / 'data_for_sheet_easy_a.csv'
+    return read_data_source(filepath)
 
 def get_easy_b_data():
-    filepath = Path('data/data_for_sheet_easy_b.csv')
-    return pandas.read_csv(filepath)
+    filepath = get_data_dir() / 'data_for_sheet_easy_b.csv'
+    return read_data_source(filepath)
+
+def get_appointments_data(breakdowns=None, columns=None):
+    # Pass a collection of breakdowns to fetch only the rows for those breakdowns, and a list of columns to fetch only
+    # the breakdown, those columns and appt_count, summed over the other columns. The sums are the same whether or not
+    # chunked reading is on.
+    filepath = get_data_dir() / 'appointment_data.csv'
+    if breakdowns is None:
+        return read_data_source(filepath, schema=appointments_schema)
+    if columns is None:
+        return read_data_partition(filepath, 'breakdown', breakdowns, schema=appointments_schema)
+    if use_chunked_reading() and filepath.suffix.lower() == ".csv":
+        return read_data_aggregate(filepath, 'breakdown', breakdowns, columns, 'appt_count', appointments_schema)
+    df = read_data_partition(filepath, 'breakdown', breakdowns, schema=appointments_schema)
+    return sum_rows(df, 'breakdown', columns, 'appt_count').reset_index()
 
-def get_appointments_data():
-    filepath = Path('data/appointment_data.csv')
-    return pandas.read_csv(filepath)
+def plan_appointments_reads(reads: list) -> None:
+    # Plans reads of the appointments data, as (breakdowns, columns), so that with chunked reading on they are all
+    # gathered in one pass through the file
+    filepath = get_data_dir() / 'appointment_data.csv'
+    if use_chunked_reading() and filepath.suffix.lower() == ".csv":
+        plan_partition_reads(filepath, [('breakdown', breakdowns, columns, 'appt_count') for breakdowns, columns in reads])
 
 def get_practices_data():
-    filepath = Path('data/practices_data.csv')
-    return pandas.read_csv(filepath)
+    filepath = get_data_dir() / 'practices_data.csv'
+    return read_data_source(filepath, schema=practices_schema)
 
 def get_table1_data():
-    filepath = Path('data/table1_data.csv')
-    return pandas.read_csv(filepath)
+    filepath = get_data_dir() / 'table1_data.csv'
+    return read_data_source(filepath)
@@ -0,0 +1,293 @@
+"""
+This is a cache of finished tables, shared by every project, so that a table which more than one publication writes (such as
+Tables 2a to 3d, which both the medium and advanced projects write) is only made once per data drop.
+
+Tables are stored on disk under a key made from everything that goes into them:
+    - the function which makes the table, and the code it's made with (its module, and every module in this repo which that
+      imports, directly or through other modules - such as utils, config and geography),
+    - the report month and number of months, from config,
+    - the data it reads: a hash of each whole file it read, or of just the rows it took from a file (such as one breakdown).
+Which data a table reads is only known once it has been made, so for each function the cache also keeps a 'recipe': the data
+it read last time it was made. Looking a table up means fingerprinting the data in its recipe, and checking for a table stored
+under the resulting key. Any change to the data, the code or the report month gives a new key, so stale tables are never used.
+
+Tables are stored as gzipped pickles. Once the cache is bigger than config.get_frame_cache_max_bytes(), the least recently used
+tables are deleted until it fits again.
+"""
+import functools
+import hashlib
+import inspect
+import os
+import pickle
+import sys
+import types
+from pathlib import Path
+from typing import Callable, Dict, Tuple
+
+import pandas as pd
+
+import config
+import utils
+
+# The folder this repo's modules are in. Only modules in here count as the code a table is made with.
+repo_dir = Path(__file__).resolve().parent
+
+# The hash of each file read this run, keyed by (path, modification time, size), so no file is hashed twice
+_file_hashes = {}
+
+
+def get_file_hash(filepath: Path) -> str:
+    """
+    Hashes a file's contents, re-using the hash from earlier in the run if the file hasn't changed since.
+    """
+    stat = Path(filepath).stat()
+    key = (str(filepath), stat.st_mtime_ns, stat.st_size)
+    if key not in _file_hashes:
+        _file_hashes[key] = config.get_file_hash(Path(filepath))
+    return _file_hashes[key]
+
+
+def write_atomically(path: Path, write: Callable) -> None:
+    """
+    Writes a file by writing a temporary file first and then moving it into place, so that a build running alongside
+    this one never reads a half-written file.
+
+    Args:
+        path (Path): The file to write
+        write (Callable): A function which writes the file, given the path to write to
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    write(temporary_path)
+    os.replace(temporary_path, path)
+    return None
+
+
+@functools.lru_cache(maxsize=None)
+def get_source_files(module_name: str) -> frozenset:
+    """
+    Lists the source files of a module, and of every module in this repo it imports, directly or through other modules.
+    Functions and classes imported from a module (with `from ... import ...`) count as importing it. Modules with no
+    file, such as code typed into the interpreter, are left out.
+    """
+    source_files = set()
+    seen = set()
+    modules = [sys.modules[module_name]]
+    while modules:
+        module = modules.pop()
+        if module.__name__ in seen:
+            continue
+        seen.add(module.__name__)
+        source_file = getattr(module, "__file__", None)
+        if source_file is None or not Path(source_file).is_file():
+            continue
+        if repo_dir not in Path(source_file).resolve().parents:
+            continue
+        source_files.add(str(Path(source_file).resolve()))
+        for value in vars(module).values():
+            if isinstance(value, types.ModuleType):
+                modules.append(value)
+            elif (inspect.isfunction(value) or inspect.isclass(value)) and value.__module__ in sys.modules:
+                modules.append(sys.modules[value.__module__])
+    return frozenset(source_files)
+
+
+def get_builder_key(make_table: Callable) -> str:
+    """
+    Hashes everything about how a table is made, apart from the data: the function which makes it, the code it's made
+    with, and the report month and number of months.
+
+    Args:
+        make_table (Callable): The function which makes the table
+
+    Returns:
+        str: The key
+    """
+    source_files = get_source_files(make_table.__module__) | {inspect.getsourcefile(make_table)}
+    parts = [
+        make_table.__module__,
+        make_table.__qualname__,
+        str(config.get_report_month()),
+        str(config.get_number_of_months()),
+    ]
+    parts += [get_file_hash(path) for path in sorted(source_files)]
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+
+def get_input_fingerprint(data_input: Tuple, schema: dict, previous: dict = None) -> dict:
+    """
+    Fingerprints one piece of data a table read, as recorded by config.record_data_inputs().
+    A whole file is fingerprinted by its hash. A partition of a file is fingerprinted by a hash of its rows, so that
+    changes elsewhere in the file don't affect it; this is only worked out again if the file itself has changed.
+
+    Args:
+        data_input (Tuple): The (file path, column, values) which were read
+        schema (dict): The schema the file was read with
+        previous (dict, optional): An earlier fingerprint of the same input
+
+    Returns:
+        dict: The fingerprint, as {"file_hash": ..., "data_hash": ...}
+    """
+    filepath, column, values = data_input
+    file_hash = get_file_hash(filepath)
+    if column is None:
+        return {"file_hash": file_hash, "data_hash": file_hash}
+    if previous is not None and previous["file_hash"] == file_hash:
+        return previous
+
+    data = config.read_data_partition(Path(filepath), column, values, schema=schema)
+    data_hash = hashlib.sha256(repr(list(data.columns)).encode())
+    data_hash.update(pd.util.hash_pandas_object(data, index=False).values.tobytes())
+    return {"file_hash": file_hash, "data_hash": data_hash.hexdigest()}
+
+
+def get_table_key(builder_key: str, input_fingerprints: dict) -> str:
+    """
+    Combines the builder key and the fingerprint of each piece of data a table read into the key the table is stored under.
+    """
+    parts = [builder_key]
+    parts += [
+        f"{data_input}={input_fingerprints[data_input]['data_hash']}"
+        for data_input in sorted(input_fingerprints, key=repr)
+    ]
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+
+def get_recipe_path(builder_key: str) -> Path:
+    return config.get_frame_cache_dir() / "recipes" / f"{builder_key}.pickle"
+
+
+def get_table_path(table_key: str) -> Path:
+    return config.get_frame_cache_dir() / "tables" / f"{table_key}.pickle.gz"
+
+
+def find_table_key(make_table: Callable) -> str:
+    """
+    Works out the key a table would be stored under, from the data its function read the last time it was made.
+
+    Args:
+        make_table (Callable): The function which makes the table
+
+    Returns:
+        str: The key, or None if the function hasn't been made before or its data can no longer be found
+    """
+    builder_key = get_builder_key(make_table)
+    recipe_path = get_recipe_path(builder_key)
+    try:
+        with open(recipe_path, "rb") as f:
+            recipe = pickle.load(f)
+        input_fingerprints = {
+            data_input: get_input_fingerprint(data_input, schema, recipe["inputs"].get(data_input))
+            for data_input, schema in recipe["schemas"].items()
+        }
+    except (OSError, pickle.UnpicklingError, EOFError, KeyError):
+        return None
+    return get_table_key(builder_key, input_fingerprints)
+
+
+def load_table(table_key: str):
+    """
+    Loads a table from the cache, marking it as recently used.
+
+    Args:
+        table_key (str): The key the table is stored under
+
+    Returns:
+        The table, or None if it isn't in the cache
+    """
+    table_path = get_table_path(table_key)
+    try:
+        table = pd.read_pickle(table_path, compression="gzip")
+        os.utime(table_path)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+    return table
+
+
+def store_table(make_table: Callable, data_inputs: dict, table) -> str:
+    """
+    Stores a newly made table in the cache, along with the recipe of data its function read.
+
+    Args:
+        make_table (Callable): The function which made the table
+        data_inputs (dict): The data it read, as recorded by config.record_data_inputs()
+        table: The table
+
+    Returns:
+        str: The key the table is stored under
+    """
+    builder_key = get_builder_key(make_table)
+    input_fingerprints = {
+        data_input: get_input_fingerprint(data_input, schema) for data_input, schema in data_inputs.items()
+    }
+    table_key = get_table_key(builder_key, input_fingerprints)
+
+    recipe = {"schemas": data_inputs, "inputs": input_fingerprints}
+    write_atomically(get_recipe_path(builder_key), lambda path: path.write_bytes(pickle.dumps(recipe)))
+    write_atomically(get_table_path(table_key), lambda path: pd.to_pickle(table, path, compression="gzip"))
+    return table_key
+
+
+def evict_tables(max_bytes: int = None) -> None:
+    """
+    Deletes the least recently used tables until the cache is no bigger than the given size.
+
+    Args:
+        max_bytes (int, optional): The largest the cache may be. Defaults to config.get_frame_cache_max_bytes().
+    """
+    max_bytes = config.get_frame_cache_max_bytes() if max_bytes is None else max_bytes
+    table_paths = []
+    for table_path in (config.get_frame_cache_dir() / "tables").glob("*.pickle.gz"):
+        try:
+            stat = table_path.stat()
+        except OSError:
+            continue
+        table_paths.append((stat.st_mtime_ns, stat.st_size, table_path))
+
+    total_bytes = sum(size for _, size, _ in table_paths)
+    for _, size, table_path in sorted(table_paths, key=lambda item: item[0]):
+        if total_bytes <= max_bytes:
+            break
+        table_path.unlink(missing_ok=True)
+        total_bytes -= size
+    return None
+
+
+def prepare_tables(makers: Dict[str, Callable]) -> Tuple[Dict[str, object], Dict[str, float], Dict[str, str]]:
+    """
+    Makes a set of tables as utils.prepare_tables() does, but takes any which are already in the cache from there,
+    and adds the rest to it.
+
+    Args:
+        makers (Dict[str, Callable]): The function which makes each table, by sheet name
+
+    Returns:
+        Tuple[Dict[str, object], Dict[str, float], Dict[str, str]]: The tables, the number of seconds each took to make
+            (0 for tables taken from the cache), and the key each is stored under, all by sheet name and in the same
+            order as `makers`
+    """
+    cached_tables, table_keys = {}, {}
+    for sheet_name, make_table in makers.items():
+        table_key = find_table_key(make_table)
+        table = None if table_key is None else load_table(table_key)
+        if table is not None:
+            cached_tables[sheet_name] = table
+            table_keys[sheet_name] = table_key
+
+    data_inputs = {}
+    made_tables, timings = utils.prepare_tables(
+        {sheet_name: make_table for sheet_name, make_table in makers.items() if sheet_name not in cached_tables},
+        data_inputs=data_inputs,
+    )
+    for sheet_name, table in made_tables.items():
+        table_keys[sheet_name] = store_table(makers[sheet_name], data_inputs[sheet_name], table)
+    if made_tables:
+        evict_tables()
+
+    tables = {
+        sheet_name: cached_tables[sheet_name] if sheet_name in cached_tables else made_tables[sheet_name]
+        for sheet_name in makers
+    }
+    timings = {sheet_name: timings.get(sheet_name, 0.0) for sheet_name in makers}
+    table_keys = {sheet_name: table_keys[sheet_name] for sheet_name in makers}
+    return tables, timings, table_keys
@@ -0,0 +1,66 @@
+"""
+This defines the hierarchy of geographies our publications are broken down by, and how to sort tables of them.
+
+Tables by geography are ordered by level - national first, then regions, STPs, CCGs, PCNs and practices - and then by code
+within each level. Rather than mapping each row's level to a rank and sorting on that, the level is read as an ordered
+categorical and the codes are factorized, so the sort is one integer lexsort however many levels and areas there are.
+
+PCNs and practices are only known to the sort. The geography tables in utils.py are each made from four breakdowns of the
+appointments data - national, region, STP and CCG - as those are the only levels it is broken down by, so no table has
+rows for PCNs or practices yet. Adding them would mean adding their breakdowns to the table specs in utils.py.
+"""
+import numpy as np
+import pandas as pd
+
+# The levels of geography, from largest to smallest
+geography_levels = ["National", "Region", "STP", "CCG", "PCN", "Practice"]
+
+geography_type = pd.CategoricalDtype(categories=geography_levels, ordered=True)
+
+
+def get_level_codes(geography_types: pd.Series) -> np.ndarray:
+    """
+    Turns a column of geography types into their positions in the hierarchy. Types which aren't in the hierarchy
+    are placed after all the ones which are.
+    """
+    level_codes = geography_types.astype(str).astype(geography_type).cat.codes.to_numpy().astype(np.int64)
+    level_codes[level_codes < 0] = len(geography_levels)
+    return level_codes
+
+
+def get_code_ranks(codes: pd.Series) -> np.ndarray:
+    """
+    Turns a column of codes into integers with the same order. Missing codes are placed after all the others.
+    """
+    code_ranks, unique_codes = pd.factorize(codes.astype(object), sort=True)
+    code_ranks = code_ranks.astype(np.int64)
+    code_ranks[code_ranks < 0] = len(unique_codes)
+    return code_ranks
+
+
+def get_sort_order(df: pd.DataFrame, type_column: str = "geog_type", code_column: str = "geog_code") -> np.ndarray:
+    """
+    Works out the order to put a table of geographies in: by level of geography, and then by code.
+    Rows with the same level and code keep the order they were in.
+
+    Args:
+        df (pd.DataFrame): The table, with a row for each area
+        type_column (str, optional): The column giving each area's level of geography. Defaults to "geog_type".
+        code_column (str, optional): The column giving each area's code. Defaults to "geog_code".
+
+    Returns:
+        np.ndarray: The row positions, in sorted order
+    """
+    level_codes = get_level_codes(df[type_column])
+    code_ranks = get_code_ranks(df[code_column])
+    return np.lexsort((code_ranks, level_codes))
+
+
+def sort_by_geography(df: pd.DataFrame, type_column: str = "geog_type", code_column: str = "geog_code") -> pd.DataFrame:
+    """
+    Sorts a table of geographies by level of geography, and then by code. See get_sort_order().
+
+    Returns:
+        pd.DataFrame: The sorted table
+    """
+    return df.iloc[get_sort_order(df, type_column, code_column)]
@@ -0,0 +1,131 @@
+"""
+This is an incremental way of building a project, for re-running a publication when little has changed since the last run.
+
+Tables are made through the frame cache (see frame_cache.py), so a table is only made again if the data it reads, the code
+which makes it, or the report month have changed since it was last made; otherwise it is taken from the cache. A correction
+to one breakdown of the appointments data therefore only remakes the tables which read that breakdown.
+
+The key of every table written to a project's output file is also kept, in the build state folder (see
+config.get_build_state_dir()), along with the template's hash. If none of these has changed, and the output file is still
+the one the last run wrote, the output file is not written again either.
+
+Note that tables are always written from the template into a fresh copy of the workbook; the last run's output is never edited.
+"""
+import hashlib
+import pickle
+from pathlib import Path
+from typing import Callable, Dict, Tuple
+
+import config
+import frame_cache
+import utils
+
+# Each project's build state, once it has been loaded this run
+_build_states = {}
+
+
+def get_state_path(project_name: str) -> Path:
+    return config.get_build_state_dir() / f"{project_name}.pickle"
+
+
+def load_build_state(project_name: str) -> dict:
+    """
+    Loads the state kept by a project's last incremental run: the key of each table it made, and the output file it wrote.
+    A missing or unreadable state file is treated as there being no last run.
+    """
+    if project_name not in _build_states:
+        state = {"tables": {}, "output": None}
+        state_path = get_state_path(project_name)
+        if state_path.exists():
+            try:
+                with open(state_path, "rb") as f:
+                    state = pickle.load(f)
+            except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+                pass
+        _build_states[project_name] = state
+    return _build_states[project_name]
+
+
+def save_build_state(project_name: str) -> None:
+    """
+    Saves a project's build state, writing to a temporary file first so that an interrupted run never leaves a broken state file.
+    """
+    state = _build_states[project_name]
+    frame_cache.write_atomically(get_state_path(project_name), lambda path: path.write_bytes(pickle.dumps(state)))
+    return None
+
+
+def prepare_tables(project_name: str, makers: Dict[str, Callable]) -> Tuple[Dict[str, object], Dict[str, float]]:
+    """
+    Makes a project's tables. With config.use_incremental_build() or config.use_frame_cache() on, this goes through the
+    frame cache, so only the tables which have changed since they were last made are made again; otherwise this is
+    the same as utils.prepare_tables().
+
+    Args:
+        project_name (str): The project's name, which its build state is kept under
+        makers (Dict[str, Callable]): The function which makes each table, by sheet name
+
+    Returns:
+        Tuple[Dict[str, object], Dict[str, float]]: The tables, and the number of seconds each took to make (0 for
+            tables taken from the cache), both by sheet name and in the same order as `makers`
+    """
+    if not (config.use_incremental_build() or config.use_frame_cache()):
+        return utils.prepare_tables(makers)
+
+    tables, timings, table_keys = frame_cache.prepare_tables(makers)
+    if config.use_incremental_build():
+        load_build_state(project_name)["tables"] = table_keys
+    return tables, timings
+
+
+def get_output_fingerprint(project_name: str, template_path: Path, sheet_names: list) -> str:
+    """
+    Combines everything a project's output file depends on into one fingerprint: the template, the output engine,
+    and the frame cache key of each table written to it.
+    """
+    state = load_build_state(project_name)
+    parts = [frame_cache.get_file_hash(template_path), config.get_output_engine()]
+    parts += [f"{sheet_name}={state['tables'].get(sheet_name)}" for sheet_name in sheet_names]
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+
+def is_output_current(project_name: str, template_path: Path, output_path: Path, sheet_names: list) -> bool:
+    """
+    Checks whether a project's output file can be left as it is: the last incremental run wrote it from the same
+    template and tables, and it hasn't been changed or removed since.
+
+    Args:
+        project_name (str): The project's name
+        template_path (Path): The project's template
+        output_path (Path): The project's output file
+        sheet_names (list): The sheets written to the output file, which must have been made by prepare_tables()
+
+    Returns:
+        bool: Whether the output file is up to date
+    """
+    if not config.use_incremental_build():
+        return False
+    output = load_build_state(project_name)["output"]
+    if output is None or output["path"] != str(output_path) or not output_path.exists():
+        return False
+    stat = output_path.stat()
+    return (
+        output["file_stamp"] == (stat.st_mtime_ns, stat.st_size)
+        and output["fingerprint"] == get_output_fingerprint(project_name, template_path, sheet_names)
+    )
+
+
+def record_output(project_name: str, template_path: Path, output_path: Path, sheet_names: list) -> None:
+    """
+    Records that a project's output file has been written, so that the next run can tell whether it is still up to date.
+    """
+    if not config.use_incremental_build():
+        return None
+    stat = output_path.stat()
+    load_build_state(project_name)["output"] = {
+        "path": str(output_path),
+        "file_stamp": (stat.st_mtime_ns, stat.st_size),
+        "fingerprint": get_output_fingerprint(project_name, template_path, sheet_names),
+    }
+    save_build_state(project_name)
+    return None
@@ -0,0 +1,162 @@
+"""
+This records how each stage of a build went - how long it took, the CPU time it used, how much memory it needed, and how
+many rows and cells it wrote - and writes it all out as a run report for each project, so that when a build slows down
+we can see which table and which stage did it.
+
+The stages recorded are:
+    - make_table: making each table, or each set of tables made together, such as Tables 2a to 2d (see
+      utils.run_table_maker()),
+    - load_template: loading the template with openpyxl, which may run in the background while the tables are made
+      (see utils.start_loading_template()),
+    - wait_for_template: waiting for a template loading in the background to finish, once the tables are made,
+    - write_table: writing each table to its sheet (see utils.write_table_to_sheet() and table_1.write_table1()),
+    - save: saving the workbook,
+    - write_workbook: with the streaming output engine, writing and saving the whole workbook in one pass; each of its
+      sheets is also recorded as a write_table stage.
+
+Each stage records:
+    - seconds: the wall time it took,
+    - cpu_seconds: the CPU time used by the thread it ran in,
+    - rss_growth_bytes and peak_rss_bytes: how much the process's peak memory use grew during the stage, and the peak
+      once it had finished. Stages which run alongside each other (such as tables made at once) share their growth.
+    - peak_traced_bytes: with config.trace_memory() on, the most memory Python allocated during the stage, as measured by
+      tracemalloc, including any stages inside it. This is more precise than the process's memory use, but slows the
+      build down, so it is off by default. As tracemalloc's peak is shared by every thread, stages which run alongside
+      each other share theirs too.
+    - rows and cells: for stages which make or write a table, its size.
+
+The report for each project built by main.py is written to config.get_run_report_dir(), as JSON.
+"""
+import contextlib
+import datetime
+import json
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Iterator, Tuple
+
+import config
+
+try:
+    import resource
+except ImportError:  # The resource module isn't available on Windows, so memory use isn't recorded there
+    resource = None
+
+# The report being recorded, if any. Stages from every thread are added to it, so it's guarded by a lock.
+_run_report = None
+_run_report_lock = threading.Lock()
+
+# The traced memory peaks of the stages each thread is in the middle of, innermost last. Each stage resets tracemalloc's
+# peak when it starts, so a stage's peak is passed on to the stage around it when it finishes.
+_open_stage_peaks = threading.local()
+
+
+def get_peak_rss_bytes() -> int:
+    """
+    Gives the most memory the process has used so far, in bytes, or None if this can't be measured here.
+    """
+    if resource is None:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports this in kilobytes, macOS in bytes
+    return peak_rss if sys.platform == "darwin" else peak_rss * 1024
+
+
+def count_cells(table) -> Tuple[int, int]:
+    """
+    Counts the rows and cells in a table: a dataframe, or a set of values for tagged cells, as {column: {tag: value}}.
+    """
+    if isinstance(table, dict):
+        return max((len(values) for values in table.values()), default=0), sum(len(values) for values in table.values())
+    return table.shape[0], table.shape[0] * table.shape[1]
+
+
+@contextlib.contextmanager
+def measure_stage(stage: str, sheet_name: str = None, add_to_report: bool = True) -> Iterator[dict]:
+    """
+    Measures a stage of the build, and adds it to the run report being recorded.
+
+    Args:
+        stage (str): The name of the stage
+        sheet_name (str, optional): The sheet the stage is for, if any. Defaults to None.
+        add_to_report (bool, optional): Whether to add the stage to the run report. Stages measured in worker
+            processes can't be, so are passed back and added with add_stage() instead. Defaults to True.
+
+    Yields:
+        dict: The stage's record, which is filled in once the stage finishes. Set 'rows' and 'cells' in it to record
+            the size of what the stage made or wrote.
+    """
+    record = {"stage": stage, "sheet_name": sheet_name, "rows": None, "cells": None}
+    trace_memory = config.trace_memory()
+    if trace_memory:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        open_peaks = _open_stage_peaks.__dict__.setdefault("peaks", [])
+        if open_peaks:
+            open_peaks[-1] = max(open_peaks[-1], tracemalloc.get_traced_memory()[1])
+        open_peaks.append(0)
+        tracemalloc.reset_peak()
+    start_rss = get_peak_rss_bytes()
+    start_cpu = time.thread_time()
+    start_time = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record["seconds"] = time.perf_counter() - start_time
+        record["cpu_seconds"] = time.thread_time() - start_cpu
+        record["peak_rss_bytes"] = get_peak_rss_bytes()
+        record["rss_growth_bytes"] = None if start_rss is None else record["peak_rss_bytes"] - start_rss
+        record["peak_traced_bytes"] = None
+        if trace_memory:
+            record["peak_traced_bytes"] = max(open_peaks.pop(), tracemalloc.get_traced_memory()[1])
+            if open_peaks:
+                open_peaks[-1] = max(open_peaks[-1], record["peak_traced_bytes"])
+        if add_to_report:
+            add_stage(record)
+
+
+def add_stage(record: dict) -> None:
+    """
+    Adds a stage measured by measure_stage() to the run report being recorded, if there is one.
+    """
+    with _run_report_lock:
+        if _run_report is not None:
+            _run_report["stages"].append(record)
+    return None
+
+
+@contextlib.contextmanager
+def record_run_report(project_name: str) -> Iterator[dict]:
+    """
+    Records a run report for everything done inside the block, and writes it to config.get_run_report_dir() at the end
+    if config.write_run_reports() is on.
+
+    Args:
+        project_name (str): The project being built, which the report is named after
+
+    Yields:
+        dict: The report, which is complete once the block finishes
+    """
+    global _run_report
+    report = {
+        "project": project_name,
+        "started": datetime.datetime.now().isoformat(timespec="seconds"),
+        "stages": [],
+    }
+    start_cpu = time.process_time()
+    start_time = time.perf_counter()
+    with _run_report_lock:
+        _run_report = report
+    try:
+        yield report
+    finally:
+        with _run_report_lock:
+            _run_report = None
+        report["seconds"] = time.perf_counter() - start_time
+        report["cpu_seconds"] = time.process_time() - start_cpu
+        report["peak_rss_bytes"] = get_peak_rss_bytes()
+        if config.write_run_reports():
+            report_dir = config.get_run_report_dir()
+            report_dir.mkdir(parents=True, exist_ok=True)
+            (report_dir / f"{project_name}.json").write_text(json.dumps(report, indent=2))
@@ -1,12 +1,128 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import config
+import instrumentation
+import profiling
 from templates.advanced_project import advanced_project 
 from templates.medium_project import medium_project
 from templates.easy_project import easy_project
 
-def main():
-    easy_project.make_excel_output()
-    medium_project.make_excel_output()
-    advanced_project.make_excel_output()
+# Each project reads the shared data files and writes its own file in outputs/, so they can be built independently
+projects = {
+    "easy": easy_project.make_excel_output,
+    "medium": medium_project.make_excel_output,
+    "advanced": advanced_project.make_excel_output,
+}
+
+# The module of each project, for profiling one of its sheets
+project_modules = {
+    "easy": easy_project,
+    "medium": medium_project,
+    "advanced": advanced_project,
+}
+
+
+def build_project(project_name: str) -> str:
+    """Builds one project's output Excel file, recording a run report of how each stage went (see instrumentation.py).
+    Module-level, so that it can be sent to a worker process.
+
+    Args:
+        project_name (str): The project's key in `projects`
+
+    Returns:
+        str: The project name
+    """
+    with instrumentation.record_run_report(project_name):
+        projects[project_name]()
+    return project_name
+
+
+def main(project_names: list = None, workers: int = None) -> None:
+    """Builds the output Excel files for the chosen projects.
+
+    Args:
+        project_names (list, optional): The projects to build, from `projects`. Defaults to all of them.
+        workers (int, optional): The number of processes to build projects in at once. Defaults to
+            config.get_max_workers(). With one worker, the projects are built one after another in this process.
+    """
+    project_names = list(projects) if project_names is None else project_names
+    workers = config.get_max_workers() if workers is None else workers
+    workers = min(workers, len(project_names))
+
+    if workers <= 1:
+        for project_name in project_names:
+            build_project(project_name)
+        return None
+
+    # Each worker writes a different file, so the outputs are the same whatever order the projects finish in
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Going through the results re-raises any error from a worker here
+        for _ in executor.map(build_project, project_names):
+            pass
+    return None
+
+
+def profile_project(project_name: str, profiler: str, sheet_name: str = None, top: int = 25) -> None:
+    """Builds one project, or makes and writes one of its sheets, under a profiler (see profiling.py).
+
+    Args:
+        project_name (str): The project's key in `projects`
+        profiler (str): 'cprofile' or 'sampling'
+        sheet_name (str, optional): The sheet to profile. Defaults to the whole project.
+        top (int, optional): The number of functions to list in the hotspot summary. Defaults to 25.
+    """
+    if sheet_name is None:
+        profiling.profile(projects[project_name], project_name, profiler=profiler, top=top)
+    else:
+        profiling.profile_sheet(project_name, project_modules[project_name], sheet_name, profiler=profiler, top=top)
+    return None
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Build the output Excel files for the example projects.")
+    parser.add_argument(
+        "projects",
+        nargs="*",
+        help=f"The projects to build, from {', '.join(projects)}. Defaults to all of them.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="The number of projects to build at once, each in its own process. Defaults to config.get_max_workers().",
+    )
+    parser.add_argument(
+        "--profile",
+        choices=["cprofile", "sampling"],
+        default=None,
+        help="Build a single project under a profiler, writing the profile and a summary of its hotspots to outputs/profiles.",
+    )
+    parser.add_argument(
+        "--sheet",
+        default=None,
+        help="With --profile, profile only making and writing this sheet of the project.",
+    )
+    parser.add_argument(
+        "--top",
+        type=int,
+        default=25,
+        help="With --profile, the number of functions to list in the hotspot summary. Defaults to 25.",
+    )
+    args = parser.parse_args()
+    if args.profile is not None and len(args.projects) != 1:
+        parser.error("--profile needs exactly one project")
+    if args.sheet is not None and args.profile is None:
+        parser.error("--sheet can only be used with --profile")
+    unknown_projects = [project_name for project_name in args.projects if project_name not in projects]
+    if unknown_projects:
+        parser.error(f"unknown project(s): {', '.join(unknown_projects)}")
+    return args
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    args = parse_args()
+    if args.profile is not None:
+        profile_project(args.projects[0], args.profile, sheet_name=args.sheet, top=args.top)
+    else:
+        main(project_names=args.projects or None, workers=args.workers)
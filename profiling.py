@@ -0,0 +1,236 @@
+"""
+This runs one project, or one sheet of a project, under a profiler, to find out where the time goes: in pandas while making
+the table, in looking up tags, or in openpyxl while writing it. Run it through main.py, for example:
+
+    python main.py medium --profile cprofile
+    python main.py advanced --profile sampling --sheet "Table 3a"
+
+Two profilers are available:
+    - cprofile: Python's deterministic profiler, which counts every call. The profile is saved as a .prof file, which can
+      be opened with pstats or a viewer such as snakeviz.
+    - sampling: a simple sampling profiler, which looks at what the build is doing every few milliseconds. It slows the
+      build down much less, so is better at showing how time is split between fast, frequently called functions.
+      The samples are saved as 'folded' stacks, which most flame graph tools can read.
+
+Either way, a summary of the hotspots is saved alongside: the time spent in each library, and the functions which took
+the most time. Everything is written to config.get_profile_dir().
+
+Profiling a single sheet makes its table, and writes it to the template. The template is loaded beforehand as the build
+loads it, with utils.load_template() - so from the template cache, if that's on - but this isn't profiled, and the workbook
+isn't saved. While profiling a whole project, its tables are made one at a time, and its template is loaded, in this
+thread, so that the profiler sees them.
+"""
+import collections
+import cProfile
+import functools
+import io
+import pstats
+import re
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Tuple
+
+import et_xmlfile
+import numpy as np
+import openpyxl
+import pandas as pd
+
+import config
+import utils
+from templates.advanced_project import table_1
+
+# The libraries time is summarised by, with the folders each is installed in. openpyxl writes its XML with et_xmlfile.
+library_dirs = {
+    "pandas": [Path(pd.__file__).resolve().parent],
+    "numpy": [Path(np.__file__).resolve().parent],
+    "openpyxl": [Path(openpyxl.__file__).resolve().parent, Path(et_xmlfile.__file__).resolve().parent],
+}
+repo_dir = Path(__file__).resolve().parent
+
+
+@functools.lru_cache(maxsize=None)
+def get_library(filename: str, function_name: str = "") -> str:
+    """
+    Says which library a function belongs to: pandas, numpy or openpyxl; a file in this repo; or 'python' for the
+    standard library, and anything else. Functions written in C have no file, so are told apart by their names.
+    """
+    if filename == "~" or filename.startswith("<"):
+        for library in library_dirs:
+            if re.search(rf"\b{library}\b", function_name):
+                return library
+        return "python"
+    path = Path(filename).resolve()
+    for library, dirs in library_dirs.items():
+        if any(library_dir in path.parents for library_dir in dirs):
+            return library
+    if repo_dir in path.parents:
+        return f"this repo: {path.relative_to(repo_dir).as_posix()}"
+    return "python"
+
+
+def get_function_name(filename: str, line_number: int, function_name: str) -> str:
+    if filename == "~":
+        return function_name
+    return f"{get_library(filename)}: {function_name} ({Path(filename).name}:{line_number})"
+
+
+def format_library_times(library_times: Dict[str, float], unit: str) -> str:
+    total = sum(library_times.values()) or 1
+    width = max((len(library) for library in library_times), default=0)
+    lines = [f"Time by library ({unit}, excluding time spent in the functions each one calls):"]
+    for library, amount in sorted(library_times.items(), key=lambda item: item[1], reverse=True):
+        amount_text = f"{amount:.3f}" if isinstance(amount, float) else str(amount)
+        lines.append(f"    {library:<{width}} {amount_text:>12} {amount / total:>7.1%}")
+    return "\n".join(lines)
+
+
+def run_with_cprofile(run: Callable, profile_path: Path, top: int) -> str:
+    """
+    Runs a function under cProfile, saving the profile, and gives a summary of its hotspots.
+    """
+    profiler = cProfile.Profile()
+    profiler.runcall(run)
+    profiler.dump_stats(profile_path)
+
+    stats = pstats.Stats(profiler)
+    library_times = collections.Counter()
+    for (filename, _, function_name), (_, _, own_time, _, _) in stats.stats.items():
+        library_times[get_library(filename, function_name)] += own_time
+
+    sections = [f"Total time: {stats.total_tt:.3f}s", format_library_times(library_times, "seconds")]
+    for sort_key, title in (("tottime", "own time"), ("cumulative", "time including the functions they call")):
+        stream = io.StringIO()
+        pstats.Stats(profiler, stream=stream).sort_stats(sort_key).print_stats(top)
+        sections.append(f"The {top} functions with the most {title}:\n{stream.getvalue().split(chr(10), 1)[-1].strip()}")
+    return "\n\n".join(sections)
+
+
+def run_with_sampling(run: Callable, profile_path: Path, top: int) -> str:
+    """
+    Runs a function while sampling its stack every config.get_sampling_interval() seconds, saving the samples as folded
+    stacks, and gives a summary of its hotspots.
+    """
+    interval = config.get_sampling_interval()
+    target_thread = threading.get_ident()
+    samples = collections.Counter()
+    stop = threading.Event()
+
+    def sample() -> None:
+        while not stop.wait(interval):
+            frame = sys._current_frames().get(target_thread)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+                frame = frame.f_back
+            samples[tuple(reversed(stack))] += 1
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    start_time = time.perf_counter()
+    sampler.start()
+    try:
+        run()
+    finally:
+        stop.set()
+        sampler.join()
+    seconds = time.perf_counter() - start_time
+
+    # Every stack starts with the frames which called this function; leave those out
+    own_frame = (run_with_sampling.__code__.co_filename, run_with_sampling.__code__.co_firstlineno, "run_with_sampling")
+    own_samples, total_samples, library_samples = collections.Counter(), collections.Counter(), collections.Counter()
+    with open(profile_path, "w") as f:
+        for stack, count in samples.items():
+            stack = stack[stack.index(own_frame) + 1 :] if own_frame in stack else stack
+            if not stack:
+                continue
+            f.write(";".join(get_function_name(*frame) for frame in stack) + f" {count}\n")
+            own_samples[stack[-1]] += count
+            library_samples[get_library(stack[-1][0])] += count
+            for frame in set(stack):
+                total_samples[frame] += count
+
+    sample_count = sum(samples.values()) or 1
+    sections = [
+        f"Total time: {seconds:.3f}s, in {sum(samples.values())} samples, one every {interval * 1000:g}ms",
+        format_library_times(library_samples, "samples"),
+    ]
+    for counts, title in ((own_samples, "own time"), (total_samples, "time including the functions they call")):
+        lines = [f"The {top} functions with the most {title}, in samples:"]
+        for frame, count in counts.most_common(top):
+            lines.append(f"    {count:>8} {count / sample_count:>7.1%}  {get_function_name(*frame)}")
+        sections.append("\n".join(lines))
+    return "\n\n".join(sections)
+
+
+def profile(run: Callable, name: str, profiler: str = "cprofile", top: int = 25) -> Tuple[Path, Path]:
+    """
+    Runs a function under a profiler, making its tables one at a time and loading its template in the same thread so
+    that the profiler sees them, and saves the profile and a summary of the hotspots to config.get_profile_dir().
+
+    Args:
+        run (Callable): The function to profile
+        name (str): The name to save the profile under
+        profiler (str, optional): 'cprofile' or 'sampling'. Defaults to "cprofile".
+        top (int, optional): The number of functions to list in the summary. Defaults to 25.
+
+    Returns:
+        Tuple[Path, Path]: The profile and summary files
+    """
+    profile_dir = config.get_profile_dir()
+    profile_dir.mkdir(parents=True, exist_ok=True)
+    file_name = re.sub(r"[^\w-]+", "_", name).strip("_").lower()
+    runners = {"cprofile": (run_with_cprofile, ".prof"), "sampling": (run_with_sampling, ".folded")}
+    if profiler not in runners:
+        raise ValueError(f"Unknown profiler {profiler}; choose from {', '.join(runners)}")
+    run_with_profiler, suffix = runners[profiler]
+    profile_path = profile_dir / f"{file_name}{suffix}"
+    summary_path = profile_dir / f"{file_name}_hotspots.txt"
+
+    # Profilers only see the thread they were started in, so make the tables and load the template in this one while
+    # profiling
+    get_table_workers = config.get_table_workers
+    load_template_in_background = config.load_template_in_background
+    config.get_table_workers = lambda: 1
+    config.load_template_in_background = lambda: False
+    try:
+        summary = run_with_profiler(run, profile_path, top)
+    finally:
+        config.get_table_workers = get_table_workers
+        config.load_template_in_background = load_template_in_background
+
+    summary_path.write_text(f"Profile of {name}, with {profiler}\n\n{summary}\n")
+    print(f"{name}: profile written to {profile_path}, hotspots to {summary_path}")
+    return profile_path, summary_path
+
+
+def profile_sheet(
+    project_name: str, project, sheet_name: str, profiler: str = "cprofile", top: int = 25
+) -> Tuple[Path, Path]:
+    """
+    Profiles making one sheet's table, and writing it to the project's template, loaded with utils.load_template().
+
+    Args:
+        project_name (str): The project's name, which the profile is saved under along with the sheet's
+        project: The project's module, such as templates.medium_project.medium_project
+        sheet_name (str): The sheet to profile, from the project's get_table_makers()
+        profiler (str, optional): 'cprofile' or 'sampling'. Defaults to "cprofile".
+        top (int, optional): The number of functions to list in the summary. Defaults to 25.
+
+    Returns:
+        Tuple[Path, Path]: The profile and summary files
+    """
+    makers = project.get_table_makers()
+    if sheet_name not in makers:
+        raise KeyError(f"{project.__name__} has no sheet {sheet_name}; choose from {', '.join(makers)}")
+    wb = utils.load_template(project.template_path)
+
+    def make_and_write_sheet() -> None:
+        table = makers[sheet_name]()
+        if sheet_name == "Table 1":
+            table_1.write_table1(wb=wb, table1_values=table)
+        else:
+            utils.write_tables(wb=wb, tables={sheet_name: table})
+
+    return profile(make_and_write_sheet, f"{project_name} {sheet_name}", profiler, top)
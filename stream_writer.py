@@ -0,0 +1,541 @@
+"""
+This is an alternative way of writing the output Excel file, for publications whose tables are too big to handle comfortably with openpyxl.
+
+openpyxl loads the whole template into memory as python objects, one per cell, and holds the whole output in memory until it is saved.
+Instead, the functions here treat the template as what it is: a zip file of XML documents. The output zip is written one part at a time;
+the sheets with data written to them are read and written one row at a time, and every other part is copied across unchanged.
+This keeps memory use flat, however large the tables are.
+
+The result is the same as the openpyxl route: each table is written from the <start> cell, the unused template rows up to the <end> cell
+are removed (or extra rows added, if the table is bigger than the template), and Table 1-style tags are replaced with their values.
+Merged cells, hyperlinks, conditional formatting, data validation and defined names are moved to follow the rows around them.
+
+There are a few limitations to bear in mind:
+    - Tags are only recognised in cells holding text: shared strings, as Excel saves text, or inline strings, as openpyxl 3.1 does.
+    - Formulas inside the moved rows are not rewritten, and drawings (such as logos) are not moved; keep these above the data regions.
+    - Dates are written as Excel date numbers, so the template cells need a date format if they are to display as dates.
+"""
+import codecs
+import datetime
+import math
+import numbers
+import posixpath
+import re
+import shutil
+import zipfile
+from pathlib import Path
+from typing import Dict, Iterator, Tuple
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape, unescape
+
+import pandas as pd
+from openpyxl.utils.cell import column_index_from_string, get_column_letter
+from openpyxl.utils.datetime import to_excel
+
+import instrumentation
+import utils
+
+main_namespace = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+relationships_namespace = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+package_relationships_namespace = "http://schemas.openxmlformats.org/package/2006/relationships"
+calc_chain_type = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/calcChain"
+
+sheet_data_pattern = re.compile(r"<sheetData\b[^>]*?(/?)>")
+sheet_data_end_pattern = re.compile(r"\s*</sheetData>")
+row_pattern = re.compile(r"\s*(<row\b[^>]*?/>|<row\b.*?</row>)", re.S)
+row_start_pattern = re.compile(r"<row\b[^>]*?(/?)>")
+row_number_pattern = re.compile(r'(<row\b[^>]*?\br=")(\d+)(")')
+spans_pattern = re.compile(r'\s+spans="[^"]*"')
+cell_pattern = re.compile(r"<c\b[^>]*?/>|<c\b.*?</c>", re.S)
+cell_reference_pattern = re.compile(r'(<c\b[^>]*?\br=")([A-Z]+)(\d+)(")')
+cell_attribute_pattern = re.compile(r'\b(r|s|t)="([^"]*)"')
+cell_value_pattern = re.compile(r"<v>([^<]*)</v>")
+inline_string_pattern = re.compile(r"<is>(.*?)</is>", re.S)
+text_pattern = re.compile(r"<t\b[^>]*>([^<]*)</t>")
+reference_attribute_pattern = re.compile(r'\b(ref|sqref|topLeftCell|activeCell)="([^"]*)"')
+removable_elements_pattern = re.compile(
+    r"<(mergeCell|hyperlink|conditionalFormatting|dataValidation)\b[^>]*?\b(?:ref|sqref)=\"([^\"]*)\"[^>]*?(?:/>|>.*?</\1>)",
+    re.S,
+)
+defined_name_pattern = re.compile(r"(<definedName\b[^>]*>)(.*?)(</definedName>)", re.S)
+
+
+# region READING THE TEMPLATE
+
+def get_sheet_paths(template: zipfile.ZipFile) -> Dict[str, str]:
+    """
+    Works out which part of the template zip file holds each sheet
+
+    Args:
+        template (zipfile.ZipFile): The template
+
+    Returns:
+        Dict[str, str]: A dictionary of {sheet name: path of the sheet's XML within the zip file}
+    """
+    workbook = ElementTree.fromstring(template.read("xl/workbook.xml"))
+    relationships = ElementTree.fromstring(template.read("xl/_rels/workbook.xml.rels"))
+    targets = {
+        relationship.get("Id"): relationship.get("Target")
+        for relationship in relationships.iter(f"{{{package_relationships_namespace}}}Relationship")
+    }
+    sheet_paths = {}
+    for sheet in workbook.iter(f"{{{main_namespace}}}sheet"):
+        target = targets[sheet.get(f"{{{relationships_namespace}}}id")]
+        if target.startswith("/"):
+            sheet_paths[sheet.get("name")] = target.lstrip("/")
+        else:
+            sheet_paths[sheet.get("name")] = posixpath.normpath(posixpath.join("xl", target))
+    return sheet_paths
+
+
+def get_tag_strings(template: zipfile.ZipFile) -> Dict[str, str]:
+    """
+    Finds the shared strings in the template which are tags. Cells holding text refer to shared strings by their position
+    in the list, so this tells us which cells hold tags.
+
+    Args:
+        template (zipfile.ZipFile): The template
+
+    Returns:
+        Dict[str, str]: A dictionary of {shared string number: tag}
+    """
+    tag_strings = {}
+    if "xl/sharedStrings.xml" not in template.namelist():
+        return tag_strings
+    with template.open("xl/sharedStrings.xml") as source:
+        string_number = 0
+        for _, element in ElementTree.iterparse(source):
+            if element.tag == f"{{{main_namespace}}}si":
+                text = "".join(t.text or "" for t in element.iter(f"{{{main_namespace}}}t"))
+                if utils.is_tag(text):
+                    tag_strings[str(string_number)] = text
+                string_number += 1
+                element.clear()
+    return tag_strings
+
+
+def iter_sheet_xml(source, chunk_size: int = 1 << 20) -> Iterator[Tuple[str, str]]:
+    """
+    Reads a sheet's XML in chunks, splitting it up into the part before the rows, each row in turn, and the part after the rows.
+
+    Args:
+        source: The open sheet XML file
+        chunk_size (int, optional): The number of bytes to read at a time. Defaults to 1MB.
+
+    Yields:
+        Tuple[str, str]: The kind of part ('head', 'row' or 'tail') and its XML
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    stage = "head"
+    finished = False
+    while not finished:
+        chunk = source.read(chunk_size)
+        finished = not chunk
+        buffer += decoder.decode(chunk, final=finished)
+
+        if stage == "head":
+            match = sheet_data_pattern.search(buffer)
+            if match is None:
+                continue
+            if match.group(1):
+                # An empty sheet; write it out as an empty sheetData element so that the tail can be handled as usual
+                yield "head", buffer[: match.start()] + "<sheetData>"
+                buffer = "</sheetData>" + buffer[match.end():]
+                stage = "tail"
+            else:
+                yield "head", buffer[: match.end()]
+                buffer = buffer[match.end():]
+                stage = "rows"
+
+        if stage == "rows":
+            position = 0
+            while True:
+                if sheet_data_end_pattern.match(buffer, position):
+                    stage = "tail"
+                    break
+                match = row_pattern.match(buffer, position)
+                if match is None:
+                    break
+                yield "row", match.group(1)
+                position = match.end()
+            buffer = buffer[position:]
+
+    yield "tail", buffer
+
+
+def get_row_number(row_xml: str) -> int:
+    return int(row_number_pattern.search(row_xml).group(2))
+
+
+def split_row(row_xml: str) -> Tuple[str, Dict[int, str]]:
+    """
+    Splits a row's XML into the opening row element and its cells
+
+    Args:
+        row_xml (str): The row's XML
+
+    Returns:
+        Tuple[str, Dict[int, str]]: The opening <row> element, and a dictionary of {column index: cell XML}
+    """
+    match = row_start_pattern.match(row_xml)
+    row_open = match.group(0)
+    if match.group(1):
+        row_open = row_open[:-2].rstrip() + ">"
+    cells = {}
+    for cell_xml in cell_pattern.findall(row_xml, match.end()):
+        reference = cell_reference_pattern.search(cell_xml)
+        cells[column_index_from_string(reference.group(2))] = cell_xml
+    return row_open, cells
+
+
+def get_cell_tag(cell_xml: str, tag_strings: Dict[str, str]) -> str:
+    """
+    Returns the tag held in a cell, or None if the cell doesn't hold a tag
+    """
+    attributes = dict(cell_attribute_pattern.findall(cell_xml[: cell_xml.find(">") + 1]))
+    if attributes.get("t") == "inlineStr":
+        inline_string = inline_string_pattern.search(cell_xml)
+        text = unescape("".join(text_pattern.findall(inline_string.group(1)))) if inline_string else ""
+        return text if utils.is_tag(text) else None
+    if attributes.get("t") != "s":
+        return None
+    value = cell_value_pattern.search(cell_xml)
+    return tag_strings.get(value.group(1)) if value else None
+
+
+def find_tag_cells(template: zipfile.ZipFile, sheet_path: str, tag_strings: Dict[str, str]) -> Dict[str, Tuple]:
+    """
+    Makes one pass over a sheet's XML, finding the first cell holding each tag (reading left to right, top to bottom)
+
+    Args:
+        template (zipfile.ZipFile): The template
+        sheet_path (str): The path of the sheet's XML within the template
+        tag_strings (Dict[str, str]): The shared strings which are tags, from get_tag_strings
+
+    Returns:
+        Dict[str, Tuple]: A dictionary of {tag: index of the cell containing it}
+    """
+    tag_cells = {}
+    with template.open(sheet_path) as source:
+        for kind, xml in iter_sheet_xml(source):
+            if kind != "row":
+                continue
+            row_number = get_row_number(xml)
+            for column, cell_xml in split_row(xml)[1].items():
+                tag = get_cell_tag(cell_xml, tag_strings)
+                if tag is not None:
+                    tag_cells.setdefault(tag, (row_number, column))
+    return tag_cells
+
+
+# region WRITING THE OUTPUT
+
+def make_cell_xml(reference: str, style: str, value) -> str:
+    """
+    Makes the XML for a single cell. Text is written as an inline string, so the template's shared strings don't need to change.
+
+    Args:
+        reference (str): The cell reference, e.g. 'A13'
+        style (str): The cell's style number from the template, or None
+        value: The value to write
+
+    Returns:
+        str: The cell's XML
+    """
+    attributes = f'r="{reference}"' + (f' s="{style}"' if style is not None else "")
+    if value is None or value is pd.NaT or (isinstance(value, float) and math.isnan(value)):
+        return f"<c {attributes}/>"
+    if isinstance(value, bool):
+        return f'<c {attributes} t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, numbers.Integral):
+        return f"<c {attributes}><v>{int(value)}</v></c>"
+    if isinstance(value, numbers.Real):
+        return f"<c {attributes}><v>{float(value)!r}</v></c>"
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return f"<c {attributes}><v>{to_excel(value)!r}</v></c>"
+    text = escape(str(value))
+    return f'<c {attributes} t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def get_cell_style(cell_xml: str) -> str:
+    if cell_xml is None:
+        return None
+    return dict(cell_attribute_pattern.findall(cell_xml[: cell_xml.find(">") + 1])).get("s")
+
+
+def make_row_xml(row_open: str, cells: Dict[int, str], row_number: int) -> str:
+    """
+    Puts a row's XML back together, numbering the row and its cells as row_number
+
+    Args:
+        row_open (str): The opening <row> element
+        cells (Dict[int, str]): A dictionary of {column index: cell XML}
+        row_number (int): The row's number in the output
+
+    Returns:
+        str: The row's XML
+    """
+    row_open = row_number_pattern.sub(lambda m: f"{m.group(1)}{row_number}{m.group(3)}", row_open, count=1)
+    cells_xml = "".join(
+        cell_reference_pattern.sub(lambda m: f"{m.group(1)}{m.group(2)}{row_number}{m.group(4)}", cells[column], count=1)
+        for column in sorted(cells)
+    )
+    return f"{row_open}{cells_xml}</row>"
+
+
+def substitute_tags(row_xml: str, tag_strings: Dict[str, str], column_values: Dict[str, dict]) -> str:
+    """
+    Replaces the tags in a row with their values, for Table 1-style sheets.
+
+    Args:
+        row_xml (str): The row's XML
+        tag_strings (Dict[str, str]): The shared strings which are tags, from get_tag_strings
+        column_values (Dict[str, dict]): A dictionary of {column letter: {tag: value}}
+
+    Returns:
+        str: The row's XML, with the tags replaced
+    """
+
+    def replace(match):
+        cell_xml = match.group(0)
+        tag = get_cell_tag(cell_xml, tag_strings)
+        if tag is None:
+            return cell_xml
+        reference = cell_reference_pattern.search(cell_xml)
+        values = column_values.get(reference.group(2), {})
+        if tag not in values:
+            return cell_xml
+        return make_cell_xml(reference.group(2) + reference.group(3), get_cell_style(cell_xml), values[tag])
+
+    return cell_pattern.sub(replace, row_xml)
+
+
+def make_data_row(
+    template_row: str, row_number: int, start_column: int, values, tag_strings: Dict[str, str]
+) -> str:
+    """
+    Makes an output row in a data region, taking the row's formatting and cell styles from a template row.
+
+    Args:
+        template_row (str): The XML of the template row to copy the formatting of, or None if there is no such row
+        row_number (int): The row's number in the output
+        start_column (int): The column index to write the first value in
+        values: The values to write, or an empty sequence for a blank row
+        tag_strings (Dict[str, str]): The shared strings which are tags; any tags in the template row are cleared
+
+    Returns:
+        str: The row's XML
+    """
+    if template_row is None:
+        row_open, template_cells = f'<row r="{row_number}">', {}
+    else:
+        row_open, template_cells = split_row(template_row)
+        row_open = spans_pattern.sub("", row_open)
+
+    cells = {}
+    for column, cell_xml in template_cells.items():
+        if get_cell_tag(cell_xml, tag_strings) is not None:
+            cell_xml = make_cell_xml(get_column_letter(column) + str(row_number), get_cell_style(cell_xml), None)
+        cells[column] = cell_xml
+    for column, value in enumerate(values, start=start_column):
+        reference = get_column_letter(column) + str(row_number)
+        cells[column] = make_cell_xml(reference, get_cell_style(template_cells.get(column)), value)
+    return make_row_xml(row_open, cells, row_number)
+
+
+def move_references(xml: str, idx: int, amount: int) -> str:
+    """
+    Moves the cell references in the parts of a sheet's XML outside the rows (merged cells, hyperlinks, conditional
+    formatting, the sheet's dimensions and so on). Elements referring only to deleted rows are removed.
+
+    Args:
+        xml (str): The XML before or after the rows
+        idx (int): The row at which rows are inserted or deleted
+        amount (int): The number of rows inserted (positive) or deleted (negative)
+
+    Returns:
+        str: The XML, with the references moved
+    """
+
+    def remove_deleted(match):
+        return "" if utils.move_sqref(match.group(2), idx, amount) is None else match.group(0)
+
+    def replace(match):
+        moved = utils.move_sqref(match.group(2), idx, amount)
+        return f'{match.group(1)}="{moved or match.group(2)}"'
+
+    xml = removable_elements_pattern.sub(remove_deleted, xml)
+    # The counts of merged cells and data validations may now be out, so drop them (they're optional),
+    # and drop any lists which are now empty
+    xml = re.sub(r'(<(?:mergeCells|dataValidations)\b[^>]*?)\s+count="\d+"', r"\1", xml)
+    xml = re.sub(r"<(mergeCells|hyperlinks|dataValidations)\b[^>]*>\s*</\1>", "", xml)
+    return reference_attribute_pattern.sub(replace, xml)
+
+
+def write_sheet(
+    template: zipfile.ZipFile,
+    sheet_path: str,
+    target,
+    tag_strings: Dict[str, str],
+    table: pd.DataFrame = None,
+    column_values: Dict[str, dict] = None,
+) -> Tuple[int, int]:
+    """
+    Streams one sheet from the template to the output, writing a table into its data region and/or replacing its tags with values.
+
+    Args:
+        template (zipfile.ZipFile): The template
+        sheet_path (str): The path of the sheet's XML within the template
+        target: The open file in the output zip to write the sheet's XML to
+        tag_strings (Dict[str, str]): The shared strings which are tags, from get_tag_strings
+        table (pd.DataFrame, optional): The table to write from the <start> cell. Defaults to None.
+        column_values (Dict[str, dict], optional): Values for tags, as {column letter: {tag: value}}. Defaults to None.
+
+    Returns:
+        Tuple[int, int]: The row at which rows were inserted or deleted and the number of rows (as used by utils.move_row),
+            or None if no rows were moved
+    """
+    column_values = column_values or {}
+    row_move = None
+    if table is not None:
+        tag_cells = find_tag_cells(template, sheet_path, tag_strings)
+        if "<start>" not in tag_cells or "<end>" not in tag_cells:
+            raise ValueError(f"{sheet_path} needs both a <start> and an <end> tag to write a table to")
+        start_row, start_column = tag_cells["<start>"]
+        end_row = tag_cells["<end>"][0]
+        # The table goes in from the start row, followed by one blank row; the rest of the template rows up to and
+        # including the <end> row are removed, or, if the table is longer than the template allows for, rows are added.
+        last_row = start_row + len(table)
+        if last_row < end_row:
+            row_move = (last_row + 1, last_row - end_row)
+        elif last_row > end_row:
+            row_move = (end_row, last_row - end_row)
+        rows_to_write = zip(*(table.iloc[:, i].tolist() for i in range(table.shape[1])))
+        next_output_row = start_row
+        style_row = None
+
+    def write_region_rows(up_to_row: int) -> None:
+        # Writes the data region's output rows up to (not including) up_to_row, styled after the latest template row
+        nonlocal next_output_row
+        while next_output_row < up_to_row and next_output_row <= last_row:
+            values = next(rows_to_write, ())
+            target.write(make_data_row(style_row, next_output_row, start_column, values, tag_strings))
+            next_output_row += 1
+
+    with template.open(sheet_path) as source:
+        for kind, xml in iter_sheet_xml(source):
+            if kind in ("head", "tail"):
+                if kind == "tail" and table is not None:
+                    write_region_rows(last_row + 1)
+                if row_move is not None:
+                    xml = move_references(xml, *row_move)
+                target.write(xml)
+                continue
+
+            row_number = get_row_number(xml)
+            if table is None or row_number < start_row:
+                target.write(substitute_tags(xml, tag_strings, column_values))
+            elif row_number < end_row:
+                write_region_rows(row_number)
+                style_row = xml
+                write_region_rows(row_number + 1)
+            elif row_number == end_row:
+                write_region_rows(last_row + 1)
+            else:
+                write_region_rows(last_row + 1)
+                new_row_number = utils.move_row(row_number, *row_move) if row_move else row_number
+                row_open, cells = split_row(substitute_tags(xml, tag_strings, column_values))
+                target.write(make_row_xml(row_open, cells, new_row_number))
+
+    return row_move
+
+
+def write_workbook_xml(workbook_xml: str, sheet_row_moves: Dict[str, Tuple[int, int]]) -> str:
+    """
+    Moves the references in the workbook's defined names to follow the rows inserted or deleted in each sheet.
+
+    Args:
+        workbook_xml (str): The template's workbook XML
+        sheet_row_moves (Dict[str, Tuple[int, int]]): A dictionary of {sheet name: (idx, amount)}
+
+    Returns:
+        str: The workbook XML for the output
+    """
+
+    def replace(match):
+        text = match.group(2)
+        for sheet_name, (idx, amount) in sheet_row_moves.items():
+            text = utils.move_sheet_references(text, escape(sheet_name), idx, amount)
+        return match.group(1) + text + match.group(3)
+
+    return defined_name_pattern.sub(replace, workbook_xml)
+
+
+def write_workbook(
+    template_path: Path,
+    output_path: Path,
+    tables: Dict[str, pd.DataFrame],
+    tag_values: Dict[str, Dict[str, dict]] = None,
+) -> None:
+    """
+    Writes the output Excel file from the template, without loading either into memory as a whole.
+
+    Args:
+        template_path (Path): The template .xlsx file
+        output_path (Path): Where to write the output .xlsx file
+        tables (Dict[str, pd.DataFrame]): The tables to write, as {sheet name: table}. Each table is written from the
+            sheet's <start> cell, with its columns in the same order as the template.
+        tag_values (Dict[str, Dict[str, dict]], optional): Values to replace tags with, as
+            {sheet name: {column letter: {tag: value}}}. Defaults to None.
+    """
+    tag_values = tag_values or {}
+    with zipfile.ZipFile(template_path) as template, zipfile.ZipFile(
+        output_path, "w", compression=zipfile.ZIP_DEFLATED
+    ) as output:
+        sheet_paths = get_sheet_paths(template)
+        sheets_by_path = {path: name for name, path in sheet_paths.items()}
+        for sheet_name in list(tables) + list(tag_values):
+            if sheet_name not in sheet_paths:
+                raise KeyError(f"Worksheet {sheet_name} does not exist in {template_path}")
+        tag_strings = get_tag_strings(template)
+
+        sheet_row_moves = {}
+        for info in template.infolist():
+            sheet_name = sheets_by_path.get(info.filename)
+            if info.filename == "xl/workbook.xml":
+                # Written last, once we know how each sheet's rows have moved
+                continue
+            if info.filename == "xl/calcChain.xml":
+                # The calculation chain lists formula cells by position; Excel rebuilds it when it's missing
+                continue
+            if info.filename in ("[Content_Types].xml", "xl/_rels/workbook.xml.rels"):
+                xml = template.read(info.filename).decode("utf-8")
+                xml = re.sub(r'<Override PartName="/xl/calcChain.xml"[^>]*/>', "", xml)
+                xml = re.sub(rf'<Relationship [^>]*Type="{calc_chain_type}"[^>]*/>', "", xml)
+                output.writestr(info.filename, xml)
+            elif sheet_name in tables or sheet_name in tag_values:
+                with output.open(info.filename, "w") as target_file, instrumentation.measure_stage(
+                    "write_table", sheet_name=sheet_name
+                ) as stage:
+                    target = codecs.getwriter("utf-8")(target_file)
+                    row_move = write_sheet(
+                        template=template,
+                        sheet_path=info.filename,
+                        target=target,
+                        tag_strings=tag_strings,
+                        table=tables.get(sheet_name),
+                        column_values=tag_values.get(sheet_name),
+                    )
+                    stage["rows"], stage["cells"] = instrumentation.count_cells(
+                        tables[sheet_name] if sheet_name in tables else tag_values[sheet_name]
+                    )
+                if row_move is not None:
+                    sheet_row_moves[sheet_name] = row_move
+            else:
+                with template.open(info) as source, output.open(info.filename, "w") as target_file:
+                    shutil.copyfileobj(source, target_file)
+
+        workbook_xml = template.read("xl/workbook.xml").decode("utf-8")
+        output.writestr("xl/workbook.xml", write_workbook_xml(workbook_xml, sheet_row_moves))
+    return None
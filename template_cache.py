@@ -0,0 +1,185 @@
+"""
+This keeps a compiled copy of each template, so that a template which hasn't changed isn't parsed again on every run.
+
+Loading a template with openpyxl means unzipping it and parsing the XML of every sheet, which takes around a second for
+the larger example templates. With config.use_template_cache() on, the first time a template is loaded the parsed workbook
+is saved to config.get_template_cache_dir(), along with the tag index of each sheet (see utils.build_tag_index()), so
+the <start>, <end> and other tags don't need finding again either. Later runs load the compiled copy instead.
+
+Compiled copies are stored under a key made from the template's contents, the openpyxl version and this module's code,
+so a changed template is always compiled again. Their names also include a hash of where the template is, so templates in
+different folders with the same name (such as each project's template.xlsx) don't share or delete each other's copies.
+Older copies of the same template are deleted when a new one is saved.
+
+The cells of each sheet are stored compactly - a tuple for each cell, with each distinct style stored once per sheet -
+rather than as openpyxl's cell objects, which take much longer to unpickle. The output written from a compiled copy is the
+same as from the template, except that merged cells may be listed in a different order, as openpyxl keeps them in a set.
+"""
+import copyreg
+import hashlib
+import inspect
+import io
+import pickle
+from pathlib import Path
+
+import openpyxl
+from openpyxl.cell.cell import Cell, MergedCell
+from openpyxl.styles.cell_style import StyleArray
+from openpyxl.utils.indexed_list import IndexedList
+
+import config
+import frame_cache
+import utils
+
+
+def get_template_key(template_path: Path) -> str:
+    """
+    Hashes everything a compiled template depends on: the template, the openpyxl version and this module's code.
+    """
+    parts = [
+        frame_cache.get_file_hash(template_path),
+        openpyxl.__version__,
+        frame_cache.get_file_hash(Path(inspect.getsourcefile(get_template_key))),
+    ]
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+
+def get_compiled_prefix(template_path: Path) -> str:
+    """
+    Names the compiled copies of a template after it and a hash of where it is, so each template has its own.
+    """
+    path_hash = hashlib.sha256(str(Path(template_path).resolve()).encode()).hexdigest()
+    return f"{template_path.stem}-{path_hash[:8]}"
+
+
+def get_compiled_path(template_path: Path, template_key: str) -> Path:
+    return config.get_template_cache_dir() / f"{get_compiled_prefix(template_path)}-{template_key[:16]}.pickle"
+
+
+def pack_cells(ws: openpyxl.worksheet) -> tuple:
+    """
+    Takes the cells out of a worksheet, as the distinct styles in it and a tuple for each cell of its row, column,
+    style (by position in the styles), value, data type, hyperlink and comment, and whether it's part of a merged cell.
+    """
+    styles = {}
+    cells = []
+    for (row, column), cell in ws._cells.items():
+        style = None if cell._style is None else styles.setdefault(tuple(cell._style), len(styles))
+        if isinstance(cell, MergedCell):
+            cells.append((row, column, style, None, None, None, None, True))
+            continue
+        comment = cell._comment
+        if comment is not None:
+            # The comment is bound to the cell again when it's unpacked
+            comment.unbind()
+        cells.append((row, column, style, cell._value, cell.data_type, cell._hyperlink, comment, False))
+    ws._cells = {}
+    return list(styles), cells
+
+
+def unpack_cells(ws: openpyxl.worksheet, styles: list, cells: list) -> None:
+    """
+    Puts the cells taken out of a worksheet by pack_cells() back into it.
+    """
+    ws_cells = {}
+    for row, column, style, value, data_type, hyperlink, comment, is_merged in cells:
+        if is_merged:
+            cell = MergedCell.__new__(MergedCell)
+        else:
+            cell = Cell.__new__(Cell)
+            cell._value = value
+            cell.data_type = data_type
+            cell._hyperlink = hyperlink
+            cell._comment = comment
+            if comment is not None:
+                comment.bind(cell)
+        cell.row = row
+        cell.column = column
+        cell.parent = ws
+        # Each cell needs its own style array, as openpyxl changes them in place
+        cell._style = None if style is None else StyleArray(styles[style])
+        ws_cells[(row, column)] = cell
+    ws._cells = ws_cells
+    return None
+
+
+def make_indexed_list(items: list, state: dict) -> IndexedList:
+    indexed_list = IndexedList()
+    list.extend(indexed_list, items)
+    indexed_list.__dict__.update(state)
+    return indexed_list
+
+
+def reduce_indexed_list(indexed_list: IndexedList) -> tuple:
+    state = dict(vars(indexed_list))
+    # openpyxl changes some styles after adding them to the index, so they can't be found in it any more. Unpickling
+    # would index them by their new values, so they are left out, for the index to find the same entries it did before.
+    index = indexed_list._dict
+    state["_dict"] = {value: idx for value, idx in index.items() if value in index and index[value] == idx}
+    return make_indexed_list, (list(indexed_list), state)
+
+
+def pickle_compiled_template(compiled: dict) -> bytes:
+    """
+    Pickles a compiled template. openpyxl's indexed lists (of styles and shared strings) are pickled as their items and
+    their own index, as unpickling them directly adds their items to an index shared by every indexed list.
+    """
+    buffer = io.BytesIO()
+    pickler = pickle.Pickler(buffer, protocol=pickle.HIGHEST_PROTOCOL)
+    pickler.dispatch_table = copyreg.dispatch_table.copy()
+    pickler.dispatch_table[IndexedList] = reduce_indexed_list
+    pickler.dump(compiled)
+    return buffer.getvalue()
+
+
+def compile_template(template_path: Path) -> Path:
+    """
+    Parses a template with openpyxl and saves the compiled copy, deleting any older copies of it.
+
+    Args:
+        template_path (Path): The template
+
+    Returns:
+        Path: The compiled copy
+    """
+    template_key = get_template_key(template_path)
+    compiled_path = get_compiled_path(template_path, template_key)
+    wb = openpyxl.load_workbook(template_path)
+    tag_indexes = [utils.build_tag_index(ws) for ws in wb.worksheets]
+    sheets = [pack_cells(ws) for ws in wb.worksheets]
+    compiled = {"workbook": wb, "sheets": sheets, "tag_indexes": tag_indexes}
+    frame_cache.write_atomically(
+        compiled_path, lambda path: path.write_bytes(pickle_compiled_template(compiled))
+    )
+    for old_path in compiled_path.parent.glob(f"{get_compiled_prefix(template_path)}-*.pickle"):
+        if old_path != compiled_path:
+            old_path.unlink(missing_ok=True)
+    return compiled_path
+
+
+def load_template(template_path: Path) -> openpyxl.Workbook:
+    """
+    Loads a template from its compiled copy, compiling it first if it has changed since it was last compiled.
+    A compiled copy which can't be read is compiled again.
+
+    Args:
+        template_path (Path): The template
+
+    Returns:
+        openpyxl.Workbook: The template, as openpyxl.load_workbook() would load it, with each sheet's tag index built
+    """
+    compiled_path = get_compiled_path(template_path, get_template_key(template_path))
+    compiled = None
+    if compiled_path.exists():
+        try:
+            compiled = pickle.loads(compiled_path.read_bytes())
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            pass
+    if compiled is None:
+        compiled = pickle.loads(compile_template(template_path).read_bytes())
+
+    wb = compiled["workbook"]
+    for ws, (styles, cells), tag_index in zip(wb.worksheets, compiled["sheets"], compiled["tag_indexes"]):
+        unpack_cells(ws, styles, cells)
+        utils.set_tag_index(ws, tag_index)
+    return wb
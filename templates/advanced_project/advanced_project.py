@@ -11,8 +11,11 @@ If your publication does not include a sheet like this, we recommend sticking to
 Advice on how to adapt this project to your own can be found in the README. 
 """
 from pathlib import Path
-import openpyxl
 
+import config
+import incremental
+import instrumentation
+import stream_writer
 import utils
 from templates.advanced_project import table_1
 
@@ -20,27 +23,61 @@ from templates.advanced_project import table_1
 
 template_path = Path('templates/advanced_project/advanced_template.xlsx')
 
+# The sheets this project writes a table to, in the order they are written. Table 1 is made and written separately,
+# as its values are written to tagged cells rather than as a single table.
+sheet_names = [
+    "Table 2a",
+    "Table 2b",
+    "Table 2c",
+    "Table 2d",
+    "Table 3a",
+    "Table 3b",
+    "Table 3c",
+    "Table 3d",
+    "Table 5",
+]
+
+def get_table_makers() -> dict:
+    """The function which makes each of this project's tables, by sheet name, starting with Table 1's values."""
+    makers = {"Table 1": table_1.make_table1_values}
+    makers.update({sheet_name: utils.table_makers[sheet_name] for sheet_name in sheet_names})
+    return makers
+
 def make_excel_output() -> None:
     """Creates and writes the Excel file for the 'advanced' project. 
     """    
     # Set Up
     output_path = Path('outputs/advanced_output.xlsx')
-    wb = openpyxl.load_workbook(template_path) # Make and Write Each Sheet
 
-    # Make the Excel file
-    wb = table_1.make_and_write_table1(wb=wb)
-    wb = utils.make_and_write_2a(wb=wb)
-    wb = utils.make_and_write_2b(wb=wb)
-    wb = utils.make_and_write_2c(wb=wb)
-    wb = utils.make_and_write_2d(wb=wb)
-    wb = utils.make_and_write_3a(wb=wb)
-    wb = utils.make_and_write_3b(wb=wb)
-    wb = utils.make_and_write_3c(wb=wb)
-    wb = utils.make_and_write_3d(wb=wb)
+    # Start loading the template, so that it is parsed while the tables are made
+    load_template = utils.start_loading_template(template_path)
 
-    wb = utils.make_and_write_table_5(wb=wb)
+    # Make the tables
+    makers = get_table_makers()
+    tables, timings = incremental.prepare_tables(project_name="advanced", makers=makers)
+    if config.report_table_timings():
+        utils.print_table_timings("Advanced Project", timings)
+    table1_values = tables.pop("Table 1")
 
-    # Save
+    # With an incremental build, there's nothing to write if no table has changed since the last run
+    if incremental.is_output_current("advanced", template_path, output_path, list(makers)):
+        print("Advanced Project: Excel file is up to date")
+        return None
 
-    wb.save(output_path)
+    # Write the Excel file
+    if config.get_output_engine() == "streaming":
+        with instrumentation.measure_stage("write_workbook"):
+            stream_writer.write_workbook(
+                template_path=template_path,
+                output_path=output_path,
+                tables=tables,
+                tag_values={"Table 1": table1_values},
+            )
+    else:
+        wb = load_template()
+        wb = table_1.write_table1(wb=wb, table1_values=table1_values)
+        wb = utils.write_tables(wb=wb, tables=tables)
+        with instrumentation.measure_stage("save"):
+            wb.save(output_path)
+    incremental.record_output("advanced", template_path, output_path, list(makers))
     print("Advanced Project: Excel file written")
@@ -1,20 +1,20 @@
 # import excel_functions
 import openpyxl
-from pathlib import Path
 # from excel.excel_functions import find_cell_by_tag, find_cell_in_column, get_list_of_months
 import pandas as pd
-import dateutil.relativedelta
 import datetime
 from datetime import datetime
 
 import utils
 import config
+import instrumentation
 
 """
 This is a set of functions specifically for dealing with Table 1 in the excel. 
-The lists will be used by the 'get_breakdown_dict' to assign each tag a value from dae into a dictionary.
-The 'write_table1_month' function goes through each dictionary and uses 'write_single_val' to the template based on the tag used as the key in each dictionary.
-The 'write_table_1' function iterates over the given months + columns. 
+The lists are parsed into the 3 breakdowns of each tag, and 'lookup_table1_values' fetches every tag's value for every month from dae in one go.
+The 'make_table1_values' function iterates over the given months + columns, collecting each month's dictionary without touching the workbook.
+The 'write_table1' function then finds the row of each tag once, and writes the whole tags x months grid to the sheet in blocks of consecutive rows.
+The 'write_table1_month' and 'write_single_val' functions write a single month's column, or a single tagged cell, where only part of the sheet needs writing.
 """
 
 coverage_list = [
@@ -101,118 +101,156 @@ hcp_type_perc_list = [
 ]
 
 
-def make_and_write_table1(wb: openpyxl.Workbook) -> openpyxl.Workbook:
+# The lists of tags, in the order in which they are written to each month's column
+table1_tag_lists = [
+    coverage_list,
+    working_days_list,
+    appointment_count_list,
+    appointment_status_list,
+    appointment_mode_list,
+    time_between_list,
+    hcp_type_list,
+    appointment_status_perc_list,
+    appointment_mode_perc_list,
+    time_between_perc_list,
+    hcp_type_perc_list,
+]
+
+
+def make_table1_values() -> dict:
     """
-    Calls write_table1_month() to write the month data to the specified column, iterating through columns + each month in list of months
+    Works out every value to be written to Table 1, without writing anything to the workbook.
+    Each month in the list of months is given a column, starting from column C.
 
-     Args:
-         wb(openpyxl.Workbook): The workbook to edit
-         data_path(Path): Path to data folder
-         output_path(Path): Path to the output folder
+     Returns:
+         dict: A dictionary of {column letter: {tag: value}}, including the '<month>' tag at the top of each column
     """
     list_of_months = utils.get_list_of_months()
-    column_to_write_to = (
+    first_column = openpyxl.utils.cell.column_index_from_string(
         "C"  # This specifies the first column we want to put a month in
     )
-    table1_data = config.get_table1_data()
+    table1_tags = [tag for tag_list in table1_tag_lists for tag in tag_list]
+    # Every tag's value for every month, fetched from the data in one go
+    table1_matrix = lookup_table1_values(
+        table1_data=config.get_table1_data(), tags=table1_tags, months=list_of_months
+    )
+
+    table1_values = {}
+    for column_number, month in enumerate(list_of_months, start=first_column):
+        month_values = {"<month>": month}
+        month_values.update(zip(table1_tags, table1_matrix[month].tolist()))
+        table1_values[openpyxl.utils.cell.get_column_letter(column_number)] = month_values
+
+    return table1_values
+
+
+def make_and_write_table1(wb: openpyxl.Workbook) -> openpyxl.Workbook:
+    """
+    Makes the Table 1 values for each month in the list of months, and writes them to the sheet with write_table1()
+
+     Args:
+         wb(openpyxl.Workbook): The workbook to edit
+    """
+    return write_table1(wb=wb, table1_values=make_table1_values())
 
-    for month in list_of_months:
+
+def write_table1(wb: openpyxl.Workbook, table1_values: dict) -> openpyxl.Workbook:
+    """
+    Writes the values made by make_table1_values() to the 'Table 1' sheet as one grid of tags x months.
+    Each tag's row is found once, from the first month's column, and the grid is then written a block of
+    consecutive rows at a time rather than looking up and writing each cell in turn.
+
+     Args:
+         wb(openpyxl.Workbook): The workbook to edit
+         table1_values(dict): The values to write, as {column letter: {tag: value}}, for consecutive columns
+    """
+    with instrumentation.measure_stage("write_table", sheet_name="Table 1") as stage:
         ws = wb["Table 1"]
-        write_table1_month(
-            ws=ws, month=month, column=column_to_write_to, table1_data=table1_data
+        columns = list(table1_values)
+        tags = list(table1_values[columns[0]])
+        tag_rows = get_table1_tag_rows(ws=ws, tags=tags, column=columns[0])
+        grid = {
+            tag_rows[tag]: [table1_values[column][tag] for column in columns] for tag in tags
+        }
+        write_table1_grid(
+            ws=ws,
+            first_column=openpyxl.utils.cell.column_index_from_string(columns[0]),
+            grid=grid,
         )
-        new_column_number = (
-            openpyxl.utils.cell.column_index_from_string(column_to_write_to) + 1
-        )
-        column_to_write_to = openpyxl.utils.cell.get_column_letter(new_column_number)
+        stage["rows"], stage["cells"] = instrumentation.count_cells(table1_values)
 
     return wb
-    
 
-def write_table1_month(
-    ws: openpyxl.worksheet, month: str, column: str, table1_data: pd.DataFrame
-) -> None:
+
+def get_table1_tag_rows(ws: openpyxl.worksheet, tags: list, column: str) -> dict:
     """
-    Fetches the tag:value dictionary of each breakdown grouping using get_breakdown_dict(), then writes each value using write_single_val()
+    Finds the row of each tag in the template. Each tag is expected to fill its row, one cell per month column,
+    so its row is found from a single column.
+
+    Args:
+        ws(openpyxl.Worksheet): The worksheet to search
+        tags(list): The tags to find, including '<month>'
+        column(str): The column to search, such as the first month's column
+
+    Returns:
+        dict: A dictionary of {tag: row number}
+    """
+    return {tag: utils.find_cell_in_column(ws=ws, tag=tag, column=column)[0] for tag in tags}
+
+
+def write_table1_grid(ws: openpyxl.worksheet, first_column: int, grid: dict) -> None:
+    """
+    Writes rows of values into the worksheet, starting from the given column. Runs of consecutive rows are
+    written together as one block, and rows which aren't in the grid, such as the gaps between sections, are left alone.
 
     Args:
         ws(openpyxl.Worksheet): The worksheet to edit
-        month(str): The month with which to fill the month tag in the template
-        column(str): The specific column to edit
-        table1_data(pd.DataFrame): The table 1 output from dae
+        first_column(int): The column number of the first month
+        grid(dict): A dictionary of {row number: list of values}
     """
-    table1_data = table1_data[["breakdown_1", "breakdown_2", "breakdown_3", month]]
+    block_start, block = None, []
+    for row in sorted(grid):
+        if block and row != block_start + len(block):
+            utils.write_block(ws=ws, start_cell=(block_start, first_column), values=block)
+            block = []
+        if not block:
+            block_start = row
+        block.append(grid[row])
+    if block:
+        utils.write_block(ws=ws, start_cell=(block_start, first_column), values=block)
 
-    # Month
-    month_cell = utils.find_cell_in_column(ws=ws, tag="<month>", column=column)
-    ws.cell(row=month_cell[0], column=month_cell[1]).value = month
+    return None
 
-    # Coverage
-    coverage_dict = get_breakdown_dict(month, table1_data, coverage_list)
-    for key in coverage_dict:
-        write_single_val(ws, column, key, coverage_dict[key])
 
-    # Working Days
-    working_days_dict = get_breakdown_dict(month, table1_data, working_days_list)
-    for key in working_days_dict:
-        write_single_val(ws, column, key, working_days_dict[key])
+def get_table1_month_values(month: str, table1_data: pd.DataFrame) -> dict:
+    """
+    Fetches the tag:value dictionary of each breakdown grouping for one month
 
-    # Appointment count
-    appointment_count_dict = get_breakdown_dict(
-        month, table1_data, appointment_count_list
-    )
-    for key in appointment_count_dict:
-        write_single_val(ws, column, key, appointment_count_dict[key])
+    Args:
+        month(str): The month with which to fill the month tag in the template
+        table1_data(pd.DataFrame): The table 1 output from dae
 
-    # Appointment status
-    appointment_status_dict = get_breakdown_dict(
-        month, table1_data, appointment_status_list
-    )
-    for key in appointment_status_dict:
-        write_single_val(ws, column, key, appointment_status_dict[key])
+    Returns:
+        dict: A dictionary of {tag: value}, starting with the '<month>' tag
+    """
+    month_values = {"<month>": month}
+    for tag_list in table1_tag_lists:
+        month_values.update(get_breakdown_dict(month, table1_data, tag_list))
 
-    # Appointment mode
-    appointment_mode_dict = get_breakdown_dict(
-        month, table1_data, appointment_mode_list
-    )
-    for key in appointment_mode_dict:
-        write_single_val(ws, column, key, appointment_mode_dict[key])
-
-    # Time between booking and appointment
-    time_between_dict = get_breakdown_dict(month, table1_data, time_between_list)
-    for key in time_between_dict:
-        write_single_val(ws, column, key, time_between_dict[key])
-
-    # HCP type
-    hcp_type_dict = get_breakdown_dict(month, table1_data, hcp_type_list)
-    for key in hcp_type_dict:
-        write_single_val(ws, column, key, hcp_type_dict[key])
-
-    # Appointment status perc
-    appointment_status_perc_dict = get_breakdown_dict(
-        month, table1_data, appointment_status_perc_list
-    )
-    for key in appointment_status_perc_dict:
-        write_single_val(ws, column, key, appointment_status_perc_dict[key])
+    return month_values
 
-    # Appointment mode perc
-    appointment_mode_perc_dict = get_breakdown_dict(
-        month, table1_data, appointment_mode_perc_list
-    )
-    for key in appointment_mode_perc_dict:
-        write_single_val(ws, column, key, appointment_mode_perc_dict[key])
 
-    # Time between booking and appointment perc
-    time_between_perc_dict = get_breakdown_dict(
-        month, table1_data, time_between_perc_list
-    )
-    for key in time_between_perc_dict:
-        write_single_val(ws, column, key, time_between_perc_dict[key])
+def write_table1_month(ws: openpyxl.worksheet, column: str, month_values: dict) -> None:
+    """
+    Writes each value of a month's tag:value dictionary into the specified column using write_single_val()
 
-    # HCP type perc
-    hcp_type_perc_dict = get_breakdown_dict(month, table1_data, hcp_type_perc_list)
-    for key in hcp_type_perc_dict:
-        write_single_val(ws, column, key, hcp_type_perc_dict[key])
+    Args:
+        ws(openpyxl.Worksheet): The worksheet to edit
+        column(str): The specific column to edit
+        month_values(dict): The month's values, as made by get_table1_month_values()
+    """
+    for key in month_values:
+        write_single_val(ws, column, key, month_values[key])
 
     return None
 
@@ -236,29 +274,58 @@ def write_single_val(ws: openpyxl.worksheet, column: str, tag: str, val: float)
 
 def get_breakdown_dict(month: str, data: pd.DataFrame, breakdown_list: list) -> dict:
     """
-    Takes a list of tags and creates an empty dictionary. It will then break down each tag into it's 3 components and use these to search the Table 1 output of dae for each tag's specific value, which it will assign as the value of the tag in the dictionary.
+    Takes a list of tags and looks up each tag's value for one month in the Table 1 output of dae, using lookup_table1_values().
 
     Args:
         month(str): The month from which to retrieve data from in the dae output
         data(pd.DataFrame): The table 1 dae output
         breakdown_list(list): A list of tags that specifys specific cells in the excel template
     """
-    breakdown_dict = dict.fromkeys(breakdown_list)
-    for key in breakdown_dict:
-        breakdown_1, breakdown_2, breakdown_3 = key.split(",")
-        breakdown_1 = breakdown_1.replace("<", "")
-        breakdown_3 = breakdown_3.replace(">", "")
-        breakdown_subset = data.loc[
-            (
-                (data["breakdown_1"] == breakdown_1)
-                & (data["breakdown_2"] == breakdown_2)
-                & (data["breakdown_3"] == breakdown_3)
-            ),
-            month,
-        ]
-        breakdown_dict[key] = breakdown_subset.values[0]
-
-    return breakdown_dict
+    values = lookup_table1_values(table1_data=data, tags=breakdown_list, months=[month])
+    return dict(zip(breakdown_list, values[month].tolist()))
+
+
+def parse_tag(tag: str) -> tuple:
+    """
+    Splits a Table 1 tag, such as '<Appointment Status,Attended,count>', into its 3 breakdowns
+
+    Args:
+        tag(str): The tag
+
+    Returns:
+        tuple: The tag's (breakdown_1, breakdown_2, breakdown_3)
+    """
+    breakdown_1, breakdown_2, breakdown_3 = tag.split(",")
+    return breakdown_1.replace("<", ""), breakdown_2, breakdown_3.replace(">", "")
+
+
+def lookup_table1_values(table1_data: pd.DataFrame, tags: list, months: list) -> pd.DataFrame:
+    """
+    Looks up the value of every tag for every month in the Table 1 output of dae, in one pass.
+    The data is indexed by its 3 breakdown columns, and all the tags are fetched from it with a single reindex,
+    rather than searching the whole table for each tag in turn.
+
+    Args:
+        table1_data(pd.DataFrame): The table 1 dae output
+        tags(list): The tags to look up, each of the form '<breakdown_1,breakdown_2,breakdown_3>'
+        months(list): The months to fetch values for
+
+    Returns:
+        pd.DataFrame: The values, with a row for each tag and a column for each month
+    """
+    breakdown_columns = ["breakdown_1", "breakdown_2", "breakdown_3"]
+    indexed_data = table1_data.set_index(breakdown_columns)[months]
+    # If a breakdown appears more than once, the first row is used
+    indexed_data = indexed_data[~indexed_data.index.duplicated()]
+
+    tag_breakdowns = pd.MultiIndex.from_tuples([parse_tag(tag) for tag in tags], names=breakdown_columns)
+    missing_tags = [tag for tag, found in zip(tags, tag_breakdowns.isin(indexed_data.index)) if not found]
+    if missing_tags:
+        raise KeyError(f"No Table 1 data for the tags: {', '.join(missing_tags)}")
+
+    values = indexed_data.reindex(tag_breakdowns)
+    values.index = tags
+    return values
 
 
 def make_month_to_write(month: str) -> str:
@@ -6,12 +6,23 @@ This is the most template project with the most straightforward logic: the data
 For info on how to adapt this template to your own project, see the README.
 """
 from pathlib import Path
-import openpyxl
+import config
+import incremental
+import instrumentation
+import stream_writer
 import utils
 
 
 template_path = Path("templates/easy_project/easy_template.xlsx")
 
+# The sheets this project writes a table to, in the order they are written
+sheet_names = ["Easy A", "Easy B"]
+
+
+def get_table_makers() -> dict:
+    """The function which makes each of this project's tables, by sheet name."""
+    return {sheet_name: utils.table_makers[sheet_name] for sheet_name in sheet_names}
+
 
 def make_excel_output() -> None:
     """Creates and writes the output Excel file for the easy project
@@ -22,13 +33,32 @@ def make_excel_output() -> None:
 
     # Set Up
     output_path = Path("outputs/easy_output.xlsx")
-    wb = openpyxl.load_workbook(template_path)  # Make and Write Each Sheet
 
-    # Make the sheets
-    wb = utils.make_and_write_easy_a(wb=wb)
-    wb = utils.make_and_write_easy_b(wb=wb)
+    # Start loading the template, so that it is parsed while the tables are made
+    load_template = utils.start_loading_template(template_path)
+
+    # Make the tables
+    makers = get_table_makers()
+    tables, timings = incremental.prepare_tables(project_name="easy", makers=makers)
+    if config.report_table_timings():
+        utils.print_table_timings("Easy project", timings)
+
+    # With an incremental build, there's nothing to write if no table has changed since the last run
+    if incremental.is_output_current("easy", template_path, output_path, list(makers)):
+        print("Easy project: Excel file is up to date")
+        return None
 
     # Write the workbook
-    wb.save(output_path)
+    if config.get_output_engine() == "streaming":
+        with instrumentation.measure_stage("write_workbook"):
+            stream_writer.write_workbook(
+                template_path=template_path, output_path=output_path, tables=tables
+            )
+    else:
+        wb = load_template()
+        wb = utils.write_tables(wb=wb, tables=tables)
+        with instrumentation.measure_stage("save"):
+            wb.save(output_path)
+    incremental.record_output("easy", template_path, output_path, list(makers))
     print("Easy project: Excel file written")
     return None
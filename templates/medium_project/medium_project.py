@@ -8,29 +8,60 @@ This builds on the logic and functionality from the 'Easy' project.
 Advice on how to adapt this to your own project can be found in the README. 
 """
 from pathlib import Path
-import openpyxl
+import config
+import incremental
+import instrumentation
+import stream_writer
 import utils
 
 
 
 template_path = Path('templates/medium_project/medium_template.xlsx')
 
+# The sheets this project writes a table to, in the order they are written
+sheet_names = [
+    "Table 2a",
+    "Table 2b",
+    "Table 2c",
+    "Table 2d",
+    "Table 3a",
+    "Table 3b",
+    "Table 3c",
+    "Table 3d",
+    "Table 5",
+]
+
+def get_table_makers() -> dict:
+    """The function which makes each of this project's tables, by sheet name."""
+    return {sheet_name: utils.table_makers[sheet_name] for sheet_name in sheet_names}
+
+
 def make_excel_output() -> None:
     # Set Up
     output_path = Path('outputs/medium_output.xlsx')
-    wb = openpyxl.load_workbook(template_path) # Make and Write Each Sheet
 
-    wb = utils.make_and_write_2a(wb=wb)
-    wb = utils.make_and_write_2b(wb=wb)
-    wb = utils.make_and_write_2c(wb=wb)
-    wb = utils.make_and_write_2d(wb=wb)
-    wb = utils.make_and_write_3a(wb=wb)
-    wb = utils.make_and_write_3b(wb=wb)
-    wb = utils.make_and_write_3c(wb=wb)
-    wb = utils.make_and_write_3d(wb=wb)
+    # Start loading the template, so that it is parsed while the tables are made
+    load_template = utils.start_loading_template(template_path)
 
-    wb = utils.make_and_write_table_5(wb=wb)
+    # Make the tables
+    makers = get_table_makers()
+    tables, timings = incremental.prepare_tables(project_name="medium", makers=makers)
+    if config.report_table_timings():
+        utils.print_table_timings("Medium project", timings)
 
+    # With an incremental build, there's nothing to write if no table has changed since the last run
+    if incremental.is_output_current("medium", template_path, output_path, list(makers)):
+        print("Medium project: Excel file is up to date")
+        return None
 
-    wb.save(output_path)
+    # Write the workbook
+    if config.get_output_engine() == "streaming":
+        with instrumentation.measure_stage("write_workbook"):
+            stream_writer.write_workbook(template_path=template_path, output_path=output_path, tables=tables)
+    else:
+        wb = load_template()
+        wb = utils.write_tables(wb=wb, tables=tables)
+        with instrumentation.measure_stage("save"):
+            wb.save(output_path)
+    incremental.record_output("medium", template_path, output_path, list(makers))
     print("Medium project: Excel file written")
@@ -0,0 +1,41 @@
+import pandas as pd
+import pytest
+
+import config
+import utils
+from benchmarks.generate_data import generate_data
+
+appointments_tables = ["Table 2a", "Table 2b", "Table 2c", "Table 2d", "Table 3a", "Table 3b", "Table 3c", "Table 3d",
+                       "Table 3e", "Table 4"]
+
+
+@pytest.fixture(scope="module")
+def data_dir(tmp_path_factory):
+    data_dir = tmp_path_factory.mktemp("data")
+    # The data has a row for each area on each date, so Table 4's sums by area differ from its rows
+    generate_data(data_dir, rows=20_000, geographies=30, months=13)
+    return data_dir
+
+
+def make_tables() -> dict:
+    config.clear_data_cache()
+    try:
+        return {sheet_name: utils.table_makers[sheet_name]() for sheet_name in appointments_tables}
+    finally:
+        config.clear_data_cache()
+
+
+def test_chunked_reading_gives_the_same_tables(data_dir, monkeypatch):
+    monkeypatch.setattr(config, "get_data_dir", lambda: data_dir)
+    whole_file_tables = make_tables()
+
+    monkeypatch.setattr(config, "use_chunked_reading", lambda: True)
+    monkeypatch.setattr(config, "get_read_chunk_rows", lambda: 1_000)
+    chunked_tables = make_tables()
+
+    for sheet_name in appointments_tables:
+        pd.testing.assert_frame_equal(
+            chunked_tables[sheet_name].reset_index(drop=True),
+            whole_file_tables[sheet_name].reset_index(drop=True),
+            obj=sheet_name,
+        )
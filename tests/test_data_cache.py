@@ -0,0 +1,61 @@
+import threading
+
+import pandas as pd
+
+import config
+
+
+def test_files_are_read_at_the_same_time(tmp_path, monkeypatch):
+    paths = []
+    for name in ["slow", "fast"]:
+        paths.append(tmp_path / f"{name}.csv")
+        pd.DataFrame({"count": [1, 2]}).to_csv(paths[-1], index=False)
+
+    slow_read_started = threading.Event()
+    finish_slow_read = threading.Event()
+    read_data_file = config.read_data_file
+
+    def read_slowly(filepath, schema=None):
+        if filepath == paths[0]:
+            slow_read_started.set()
+            finish_slow_read.wait(timeout=10)
+        return read_data_file(filepath, schema)
+
+    monkeypatch.setattr(config, "read_data_file", read_slowly)
+    config.clear_data_cache()
+    try:
+        slow_read = threading.Thread(target=config.read_data_source, args=(paths[0],))
+        slow_read.start()
+        assert slow_read_started.wait(timeout=10)
+        # The other file can be read while the first is still being read
+        fast_read = threading.Thread(target=config.read_data_source, args=(paths[1],))
+        fast_read.start()
+        fast_read.join(timeout=5)
+        assert not fast_read.is_alive()
+    finally:
+        finish_slow_read.set()
+        slow_read.join()
+        config.clear_data_cache()
+
+
+def test_a_file_is_only_read_once(tmp_path, monkeypatch):
+    path = tmp_path / "data.csv"
+    pd.DataFrame({"count": [1, 2]}).to_csv(path, index=False)
+    reads = []
+    read_data_file = config.read_data_file
+
+    def count_reads(filepath, schema=None):
+        reads.append(filepath)
+        return read_data_file(filepath, schema)
+
+    monkeypatch.setattr(config, "read_data_file", count_reads)
+    config.clear_data_cache()
+    try:
+        threads = [threading.Thread(target=config.read_data_source, args=(path,)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        config.clear_data_cache()
+    assert reads == [path]
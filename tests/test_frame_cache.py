@@ -0,0 +1,68 @@
+import importlib
+import os
+import sys
+import types
+
+import pandas as pd
+
+import config
+import frame_cache
+import utils
+
+
+def write_module(path, source):
+    path.write_text(source)
+    # Make sure the change is seen even if the file is rewritten within the same clock tick
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+
+def test_source_files_include_geography():
+    source_files = {os.path.basename(path) for path in frame_cache.get_source_files(utils.__name__)}
+    assert {"utils.py", "config.py", "geography.py"} <= source_files
+
+
+def test_changing_a_dependency_misses_the_cache(tmp_path, monkeypatch):
+    code_dir = tmp_path / "code"
+    code_dir.mkdir()
+    write_module(code_dir / "cache_test_sort.py", "ORDER = 'ascending'\n")
+    write_module(
+        code_dir / "cache_test_maker.py",
+        "import cache_test_sort\n\n\ndef make_table():\n    return cache_test_sort.ORDER\n",
+    )
+    monkeypatch.syspath_prepend(str(code_dir))
+    monkeypatch.setattr(frame_cache, "repo_dir", code_dir.resolve())
+    monkeypatch.setattr(config, "get_frame_cache_dir", lambda: tmp_path / "frame_cache")
+    frame_cache.get_source_files.cache_clear()
+    maker = importlib.import_module("cache_test_maker")
+
+    try:
+        table = pd.DataFrame({"order": [maker.make_table()]})
+        table_key = frame_cache.store_table(maker.make_table, {}, table)
+        assert frame_cache.find_table_key(maker.make_table) == table_key
+        assert frame_cache.load_table(table_key).equals(table)
+
+        # Only the module the maker imports changes, not the maker's own module
+        write_module(code_dir / "cache_test_sort.py", "ORDER = 'descending by size'\n")
+        # The table has never been made with the new code, so there's nothing in the cache to use
+        assert frame_cache.find_table_key(maker.make_table) is None
+    finally:
+        frame_cache.get_source_files.cache_clear()
+        for module_name in ("cache_test_maker", "cache_test_sort"):
+            sys.modules.pop(module_name, None)
+
+
+def test_modules_with_no_file_are_left_out(monkeypatch):
+    # Such as a setting patched from the interpreter, whose module's file is '<stdin>'
+    interpreter = types.ModuleType("cache_test_interpreter")
+    interpreter.__file__ = str(frame_cache.repo_dir / "<stdin>")
+    exec("def use_frame_cache():\n    return True\n", vars(interpreter))
+    monkeypatch.setitem(sys.modules, interpreter.__name__, interpreter)
+    monkeypatch.setattr(config, "use_frame_cache", interpreter.use_frame_cache)
+    frame_cache.get_source_files.cache_clear()
+    try:
+        source_files = frame_cache.get_source_files(utils.__name__)
+    finally:
+        frame_cache.get_source_files.cache_clear()
+    assert str(frame_cache.repo_dir / "<stdin>") not in source_files
+    assert str(frame_cache.repo_dir / "config.py") in source_files
@@ -0,0 +1,65 @@
+import openpyxl
+from openpyxl.formatting.rule import CellIsRule
+from openpyxl.workbook.defined_name import DefinedName
+from openpyxl.worksheet.datavalidation import DataValidation
+
+import utils
+
+
+def make_workbook():
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Data"
+    for row in range(1, 21):
+        ws.cell(row=row, column=1, value=row)
+    ws.merge_cells("A15:C15")
+    ws.conditional_formatting.add("A12:A14", CellIsRule(operator="greaterThan", formula=["5"]))
+    validation = DataValidation(type="whole")
+    validation.add("B12:B14")
+    ws.add_data_validation(validation)
+    ws["D1"] = "=SUM(A12:A14)"
+    other = wb.create_sheet("Other")
+    other["A1"] = "=Data!A12+'Data'!$A$20"
+    return wb, ws, other
+
+
+def add_defined_name(wb, ws, name, attr_text):
+    # openpyxl 3.0 keeps every defined name on the workbook; 3.1 keeps a sheet's own names on the sheet
+    if hasattr(wb.defined_names, "definedName"):
+        wb.defined_names.append(DefinedName(name, attr_text=attr_text, localSheetId=0))
+    else:
+        ws.defined_names[name] = DefinedName(name, attr_text=attr_text)
+
+
+def test_inserting_rows_moves_everything_below():
+    wb, ws, other = make_workbook()
+    ws.print_area = "A1:C20"
+    add_defined_name(wb, ws, "counts", "Data!$A$12:$A$14")
+
+    utils.move_rows(ws, idx=11, amount=3)
+
+    assert ws["A10"].value == 10
+    assert ws["A11"].value is None
+    assert ws["A15"].value == 12
+    assert [str(merged) for merged in ws.merged_cells.ranges] == ["A18:C18"]
+    assert [str(formatting.sqref) for formatting in ws.conditional_formatting] == ["A15:A17"]
+    assert [str(validation.sqref) for validation in ws.data_validations.dataValidation] == ["B15:B17"]
+    assert ws["D1"].value == "=SUM(A15:A17)"
+    assert other["A1"].value == "=Data!A15+'Data'!$A$23"
+    assert utils.get_print_area(ws) == ["$A$1:$C$23"]
+    assert [name.attr_text for name in utils.get_defined_names(wb)] == ["Data!$A$15:$A$17"]
+
+
+def test_deleting_rows_drops_what_was_in_them():
+    wb, ws, other = make_workbook()
+
+    utils.move_rows(ws, idx=12, amount=-4)
+
+    assert ws["A11"].value == 11
+    assert ws["A12"].value == 16
+    assert ws.max_row == 16
+    assert list(ws.merged_cells.ranges) == []
+    assert list(ws.conditional_formatting) == []
+    assert ws.data_validations.dataValidation == []
+    assert ws["D1"].value == "=SUM(#REF!)"
+    assert other["A1"].value == "=Data!#REF!+'Data'!$A$16"
@@ -0,0 +1,94 @@
+from pathlib import Path
+
+import openpyxl
+import pandas as pd
+import pytest
+from openpyxl.formatting.rule import CellIsRule
+from openpyxl.workbook.defined_name import DefinedName
+from openpyxl.worksheet.datavalidation import DataValidation
+
+import stream_writer
+import utils
+from templates.easy_project import easy_project
+
+repo_dir = Path(__file__).resolve().parents[1]
+
+
+def make_template(path: Path) -> None:
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Data"
+    ws["A1"] = "Title"
+    ws["A3"] = "<start>"
+    ws["A7"] = "<end>"
+    ws["A9"] = "Notes"
+    ws.merge_cells("A9:C9")
+    ws["A10"] = "Link"
+    ws["A10"].hyperlink = "https://example.com"
+    ws.conditional_formatting.add("A12:A13", CellIsRule(operator="greaterThan", formula=["5"]))
+    validation = DataValidation(type="whole")
+    validation.add("B12")
+    ws.add_data_validation(validation)
+    # openpyxl 3.0 keeps every defined name on the workbook; 3.1 keeps them in a dictionary
+    notes = DefinedName("notes", attr_text="Data!$A$9:$C$9")
+    if hasattr(wb.defined_names, "definedName"):
+        wb.defined_names.append(notes)
+    else:
+        wb.defined_names["notes"] = notes
+    wb.save(path)
+
+
+def get_values(ws) -> list:
+    values = [[cell.value for cell in row] for row in ws.iter_rows()]
+    # Blank rows below the last value, which only hold formatting, are left out
+    while values and all(value is None for value in values[-1]):
+        values.pop()
+    return values
+
+
+def describe_output(path: Path) -> dict:
+    wb = openpyxl.load_workbook(path)
+    ws = wb["Data"]
+    return {
+        "values": {cell.coordinate: cell.value for row in ws.iter_rows() for cell in row if cell.value is not None},
+        "merged": sorted(str(merged) for merged in ws.merged_cells.ranges),
+        "hyperlinks": sorted(cell.coordinate for row in ws.iter_rows() for cell in row if cell.hyperlink),
+        "formatting": sorted(str(formatting.sqref) for formatting in ws.conditional_formatting),
+        "validation": sorted(str(validation.sqref) for validation in ws.data_validations.dataValidation),
+        "names": sorted(name.attr_text for name in utils.get_defined_names(wb)),
+    }
+
+
+@pytest.mark.parametrize("rows", [1, 4, 10])
+def test_streaming_matches_openpyxl(tmp_path, rows):
+    template_path = tmp_path / "template.xlsx"
+    make_template(template_path)
+    tables = {"Data": pd.DataFrame({"count": range(1, rows + 1), "name": [f"Row {row}" for row in range(rows)]})}
+
+    openpyxl_path = tmp_path / "openpyxl.xlsx"
+    wb = utils.write_tables(wb=openpyxl.load_workbook(template_path), tables=tables)
+    wb.save(openpyxl_path)
+    streaming_path = tmp_path / "streaming.xlsx"
+    stream_writer.write_workbook(template_path=template_path, output_path=streaming_path, tables=tables)
+
+    streamed = describe_output(streaming_path)
+    assert streamed == describe_output(openpyxl_path)
+    # The notes below the table follow it, one blank row after the data
+    assert streamed["values"][f"A{rows + 5}"] == "Notes"
+    assert streamed["merged"] == [f"A{rows + 5}:C{rows + 5}"]
+
+
+def test_streaming_matches_openpyxl_for_the_easy_project(tmp_path, monkeypatch):
+    monkeypatch.chdir(repo_dir)
+    template_path = repo_dir / "templates" / "easy_project" / "easy_template.xlsx"
+    tables = {sheet_name: make_table() for sheet_name, make_table in easy_project.get_table_makers().items()}
+
+    openpyxl_path = tmp_path / "openpyxl.xlsx"
+    utils.write_tables(wb=openpyxl.load_workbook(template_path), tables=tables).save(openpyxl_path)
+    streaming_path = tmp_path / "streaming.xlsx"
+    stream_writer.write_workbook(template_path=template_path, output_path=streaming_path, tables=tables)
+
+    streamed, written = openpyxl.load_workbook(streaming_path), openpyxl.load_workbook(openpyxl_path)
+    assert streamed.sheetnames == written.sheetnames
+    for sheet_name in tables:
+        assert get_values(streamed[sheet_name]) == get_values(written[sheet_name]), sheet_name
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+
+import utils
+
+
+def test_sums_match_pivot_table():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        "geog_code": rng.choice(["C", "A", "B"], size=1_000),
+        "appt_status": pd.Categorical(rng.choice(["Attended", "DNA", "Unknown", "Cancelled"], size=1_000)),
+        "appt_count": rng.integers(0, 1_000, size=1_000),
+    })
+    categories = ["Attended", "DNA", "Unknown", "Not in the data"]
+
+    table = utils.sum_by_category(df, "geog_code", "appt_status", categories, total_column="total")
+
+    expected = df.pivot_table(index="geog_code", columns="appt_status", values="appt_count", aggfunc="sum",
+                              observed=True)
+    expected = expected.reindex(columns=categories, fill_value=0).fillna(0).astype(np.int64)
+    expected.columns = pd.Index(categories)
+    expected["total"] = df.groupby("geog_code")["appt_count"].sum()
+    pd.testing.assert_frame_equal(table, expected, check_names=False)
+    assert table.index.name == "geog_code"
+
+
+def test_large_sums_are_exact():
+    big = 2 ** 53
+    df = pd.DataFrame({"day": [1, 1, 1], "status": ["DNA", "DNA", "DNA"], "appt_count": [big, 1, 1]})
+
+    table = utils.sum_by_category(df, "day", "status", ["DNA"], total_column="total")
+
+    assert table.loc[1, "DNA"] == big + 2
+    assert table.loc[1, "total"] == big + 2
+
+
+def test_rows_with_no_index_value_are_left_out():
+    df = pd.DataFrame({"day": [1, None, 2], "status": ["DNA", "DNA", None], "appt_count": [1, 10, 100]})
+
+    table = utils.sum_by_category(df, "day", "status", ["DNA"], total_column="total")
+
+    assert table.index.tolist() == [1, 2]
+    assert table["DNA"].tolist() == [1, 0]
+    assert table["total"].tolist() == [1, 100]
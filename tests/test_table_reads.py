@@ -0,0 +1,28 @@
+from pathlib import Path
+
+import config
+import utils
+
+data_dir = Path(__file__).resolve().parents[1] / "data"
+
+
+def test_planned_reads_are_the_reads_made(monkeypatch):
+    monkeypatch.setattr(config, "get_data_dir", lambda: data_dir)
+    get_appointments_data = config.get_appointments_data
+    reads = []
+
+    def record_read(breakdowns=None, columns=None):
+        if columns is not None:
+            reads.append((list(breakdowns), list(columns)))
+        return get_appointments_data(breakdowns=breakdowns, columns=columns)
+
+    monkeypatch.setattr(config, "get_appointments_data", record_read)
+    config.clear_data_cache()
+    try:
+        for sheet_names, make_tables in utils.get_table_tasks(utils.table_makers).items():
+            reads.clear()
+            make_tables()
+            planned_reads = utils.get_appointments_reads([sheet_names], utils.table_makers)
+            assert [(list(breakdowns), list(columns)) for breakdowns, columns in planned_reads] == reads, sheet_names
+    finally:
+        config.clear_data_cache()
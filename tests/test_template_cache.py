@@ -0,0 +1,27 @@
+import shutil
+from pathlib import Path
+
+import openpyxl
+
+import config
+import template_cache
+
+template_path = Path(__file__).resolve().parents[1] / "templates" / "easy_project" / "easy_template.xlsx"
+
+
+def test_templates_with_the_same_name_keep_their_own_copies(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "get_template_cache_dir", lambda: tmp_path / "template_cache")
+    template_paths = []
+    for project in ["first", "second"]:
+        (tmp_path / project).mkdir()
+        template_paths.append(tmp_path / project / "template.xlsx")
+        shutil.copy(template_path, template_paths[-1])
+    # Make the two templates differ, so they're compiled under different keys
+    wb = openpyxl.load_workbook(template_paths[1])
+    wb.worksheets[0]["A1"] = "Changed"
+    wb.save(template_paths[1])
+
+    compiled_paths = [template_cache.compile_template(path) for path in template_paths]
+
+    assert compiled_paths[0] != compiled_paths[1]
+    assert all(compiled_path.exists() for compiled_path in compiled_paths)
@@ -1,9 +1,22 @@
 import config
 import dateutil
-from typing import Tuple, List
+import functools
+import geography
+import instrumentation
+import re
+import template_cache
+import weakref
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from copy import copy
+from pathlib import Path
+from typing import Callable, Dict, Tuple, List
+import numpy as np
 import openpyxl
 import pandas as pd
-from openpyxl.utils.dataframe import dataframe_to_rows
+from openpyxl.formatting.formatting import ConditionalFormattingList
+from openpyxl.formula.tokenizer import Token, Tokenizer
+from openpyxl.worksheet.cell_range import MultiCellRange
+from openpyxl.worksheet.merge import MergedCellRange
 
 # region UTILITIES
 
@@ -40,15 +53,128 @@ def filter_df_to_report_month(df: pd.DataFrame) -> pd.DataFrame:
         pd.DataFrame: The filtered dataframe
     """
     report_month = config.get_report_month()
-    df = df[df.appt_date != "ALL"]
-    pd.options.mode.chained_assignment = None  # default='warn'
-    df["datetime_date"] = pd.to_datetime(df["appt_date"], format="%Y-%m-%d")
-    df = df[df["datetime_date"].dt.month == report_month.month]
-    df = df[df["datetime_date"].dt.year == report_month.year]
-    df.drop(["datetime_date"], axis=1, inplace=True)
+    # appt_date is parsed on ingest; rows which are not for a single date ('ALL') have a missing date
+    df = df[df["appt_date"].notna()]
+    df = df[df["appt_date"].dt.month == report_month.month]
+    df = df[df["appt_date"].dt.year == report_month.year]
     return df
 
 
+# Tag indexes are built the first time a sheet is searched, and kept for the lifetime of the worksheet
+_tag_indexes = weakref.WeakKeyDictionary()
+
+
+def is_tag(value) -> bool:
+    """
+    Checks whether a cell value is a template tag, i.e. a string of the form <...>
+
+    Args:
+        value: The value of the cell
+
+    Returns:
+        bool: True if the value is a tag
+    """
+    return isinstance(value, str) and value.startswith("<") and value.endswith(">")
+
+
+def build_tag_index(ws: openpyxl.worksheet) -> Dict[str, Dict[int, Tuple]]:
+    """
+    Makes a single pass over a worksheet, recording the location of every tag in it.
+    The index maps each tag to a dictionary of {column index: cell index}. Where a tag appears more than
+    once in a column, only the first (top-most) cell is kept. Since the sheet is scanned row by row,
+    the first entry for each tag is the first cell containing that tag, reading the sheet left to right, top to bottom.
+    Only the cells the sheet holds are scanned, so no empty cells are created for the gaps between them.
+
+    Args:
+        ws (openpyxl.worksheet): The worksheet to index
+
+    Returns:
+        Dict[str, Dict[int, Tuple]]: The tag index
+    """
+    tag_index = {}
+    for (row, column), cell in sorted(ws._cells.items()):
+        if is_tag(cell.value):
+            tag_index.setdefault(cell.value, {}).setdefault(column, (row, column))
+    _tag_indexes[ws] = tag_index
+    return tag_index
+
+
+def get_tag_index(ws: openpyxl.worksheet) -> Dict[str, Dict[int, Tuple]]:
+    """
+    Fetches the tag index for a worksheet, building it if the sheet has not been indexed yet
+
+    Args:
+        ws (openpyxl.worksheet): The worksheet
+
+    Returns:
+        Dict[str, Dict[int, Tuple]]: The tag index, as described in build_tag_index
+    """
+    tag_index = _tag_indexes.get(ws)
+    if tag_index is None:
+        tag_index = build_tag_index(ws)
+    return tag_index
+
+
+def set_tag_index(ws: openpyxl.worksheet, tag_index: Dict[str, Dict[int, Tuple]]) -> None:
+    """
+    Gives a worksheet a tag index which was built earlier, such as one kept with a compiled template (see template_cache.py)
+    """
+    _tag_indexes[ws] = tag_index
+    return None
+
+
+def lookup_tag(ws: openpyxl.worksheet, tag: str, column: int = None) -> Tuple:
+    """
+    Looks a tag up in the worksheet's tag index, optionally restricted to a single column.
+    The index records the template as it was when first searched, so the cell found is checked to
+    still hold the tag; if it has since been overwritten, the sheet is re-indexed and the lookup repeated.
+
+    Args:
+        ws (openpyxl.worksheet): The worksheet
+        tag (str): The tag to look for
+        column (int, optional): The column index to look in. Defaults to None, meaning any column.
+
+    Returns:
+        Tuple: The index of the cell containing the tag, or None if there is no such cell
+    """
+    def locate(tag_index):
+        locations = tag_index.get(tag, {})
+        if column is None:
+            return next(iter(locations.values()), None)
+        return locations.get(column)
+
+    loc = locate(get_tag_index(ws))
+    if loc is not None and ws.cell(row=loc[0], column=loc[1]).value != tag:
+        loc = locate(build_tag_index(ws))
+    return loc
+
+
+def shift_tag_index(ws: openpyxl.worksheet, idx: int, amount: int) -> None:
+    """
+    Keeps a worksheet's tag index in sync after rows have been inserted into or deleted from it.
+    Tags in deleted rows are dropped, and tags below the change are moved with their rows.
+
+    Args:
+        ws (openpyxl.worksheet): The worksheet rows were inserted into or deleted from
+        idx (int): The row at which rows were inserted or deleted
+        amount (int): The number of rows inserted (positive) or deleted (negative)
+    """
+    tag_index = _tag_indexes.get(ws)
+    if tag_index is None:
+        return None
+    for tag in list(tag_index):
+        locations = {}
+        for column, (row, col) in tag_index[tag].items():
+            if amount < 0 and idx <= row < idx - amount:
+                continue
+            locations[column] = (move_row(row, idx, amount), col)
+        if locations:
+            tag_index[tag] = locations
+        else:
+            del tag_index[tag]
+    return None
+
+
 def find_cell_in_column(ws: openpyxl.worksheet, tag: str, column: str) -> Tuple:
     """
     Finds a cell with a tag in a particular column
@@ -61,14 +187,41 @@ def find_cell_in_column(ws: openpyxl.worksheet, tag: str, column: str) -> Tuple:
     Returns:
         Tuple: The index of the cell containing the tag
     """
-    max_search = 1000
-    iter = 0
-    while iter <= max_search:
-        for cell in ws[column]:
-            iter += 1
-            if cell.value == tag:
-                return openpyxl.utils.cell.coordinate_to_tuple(cell.coordinate)
-    return None
+    column_index = openpyxl.utils.cell.column_index_from_string(column)
+    return lookup_tag(ws=ws, tag=tag, column=column_index)
+
+
+def write_block(ws: openpyxl.worksheet, start_cell: Tuple, values) -> int:
+    """
+    Writes a 2-D block of values into a worksheet, with the top left value going in the start cell.
+    The cells are fetched straight from the worksheet's cell store rather than one ws.cell() call at a time,
+    which is a large part of the cost of writing big tables. Cells which already exist keep their template styles.
+
+    Args:
+        ws (openpyxl.worksheet): The worksheet to write to
+        start_cell (Tuple): The index of the cell in which to write the top left value
+        values (pd.DataFrame, np.ndarray or iterable of rows): The block of values to write. The index and
+            column headings of a dataframe are not written.
+
+    Returns:
+        int: The number of rows written
+    """
+    if isinstance(values, pd.DataFrame):
+        # Converting column by column gives plain python values, as writing row by row from the frame would
+        values = zip(*(values.iloc[:, i].tolist() for i in range(values.shape[1])))
+    elif isinstance(values, np.ndarray):
+        values = values.tolist()
+
+    cells = ws._cells
+    row_number = start_cell[0]
+    for row in values:
+        for column_number, value in enumerate(row, start=start_cell[1]):
+            cell = cells.get((row_number, column_number))
+            if cell is None:
+                cell = ws.cell(row=row_number, column=column_number)
+            cell.value = value
+        row_number += 1
+    return row_number - start_cell[0]
 
 
 def write_df_from_start_cell(
@@ -76,33 +229,63 @@ def write_df_from_start_cell(
 ) -> None:
     """
     Given a pandas dataframe and a worksheet, writes that dataframe to that worksheet.
-    Starts at the cell with the <start> tag. Any empty rows after the last df row are written,
-    and up to the <end> cell row, are deleted.
+    Starts at the cell with the <start> tag. The rows between the <start> and <end> cells are first resized to fit
+    the dataframe, leaving one blank row after it, and then the data is written.
 
     Args:
         start_cell (Tuple): Cell to start the data in
-        end_cell (Tuple): Cell to delete blank rows up to
+        end_cell (Tuple): Cell which marks the end of the template's data region
         ws (openpyxl.worksheet): The worksheet to write to
         df (pd.DataFrame): The data to write
     """
-    rows_to_write = dataframe_to_rows(df, index=False, header=False)
-    loc = list(start_cell)
-    for row in rows_to_write:
-        for cell in row:
-            ws.cell(row=loc[0], column=loc[1]).value = cell
-            loc[1] += 1
-        loc[0] += 1
-        loc[1] = start_cell[1]
-    clear_empty_rows(ws=ws, last_written_row=loc[0], end_cell=end_cell)
+    size_data_region(ws=ws, start_cell=start_cell, end_cell=end_cell, number_of_rows=len(df))
+    write_block(ws=ws, start_cell=start_cell, values=df)
+
+
+def size_data_region(
+    ws: openpyxl.worksheet, start_cell: Tuple, end_cell: Tuple, number_of_rows: int
+) -> None:
+    """
+    Resizes the data region of a template, between the <start> and <end> cells, to hold a given number of rows
+    plus one blank row after them. This means templates don't need to be sized for the largest possible table:
+    unused rows are deleted, and if the data needs more rows than the template has, rows are inserted above the
+    <end> cell, styled like the last row of the region. Either way everything below the region is moved once.
+
+    Args:
+        ws (openpyxl.worksheet): The worksheet to resize
+        start_cell (Tuple): The location of the <start> tag
+        end_cell (Tuple): The location of the <end> tag
+        number_of_rows (int): The number of rows of data which will be written from the <start> cell
+    """
+    amount = start_cell[0] + number_of_rows - end_cell[0]
+    if amount < 0:
+        move_rows(ws=ws, idx=start_cell[0] + number_of_rows + 1, amount=amount)
+        return None
+
+    if amount > 0:
+        move_rows(ws=ws, idx=end_cell[0], amount=amount)
+        template_row = end_cell[0] - 1
+        template_cells = [cell for (row, _), cell in ws._cells.items() if row == template_row]
+        for row in range(end_cell[0], end_cell[0] + amount):
+            for template_cell in template_cells:
+                ws.cell(row=row, column=template_cell.column)._style = copy(template_cell._style)
+            if template_row in ws.row_dimensions:
+                ws.row_dimensions[row].height = ws.row_dimensions[template_row].height
+    # The <end> row is now the blank row after the data, so the tag itself is no longer needed
+    end_row = end_cell[0] + amount
+    for (row, _), cell in ws._cells.items():
+        if row == end_row and cell.value == "<end>":
+            cell.value = None
+    return None
 
 
 def clear_empty_rows(
     ws: openpyxl.worksheet, last_written_row: int, end_cell: Tuple
 ) -> None:
     """
-    Deletes blank / empty rows from the area where data is written to.
-    This is a workaround for a problem with working from templates; how do we size the template without knowing how many rows the df will have?
-    To get round this, we insert many many blank rows, and then delete the unused ones.
+    Deletes blank / empty rows from the area where data is written to, up to and including the <end> row.
+    write_df_from_start_cell now sizes the region before writing instead; this is kept for writers which fill
+    a region first and trim it afterwards.
 
     Args:
         ws (openpyxl.worksheet): the worksheet to clear empty rows from
@@ -110,7 +293,308 @@ def clear_empty_rows(
         end_cell (Tuple): The location of the <end> tag
     """
     number_to_delete = end_cell[0] - last_written_row
-    ws.delete_rows(last_written_row + 1, number_to_delete)
+    if number_to_delete > 0:
+        move_rows(ws=ws, idx=last_written_row + 1, amount=-number_to_delete)
+
+
+# region AGGREGATION
+# Tables by date or by geography are made by summing the appointment counts into a grid of rows by categories.
+# Rather than going through pivot_table, the rows and categories are turned into integer codes, and the counts added
+# into a dense array of 64-bit integers in one pass, so the sums are exact. Any duplicate rows in the data are added
+# together rather than averaged.
+
+def sum_by_category(
+    df: pd.DataFrame,
+    index_column: str,
+    column: str,
+    categories: list,
+    value_column: str = "appt_count",
+    total_column: str = None,
+) -> pd.DataFrame:
+    """
+    Sums a column of counts into a table with a row for each value of one column, and a column for each category of
+    another. Rows with a missing index value are left out, as groupby leaves them out.
+
+    Args:
+        df (pd.DataFrame): The data
+        index_column (str): The column whose values become the rows of the table, in sorted order
+        column (str): The column whose categories become the columns of the table
+        categories (list): The categories to make columns for, in the order they are wanted. Categories which don't
+            appear in the data are all zeros; rows with categories not in the list only count towards the total.
+        value_column (str, optional): The column of counts to sum. Defaults to "appt_count".
+        total_column (str, optional): If given, a column of this name is added with the sum of every row for each
+            index value, whatever its category. Defaults to None.
+
+    Returns:
+        pd.DataFrame: The sums, as 64-bit integers, indexed by the values of the index column
+    """
+    index_codes, index_values = pd.factorize(df[index_column], sort=True)
+    category_codes = pd.Index(categories).get_indexer(df[column]).astype(np.int64)
+    values = df[value_column].to_numpy(dtype=np.int64)
+
+    in_index = index_codes >= 0
+    in_table = in_index & (category_codes >= 0)
+    cells = index_codes[in_table].astype(np.int64) * len(categories) + category_codes[in_table]
+    sums = np.zeros(len(index_values) * len(categories), dtype=np.int64)
+    np.add.at(sums, cells, values[in_table])
+
+    table = pd.DataFrame(
+        sums.reshape(len(index_values), len(categories)),
+        index=pd.Index(index_values, name=index_column),
+        columns=categories,
+    )
+    if total_column is not None:
+        totals = np.zeros(len(index_values), dtype=np.int64)
+        np.add.at(totals, index_codes[in_index], values[in_index])
+        table[total_column] = totals
+    return table
+
+
+# region ROW SHIFTING
+# When rows are inserted into or deleted from a sheet, anything which refers to the rows below (merged cells,
+# defined names, conditional formatting and so on) has to move with them. These functions work out where a reference ends up.
+# Throughout, a positive amount means that many rows are inserted before row idx; a negative amount means that many
+# rows are deleted, starting from row idx.
+
+reference_pattern = re.compile(r"^(\$?[A-Za-z]{1,3})?(\$?)(\d+)$")
+sheet_reference_pattern = re.compile(
+    r"(?:'((?:[^']|'')+)'|([A-Za-z_][\w.]*))!(\$?[A-Za-z]{1,3}\$?\d+(?::\$?[A-Za-z]{1,3}\$?\d+)?)"
+)
+
+
+def move_row(row: int, idx: int, amount: int, end_of_range: bool = False) -> int:
+    """
+    Works out where a row ends up after rows are inserted or deleted.
+
+    Args:
+        row (int): The row number before the change
+        idx (int): The row at which rows are inserted or deleted
+        amount (int): The number of rows inserted (positive) or deleted (negative)
+        end_of_range (bool, optional): Whether the row is the bottom of a range. A range ending in deleted rows is
+            shrunk to end at the last row above them; any other reference to a deleted row moves to the row below them.
+            Defaults to False.
+
+    Returns:
+        int: The row number after the change
+    """
+    if row < idx:
+        return row
+    if amount > 0 or row >= idx - amount:
+        return row + amount
+    return idx - 1 if end_of_range else idx
+
+
+def move_range(ref: str, idx: int, amount: int) -> str:
+    """
+    Moves a cell or range reference, such as 'B413:F413' or '$A$13', to account for inserted or deleted rows.
+    References to whole columns are left as they are.
+
+    Args:
+        ref (str): The cell or range reference
+        idx (int): The row at which rows are inserted or deleted
+        amount (int): The number of rows inserted (positive) or deleted (negative)
+
+    Returns:
+        str: The moved reference, or None if every row it covered has been deleted
+    """
+    ends = ref.split(":")
+    matches = [reference_pattern.match(end) for end in ends]
+    if not all(matches):
+        return ref
+    rows = [int(match.group(3)) for match in matches]
+    if amount < 0 and idx <= rows[0] and rows[-1] < idx - amount:
+        return None
+    new_rows = [move_row(rows[0], idx, amount)] + [
+        move_row(row, idx, amount, end_of_range=True) for row in rows[1:]
+    ]
+    return ":".join(
+        f"{match.group(1) or ''}{match.group(2)}{row}"
+        for match, row in zip(matches, new_rows)
+    )
+
+
+def move_sqref(sqref: str, idx: int, amount: int) -> str:
+    """
+    Moves a space-separated list of references, as used by conditional formatting and data validation.
+
+    Args:
+        sqref (str): The list of references
+        idx (int): The row at which rows are inserted or deleted
+        amount (int): The number of rows inserted (positive) or deleted (negative)
+
+    Returns:
+        str: The moved list of references, or None if all of them have been deleted
+    """
+    refs = [move_range(ref, idx, amount) for ref in sqref.split()]
+    refs = [ref for ref in refs if ref is not None]
+    return " ".join(refs) if refs else None
+
+
+def move_sheet_references(text: str, sheet_name: str, idx: int, amount: int) -> str:
+    """
+    Moves every reference to a given sheet, such as 'Table 2a'!$A$13:$F$408, within a formula or defined name.
+    References to other sheets are left as they are. A reference to rows which have all been deleted becomes #REF!,
+    as it would in Excel.
+
+    Args:
+        text (str): The formula or defined name
+        sheet_name (str): The sheet in which rows were inserted or deleted
+        idx (int): The row at which rows are inserted or deleted
+        amount (int): The number of rows inserted (positive) or deleted (negative)
+
+    Returns:
+        str: The text, with the references moved
+    """
+
+    def replace(match):
+        name = match.group(1).replace("''", "'") if match.group(1) else match.group(2)
+        if name != sheet_name:
+            return match.group(0)
+        ref = move_range(match.group(3), idx, amount)
+        return match.group(0)[: -len(match.group(3))] + (ref or "#REF!")
+
+    return sheet_reference_pattern.sub(replace, text)
+
+
+def move_formula_references(
+    formula: str, sheet_name: str, idx: int, amount: int, on_sheet: bool
+) -> str:
+    """
+    Moves the references to a given sheet within a cell formula. References without a sheet name are moved
+    too if the formula is on that sheet. A reference to rows which have all been deleted becomes #REF!.
+
+    Args:
+        formula (str): The formula, starting with '='
+        sheet_name (str): The sheet in which rows were inserted or deleted
+        idx (int): The row at which rows are inserted or deleted
+        amount (int): The number of rows inserted (positive) or deleted (negative)
+        on_sheet (bool): Whether the formula is itself on that sheet
+
+    Returns:
+        str: The formula, with the references moved
+    """
+    tokenizer = Tokenizer(formula)
+    for token in tokenizer.items:
+        if token.type != Token.OPERAND or token.subtype != Token.RANGE:
+            continue
+        sheet, _, ref = token.value.rpartition("!")
+        if sheet:
+            if sheet.strip("'").replace("''", "'") != sheet_name:
+                continue
+        elif not on_sheet:
+            continue
+        moved = move_range(ref, idx, amount)
+        token.value = f"{sheet}!{moved or '#REF!'}" if sheet else moved or "#REF!"
+    return tokenizer.render()
+
+
+def get_print_area(ws: openpyxl.worksheet) -> list:
+    """
+    Lists the ranges in a worksheet's print area, such as ['$A$1:$F$40']. openpyxl 3.0 gives the print area as a list
+    of ranges (or None), and 3.1 as one string with the sheet name in front of each range.
+    """
+    print_area = ws.print_area
+    if not print_area:
+        return []
+    if isinstance(print_area, str):
+        return [match.group(3) for match in sheet_reference_pattern.finditer(print_area)]
+    return list(print_area)
+
+
+def get_defined_names(wb: openpyxl.Workbook) -> list:
+    """
+    Lists every defined name in a workbook. openpyxl 3.0 keeps them all in one list on the workbook, with the names
+    belonging to one sheet marked by its position; 3.1 keeps each sheet's names on the sheet.
+    """
+    if hasattr(wb.defined_names, "definedName"):
+        return list(wb.defined_names.definedName)
+    defined_names = list(wb.defined_names.values())
+    for sheet in wb.worksheets:
+        defined_names += list(sheet.defined_names.values())
+    return defined_names
+
+
+def move_rows(ws: openpyxl.worksheet, idx: int, amount: int) -> None:
+    """
+    Inserts or deletes rows in a worksheet, moving everything below the change in one pass.
+    Unlike openpyxl's own insert_rows and delete_rows, which move the sheet one cell at a time (creating a cell for
+    every blank position on the way) and leave everything else where it was, this also moves row heights, merged
+    cells, hyperlinks, conditional formatting, data validation, tables, the print area, defined names and any
+    formulas in the workbook which refer to the moved rows.
+
+    Args:
+        ws (openpyxl.worksheet): The worksheet to change
+        idx (int): The row at which rows are inserted or deleted
+        amount (int): The number of rows to insert (positive) or delete (negative)
+    """
+    if amount == 0:
+        return None
+    wb = ws.parent
+
+    def is_deleted(row):
+        return amount < 0 and idx <= row < idx - amount
+
+    # Cells and row heights
+    cells = {}
+    for (row, column), cell in ws._cells.items():
+        if is_deleted(row):
+            continue
+        if row >= idx:
+            cell.row = row + amount
+            if cell.hyperlink is not None:
+                cell.hyperlink.ref = cell.coordinate
+        cells[(cell.row, column)] = cell
+    ws._cells = cells
+
+    row_dimensions = [(row, dimension) for row, dimension in ws.row_dimensions.items() if not is_deleted(row)]
+    ws.row_dimensions.clear()
+    for row, dimension in row_dimensions:
+        dimension.index = move_row(row, idx, amount)
+        ws.row_dimensions[dimension.index] = dimension
+
+    # Ranges on the sheet
+    merged_ranges = [move_range(merged.coord, idx, amount) for merged in ws.merged_cells.ranges]
+    ws.merged_cells = MultiCellRange(
+        [MergedCellRange(ws, ref) for ref in merged_ranges if ref is not None and ":" in ref]
+    )
+
+    conditional_formatting = ws.conditional_formatting
+    ws.conditional_formatting = ConditionalFormattingList()
+    for formatting in conditional_formatting:
+        sqref = move_sqref(str(formatting.sqref), idx, amount)
+        if sqref is not None:
+            for rule in formatting.rules:
+                ws.conditional_formatting.add(sqref, rule)
+
+    validations = []
+    for validation in ws.data_validations.dataValidation:
+        sqref = move_sqref(str(validation.sqref), idx, amount)
+        if sqref is not None:
+            validation.sqref = MultiCellRange(sqref)
+            validations.append(validation)
+    ws.data_validations.dataValidation = validations
+
+    for table in ws.tables.values():
+        table.ref = move_range(table.ref, idx, amount) or table.ref
+    if ws.auto_filter.ref:
+        ws.auto_filter.ref = move_range(ws.auto_filter.ref, idx, amount)
+    print_area = get_print_area(ws)
+    if print_area:
+        print_area = move_sqref(" ".join(print_area), idx, amount)
+        ws.print_area = print_area.split() if print_area else []
+
+    # References to the sheet from anywhere in the workbook
+    for defined_name in get_defined_names(wb):
+        if defined_name.attr_text:
+            defined_name.attr_text = move_sheet_references(defined_name.attr_text, ws.title, idx, amount)
+
+    for sheet in wb.worksheets:
+        for cell in sheet._cells.values():
+            if cell.data_type == "f" and isinstance(cell.value, str):
+                cell.value = move_formula_references(cell.value, ws.title, idx, amount, on_sheet=sheet is ws)
+
+    shift_tag_index(ws=ws, idx=idx, amount=amount)
+    return None
 
 
 def write_table_to_sheet(
@@ -127,16 +611,34 @@ def write_table_to_sheet(
     Returns:
         openpyxl.Workbook: The workbook, with the data written
     """
-    start_cell = find_cell_by_tag(wb, sheet_name, "<start>")
-    end_cell = find_cell_by_tag(wb, sheet_name, "<end>")
-
-    ws = wb[sheet_name]
-    write_df_from_start_cell(
-        start_cell=start_cell, end_cell=end_cell, ws=ws, df=table_data
-    )
+    with instrumentation.measure_stage("write_table", sheet_name=sheet_name) as stage:
+        start_cell = find_cell_by_tag(wb, sheet_name, "<start>")
+        end_cell = find_cell_by_tag(wb, sheet_name, "<end>")
+
+        ws = wb[sheet_name]
+        write_df_from_start_cell(
+            start_cell=start_cell, end_cell=end_cell, ws=ws, df=table_data
+        )
+        stage["rows"], stage["cells"] = instrumentation.count_cells(table_data)
     return wb
 
 
+def make_table_easy_a() -> pd.DataFrame:
+    """
+    Makes the table for sheet 'Easy A'. Loads in data and does some basic organising first.
+
+    Returns:
+        pd.DataFrame: The table, with its columns in the same order as the template
+    """
+
+    # Load the dataframe in from the datafile
+    df = config.get_easy_a_data()
+
+    # Make sure that the column order matches the column order in the template
+    df = df[["weekday", "appt_date", "total", "Attended", "DNA", "Unknown"]]
+    return df
+
+
 def make_and_write_easy_a(wb: openpyxl.Workbook) -> openpyxl.Workbook:
     """
     Writes sheet to workbook in the 'easy' example
@@ -147,16 +649,25 @@ def make_and_write_easy_a(wb: openpyxl.Workbook) -> openpyxl.Workbook:
     Returns:
         openpyxl.Workbook: The same workbook, but with the sheet written in
     """    
+    wb = write_table_to_sheet(
+        wb=wb, sheet_name="Easy A", table_data=make_table_easy_a()
+    )
+    return wb
 
+
+def make_table_easy_b() -> pd.DataFrame:
+    """
+    Makes the table for sheet 'Easy B'. Loads in data and does some basic organising first.
+
+    Returns:
+        pd.DataFrame: The table, with its columns in the same order as the template
+    """
     # Load the dataframe in from the datafile
     df = config.get_easy_a_data()
 
     # Make sure that the column order matches the column order in the template
     df = df[["weekday", "appt_date", "total", "Attended", "DNA", "Unknown"]]
-
-    # Write the table to the workbook sheet
-    wb = write_table_to_sheet(wb=wb, table_data=df, sheet_name="Easy A")
-    return wb
+    return df
 
 
 def make_and_write_easy_b(wb: openpyxl.Workbook) -> openpyxl.Workbook:
@@ -169,15 +680,105 @@ def make_and_write_easy_b(wb: openpyxl.Workbook) -> openpyxl.Workbook:
     Returns:
         openpyxl.Workbook: The same workbook, but with the sheet written in
     """    
-    # Load the dataframe in from the datafile
-    df = config.get_easy_a_data()
+    wb = write_table_to_sheet(
+        wb=wb, sheet_name="Easy B", table_data=make_table_easy_b()
+    )
+    return wb
 
-    # Make sure that the column order matches the column order in the template
-    df = df[["weekday", "appt_date", "total", "Attended", "DNA", "Unknown"]]
 
-    # Write the table to the workbook sheet
-    wb = write_table_to_sheet(wb=wb, table_data=df, sheet_name="Easy B")
-    return wb
+# Tables 2a to 2d are all the same shape: a row for each day, with the total number of appointments and the number in each
+# category of one appointment field. Each is made from its own breakdown of the appointments data.
+daily_tables = {
+    "Table 2a": {
+        "breakdown": "by_status_by_date",
+        "column": "appt_status",
+        "categories": ["Attended", "DNA", "Unknown"],
+    },
+    "Table 2b": {
+        "breakdown": "by_hcp_type_by_date",
+        "column": "hcp_type",
+        "categories": ["GP", "Other Practice Staff", "Unknown"],
+    },
+    "Table 2c": {
+        "breakdown": "by_appt_mode_by_date",
+        "column": "appt_mode",
+        "categories": ["Face-to-Face", "Home Visit", "Telephone", "Video/Online", "Unknown"],
+    },
+    "Table 2d": {
+        "breakdown": "by_time_between_booking_and_appt_by_date",
+        "column": "time_between_booking_and_appt",
+        "categories": [
+            "Same Day",
+            "1 Day",
+            "2 to 7 Days",
+            "8 to 14 Days",
+            "15 to 21 Days",
+            "22 to 28 Days",
+            "More than 28 Days",
+            "Unknown / Data Quality",
+        ],
+    },
+}
+
+
+def get_daily_tables_read(sheet_names: list) -> Tuple[list, list]:
+    """
+    Gives the breakdowns and columns of the appointments data which make_daily_tables() reads for the given tables.
+    """
+    table_specs = [daily_tables[sheet_name] for sheet_name in sheet_names]
+    breakdowns = [table_spec["breakdown"] for table_spec in table_specs]
+    category_columns = list(dict.fromkeys(table_spec["column"] for table_spec in table_specs))
+    return breakdowns, ["appt_date"] + category_columns
+
+
+def make_daily_tables(sheet_names: list = None) -> Dict[str, pd.DataFrame]:
+    """
+    Makes any of the daily tables, 2a to 2d, together. The data for all their breakdowns is read at once, split by
+    breakdown, and each table's counts summed by date and category with sum_by_category(). The dates are only
+    formatted once they have been summed.
+
+    Args:
+        sheet_names (list, optional): The tables to make, from `daily_tables`. Defaults to all of them.
+
+    Returns:
+        Dict[str, pd.DataFrame]: The tables, by sheet name, with their columns in the same order as the template
+    """
+    sheet_names = list(daily_tables) if sheet_names is None else sheet_names
+    table_specs = [daily_tables[sheet_name] for sheet_name in sheet_names]
+
+    breakdowns, columns = get_daily_tables_read(sheet_names)
+    df = config.get_appointments_data(breakdowns=breakdowns, columns=columns)
+    rows_by_breakdown = df.groupby("breakdown", observed=True).indices
+
+    tables = {}
+    for sheet_name, table_spec in zip(sheet_names, table_specs):
+        rows = df.iloc[rows_by_breakdown.get(table_spec["breakdown"], [])]
+        table = sum_by_category(
+            rows, "appt_date", table_spec["column"], table_spec["categories"], total_column="total"
+        )
+
+        dates = table.index
+        daily_table = pd.DataFrame(
+            {
+                "weekday": dates.strftime("%a"),
+                "appt_date": dates.strftime("%d/%b/%y"),
+                "total": table["total"].to_numpy(),
+            }
+        )
+        for category in table_spec["categories"]:
+            daily_table[category] = table[category].to_numpy()
+        tables[sheet_name] = daily_table
+    return tables
+
+
+def make_table_2a() -> pd.DataFrame:
+    """
+    Makes the table for sheet '2a', using make_daily_tables().
+
+    Returns:
+        pd.DataFrame: The table, with its columns in the same order as the template
+    """
+    return make_daily_tables(["Table 2a"])["Table 2a"]
 
 
 def make_and_write_2a(wb: openpyxl.Workbook) -> openpyxl.Workbook:
@@ -190,24 +791,22 @@ def make_and_write_2a(wb: openpyxl.Workbook) -> openpyxl.Workbook:
     Returns:
         openpyxl.Workbook: The workbook, with the sheet written.
     """    
-    df = config.get_appointments_data()
-    df = df[df["breakdown"] == "by_status_by_date"]
-    df = df[["appt_date", "appt_status", "appt_count"]]
-    df = df.pivot_table(
-        index="appt_date", columns="appt_status", values="appt_count"
-    ).fillna(0)
-
-    df.index = pd.to_datetime(df.index).strftime("%d/%b/%y")
-
-    df["total"] = df.sum(axis=1)
-    df["weekday"] = pd.to_datetime(df.index).strftime("%a")
-    df = df.reset_index(level=0)
-    df = df[["weekday", "appt_date", "total", "Attended", "DNA", "Unknown"]]
-
-    wb = write_table_to_sheet(wb=wb, table_data=df, sheet_name="Table 2a")
+    wb = write_table_to_sheet(
+        wb=wb, sheet_name="Table 2a", table_data=make_table_2a()
+    )
     return wb
 
 
+def make_table_2b() -> pd.DataFrame:
+    """
+    Makes the table for sheet '2b', using make_daily_tables().
+
+    Returns:
+        pd.DataFrame: The table, with its columns in the same order as the template
+    """
+    return make_daily_tables(["Table 2b"])["Table 2b"]
+
+
 def make_and_write_2b(wb: openpyxl.Workbook) -> openpyxl.Workbook:
     """
     Writes sheet '2b' to the workbook. Loads in data and does some basic organising first. 
@@ -218,23 +817,20 @@ def make_and_write_2b(wb: openpyxl.Workbook) -> openpyxl.Workbook:
     Returns:
         openpyxl.Workbook: The workbook, with the sheet written.
     """    
-    df = config.get_appointments_data()
-    df = df[df["breakdown"] == "by_hcp_type_by_date"]
-    df = df[["appt_date", "hcp_type", "appt_count"]]
-    df = df.pivot_table(
-        index="appt_date", columns="hcp_type", values="appt_count"
-    ).fillna(0)
-
-    df.index = pd.to_datetime(df.index).strftime("%d/%b/%y")
+    wb = write_table_to_sheet(
+        wb=wb, sheet_name="Table 2b", table_data=make_table_2b()
+    )
+    return wb
 
-    df["total"] = df.sum(axis=1)
-    df["weekday"] = pd.to_datetime(df.index).strftime("%a")
-    df = df.reset_index(level=0)
-    df = df[["weekday", "appt_date", "total", "GP", "Other Practice Staff", "Unknown"]]
 
-    wb = write_table_to_sheet(wb=wb, sheet_name="Table 2b", table_data=df)
+def make_table_2c() -> pd.DataFrame:
+    """
+    Makes the table for sheet '2c', using make_daily_tables().
 
-    return wb
+    Returns:
+        pd.DataFrame: The table, with its columns in the same order as the template
+    """
+    return make_daily_tables(["Table 2c"])["Table 2c"]
 
 
 def make_and_write_2c(wb: openpyxl.Workbook) -> openpyxl.Workbook:
@@ -247,34 +843,22 @@ def make_and_write_2c(wb: openpyxl.Workbook) -> openpyxl.Workbook:
     Returns:
         openpyxl.Workbook: The workbook, with the sheet written.
     """    
-
-    df = config.get_appointments_data()
-    df = df[df["breakdown"] == "by_appt_mode_by_date"]
-    df = df[["appt_date", "appt_mode", "appt_count"]]
-    df = df.pivot_table(
-        index="appt_date", columns="appt_mode", values="appt_count"
-    ).fillna(0)
-    df.index = pd.to_datetime(df.index).strftime("%d/%b/%y")
-
-    df["total"] = df.sum(axis=1)
-    df["weekday"] = pd.to_datetime(df.index).strftime("%a")
-    df = df.reset_index(level=0)
-    df = df[
-        [
-            "weekday",
-            "appt_date",
-            "total",
-            "Face-to-Face",
-            "Home Visit",
-            "Telephone",
-            "Video/Online",
-            "Unknown",
-        ]
-    ]
-    wb = write_table_to_sheet(wb=wb, sheet_name="Table 2c", table_data=df)
+    wb = write_table_to_sheet(
+        wb=wb, sheet_name="Table 2c", table_data=make_table_2c()
+    )
     return wb
 
 
+def make_table_2d() -> pd.DataFrame:
+    """
+    Makes the table for sheet '2d', using make_daily_tables().
+
+    Returns:
+        pd.DataFrame: The table, with its columns in the same order as the template
+    """
+    return make_daily_tables(["Table 2d"])["Table 2d"]
+
+
 def make_and_write_2d(wb: openpyxl.Workbook) -> openpyxl.Workbook:
     """
     Writes sheet '2d' to the workbook. Loads in data and does some basic organising first. 
@@ -285,24 +869,55 @@ def make_and_write_2d(wb: openpyxl.Workbook) -> openpyxl.Workbook:
     Returns:
         openpyxl.Workbook: The workbook, with the sheet written.
     """    
+    wb = write_table_to_sheet(
+        wb=wb, sheet_name="Table 2d", table_data=make_table_2d()
+    )
+    return wb
 
-    df = config.get_appointments_data()
-    df = df[df["breakdown"] == "by_time_between_booking_and_appt_by_date"]
-    df = df[["appt_date", "time_between_booking_and_appt", "appt_count"]]
-    df = df.pivot_table(
-        index="appt_date", columns="time_between_booking_and_appt", values="appt_count"
-    ).fillna(0)
-
-    df.index = pd.to_datetime(df.index).strftime("%d/%b/%y")
 
-    df["total"] = df.sum(axis=1)
-    df["weekday"] = pd.to_datetime(df.index).strftime("%a")
-    df = df.reset_index(level=0)
-    df = df[
-        [
-            "weekday",
-            "appt_date",
-            "total",
+# Tables 3a to 3d are all the same shape: a row for each geography (national, region, STP and CCG), with practice counts from the
+# practices data, the total number of appointments, and the number in each category of one appointment field.
+# Each is made from its own set of breakdowns of the appointments data, one for each level of geography.
+geography_tables = {
+    "Table 3a": {
+        "breakdowns": [
+            "national_count_by_appt_status",
+            "by_ccg_and_appt_status",
+            "by_stp_and_appt_status",
+            "by_region_and_appt_status",
+        ],
+        "column": "appt_status",
+        "categories": ["Attended", "DNA", "Unknown"],
+    },
+    "Table 3b": {
+        "breakdowns": [
+            "national_count_by_hcp_type",
+            "by_ccg_and_hcp_type",
+            "by_stp_and_hcp_type",
+            "by_region_and_hcp_type",
+        ],
+        "column": "hcp_type",
+        "categories": ["GP", "Other Practice Staff", "Unknown"],
+    },
+    "Table 3c": {
+        "breakdowns": [
+            "national_count_by_appt_mode",
+            "by_ccg_and_appt_mode",
+            "by_stp_and_appt_mode",
+            "by_region_and_appt_mode",
+        ],
+        "column": "appt_mode",
+        "categories": ["Face-to-Face", "Home Visit", "Telephone", "Video/Online", "Unknown"],
+    },
+    "Table 3d": {
+        "breakdowns": [
+            "national_count_by_time_between_booking_and_appt",
+            "by_ccg_and_time_between_booking_and_appt",
+            "by_stp_and_time_between_booking_and_appt",
+            "by_region_and_time_between_booking_and_appt",
+        ],
+        "column": "time_between_booking_and_appt",
+        "categories": [
             "Same Day",
             "1 Day",
             "2 to 7 Days",
@@ -311,42 +926,20 @@ def make_and_write_2d(wb: openpyxl.Workbook) -> openpyxl.Workbook:
             "22 to 28 Days",
             "More than 28 Days",
             "Unknown / Data Quality",
-        ]
-    ]
-    wb = write_table_to_sheet(wb=wb, sheet_name="Table 2d", table_data=df)
-    return wb
+        ],
+    },
+}
 
 
-def combine_appts_with_practices(
-    breakdowns_set: set, appointments_pivot: str, pivoted_column_list: List[str]
-) -> pd.DataFrame:
+def get_practices_by_geography() -> pd.DataFrame:
     """
-    Summary: For some sheets, we want data from two different sources; 'appointments' and 'practices'.
-    Ultimately we want to display the data from these indexed by geography. This function loads these two sources in and
-    joins them in the desired way. Later functions can then filter down to the desired columns. 
-
-    Args:
-        breakdowns_set (set): Set of relevant breakdowns to include
-        appointments_pivot (str): Column of categorical data: the values of this column will correspond to the column headings in the Excel
-        pivoted_column_list (List[str]): The ordered list of column headings: these ought to match the order of headings in the Excel
+    Loads the practices data, sorted by the size of geographic region and then by code, and indexed by ONS code.
 
     Returns:
-        pd.DataFrame: The combined dataframe, joined by geography, and sorted according to the size of geographic region. 
+        pd.DataFrame: The practice counts for each geography
     """
+    df_practices = geography.sort_by_geography(config.get_practices_data())
 
-    # Ingest the data
-    df_appts = config.get_appointments_data()
-    df_practices = config.get_practices_data()
-
-    # We will want to sort our geographies; the following dict is for that purpose. 
-    custom_dict = {'National': 0, 'Region': 1, 'STP': 2, 'CCG': 3}
-    df_practices['rank'] = df_practices['geog_type'].map(custom_dict)
-
-    df_practices.sort_values(by=['rank', 'geog_code'], ascending = [True, True], inplace=True)
-    #Now sorted, so we can drop the rank
-    df_practices.drop(columns = ['rank'], inplace=True)
-
-    # Prepare the practices data
     df_practices = df_practices[
         [
             "geog_type",
@@ -355,28 +948,41 @@ def combine_appts_with_practices(
             "count_of_included_practice",
         ]
     ]
-    df_practices = df_practices.set_index("geog_ons_code")
+    return df_practices.set_index("geog_ons_code")
 
-    # Prepare the appointments data
-    df_appts = df_appts[df_appts["breakdown"].isin(breakdowns_set)]
-    df_appts = df_appts[
-        [appointments_pivot, "geog_name", "geog_code", "geog_ons_code", "appt_count"]
-    ]
-    df_geogs = df_appts[["geog_name", "geog_code", "geog_ons_code"]].set_index(
-        "geog_ons_code"
-    )
-    df_appts = df_appts.pivot_table(
-        index="geog_ons_code", columns=appointments_pivot, values="appt_count"
-    ).fillna(0)
-    df_appts["total"] = df_appts.sum(axis=1) #! Again, total in DAE?
-    df_appts = df_appts.reset_index(level=0)
-    df_appts = df_appts.set_index("geog_ons_code")
-    df_appts = df_appts.join(df_geogs, how="inner").drop_duplicates()
 
-    # Combine the appointments and practices data
-    df_combined = df_practices.join(df_appts, how="inner")
-    df_combined.reset_index(inplace=True)
-    df_combined = df_combined.drop_duplicates()
+def get_geography_tables_read(table_specs: Dict[str, dict]) -> Tuple[list, list]:
+    """
+    Gives the breakdowns and columns of the appointments data which combine_geography_tables() reads for the given tables.
+    """
+    breakdowns = [breakdown for table_spec in table_specs.values() for breakdown in table_spec["breakdowns"]]
+    category_columns = list(dict.fromkeys(table_spec["column"] for table_spec in table_specs.values()))
+    return list(dict.fromkeys(breakdowns)), ["geog_name", "geog_code", "geog_ons_code"] + category_columns
+
+
+def combine_geography_tables(table_specs: Dict[str, dict]) -> Dict[str, pd.DataFrame]:
+    """
+    Makes a set of geography tables together. The appointments and practices data are each loaded and prepared once;
+    the appointments are split by table, and each table's counts summed by geography and category with
+    sum_by_category() and joined to the practices data.
+
+    Args:
+        table_specs (Dict[str, dict]): Each table's "breakdowns", the "column" whose categories become its columns, and
+            its "categories" in the same order as the template, by table name
+
+    Returns:
+        Dict[str, pd.DataFrame]: The tables, by table name, joined by geography and sorted according to the size of
+            geographic region
+    """
+    # Ingest the data
+    breakdowns, columns = get_geography_tables_read(table_specs)
+    df_appts = config.get_appointments_data(breakdowns=breakdowns, columns=columns)
+    df_practices = get_practices_by_geography()
+
+    # Split the appointments by breakdown
+    rows_by_breakdown = df_appts.groupby("breakdown", observed=True).indices
+    no_rows = np.array([], dtype=np.intp)
+
     column_list = [
         "geog_type",
         "geog_code",
@@ -385,35 +991,110 @@ def combine_appts_with_practices(
         "count_of_open_practice",
         "count_of_included_practice",
         "total",
-    ] + pivoted_column_list
-    df_combined = df_combined[column_list]
+    ]
+    tables = {}
+    for table_name, table_spec in table_specs.items():
+        positions = [rows_by_breakdown.get(breakdown, no_rows) for breakdown in table_spec["breakdowns"]]
+        rows = df_appts.iloc[np.sort(np.concatenate(positions))]
+        table = sum_by_category(
+            rows, "geog_ons_code", table_spec["column"], table_spec["categories"], total_column="total"
+        )
 
-    return df_combined
+        table_geogs = rows[["geog_ons_code", "geog_name", "geog_code"]].drop_duplicates().set_index("geog_ons_code")
+        table = table.join(table_geogs, how="inner")
 
+        # Combine the appointments and practices data
+        df_combined = df_practices.join(table, how="inner")
+        df_combined.reset_index(inplace=True)
+        df_combined = df_combined.drop_duplicates()
+        tables[table_name] = df_combined[column_list + table_spec["categories"]]
 
-def make_and_write_3a(wb: openpyxl.Workbook) -> openpyxl.Workbook:
-    breakdowns_set = {
-        "national_count_by_appt_status",
-        "by_ccg_and_appt_status",
-        "by_stp_and_appt_status",
-        "by_region_and_appt_status",
-    }
-    appointments_pivot = "appt_status"
-    pivoted_column_list = [
-        "Attended",
-        "DNA",
-        "Unknown",
-    ]
-    df = combine_appts_with_practices(
-        breakdowns_set=breakdowns_set,
-        appointments_pivot=appointments_pivot,
-        pivoted_column_list=pivoted_column_list,
+    return tables
+
+
+def make_geography_tables(sheet_names: list = None) -> Dict[str, pd.DataFrame]:
+    """
+    Makes any of the geography tables, 3a to 3d, together, using combine_geography_tables().
+
+    Args:
+        sheet_names (list, optional): The tables to make, from `geography_tables`. Defaults to all of them.
+
+    Returns:
+        Dict[str, pd.DataFrame]: The tables, by sheet name, with their columns in the same order as the template
+    """
+    sheet_names = list(geography_tables) if sheet_names is None else sheet_names
+    return combine_geography_tables(
+        {sheet_name: geography_tables[sheet_name] for sheet_name in sheet_names}
     )
 
-    wb = write_table_to_sheet(wb=wb, sheet_name="Table 3a", table_data=df)
+
+def get_geography_sheets_read(sheet_names: list) -> Tuple[list, list]:
+    """
+    Gives the breakdowns and columns of the appointments data which make_geography_tables() reads for the given tables.
+    """
+    return get_geography_tables_read({sheet_name: geography_tables[sheet_name] for sheet_name in sheet_names})
+
+
+def combine_appts_with_practices(
+    breakdowns_set: set, appointments_pivot: str, pivoted_column_list: List[str]
+) -> pd.DataFrame:
+    """
+    Summary: For some sheets, we want data from two different sources; 'appointments' and 'practices'.
+    Ultimately we want to display the data from these indexed by geography. This function loads these two sources in and
+    joins them in the desired way, using combine_geography_tables(). 
+
+    Args:
+        breakdowns_set (set): Set of relevant breakdowns to include
+        appointments_pivot (str): Column of categorical data: the values of this column will correspond to the column headings in the Excel
+        pivoted_column_list (List[str]): The ordered list of column headings: these ought to match the order of headings in the Excel
+
+    Returns:
+        pd.DataFrame: The combined dataframe, joined by geography, and sorted according to the size of geographic region. 
+    """
+    table_spec = {
+        "breakdowns": sorted(breakdowns_set),
+        "column": appointments_pivot,
+        "categories": pivoted_column_list,
+    }
+    return combine_geography_tables({"table": table_spec})["table"]
+
+
+def make_table_3a() -> pd.DataFrame:
+    """
+    Makes the table for sheet '3a', using make_geography_tables().
+
+    Returns:
+        pd.DataFrame: The table, with its columns in the same order as the template
+    """
+    return make_geography_tables(["Table 3a"])["Table 3a"]
+
+
+def make_and_write_3a(wb: openpyxl.Workbook) -> openpyxl.Workbook:
+    """
+    Writes sheet '3a' to the workbook. Loads in data and does some basic organising first.
+
+    Args:
+        wb (openpyxl.Workbook): The workbook loaded from template
+
+    Returns:
+        openpyxl.Workbook: The workbook, with the sheet written.
+    """
+    wb = write_table_to_sheet(
+        wb=wb, sheet_name="Table 3a", table_data=make_table_3a()
+    )
     return wb
 
 
+def make_table_3b() -> pd.DataFrame:
+    """
+    Makes the table for sheet '3b', using make_geography_tables().
+
+    Returns:
+        pd.DataFrame: The table, with its columns in the same order as the template
+    """
+    return make_geography_tables(["Table 3b"])["Table 3b"]
+
+
 def make_and_write_3b(wb: openpyxl.Workbook) -> openpyxl.Workbook:
     """
     Writes sheet '3b' to the workbook. Loads in data and does some basic organising first. 
@@ -424,28 +1105,20 @@ def make_and_write_3b(wb: openpyxl.Workbook) -> openpyxl.Workbook:
     Returns:
         openpyxl.Workbook: The workbook, with the sheet written.
     """    
+    wb = write_table_to_sheet(
+        wb=wb, sheet_name="Table 3b", table_data=make_table_3b()
+    )
+    return wb
 
-    breakdowns_set = {
-        "national_count_by_hcp_type",
-        "by_ccg_and_hcp_type",
-        "by_stp_and_hcp_type",
-        "by_region_and_hcp_type",
-    }
 
-    appointments_pivot = "hcp_type"
-    pivoted_column_list = [
-        "GP",
-        "Other Practice Staff",
-        "Unknown",
-    ]
-    df = combine_appts_with_practices(
-        breakdowns_set=breakdowns_set,
-        appointments_pivot=appointments_pivot,
-        pivoted_column_list=pivoted_column_list,
-    )
+def make_table_3c() -> pd.DataFrame:
+    """
+    Makes the table for sheet '3c', using make_geography_tables().
 
-    wb = write_table_to_sheet(wb=wb, sheet_name="Table 3b", table_data=df)
-    return wb
+    Returns:
+        pd.DataFrame: The table, with its columns in the same order as the template
+    """
+    return make_geography_tables(["Table 3c"])["Table 3c"]
 
 
 def make_and_write_3c(wb: openpyxl.Workbook) -> openpyxl.Workbook:
@@ -458,31 +1131,22 @@ def make_and_write_3c(wb: openpyxl.Workbook) -> openpyxl.Workbook:
     Returns:
         openpyxl.Workbook: The workbook, with the sheet written.
     """    
-    breakdowns_set = {
-        "national_count_by_appt_mode",
-        "by_ccg_and_appt_mode",
-        "by_stp_and_appt_mode",
-        "by_region_and_appt_mode",
-    }
-
-    appointments_pivot = "appt_mode"
-    pivoted_column_list = [
-        "Face-to-Face",
-        "Home Visit",
-        "Telephone",
-        "Video/Online",
-        "Unknown",
-    ]
-    df = combine_appts_with_practices(
-        breakdowns_set=breakdowns_set,
-        appointments_pivot=appointments_pivot,
-        pivoted_column_list=pivoted_column_list,
+    wb = write_table_to_sheet(
+        wb=wb, sheet_name="Table 3c", table_data=make_table_3c()
     )
-
-    wb = write_table_to_sheet(wb=wb, sheet_name="Table 3c", table_data=df)
     return wb
 
 
+def make_table_3d() -> pd.DataFrame:
+    """
+    Makes the table for sheet '3d', using make_geography_tables().
+
+    Returns:
+        pd.DataFrame: The table, with its columns in the same order as the template
+    """
+    return make_geography_tables(["Table 3d"])["Table 3d"]
+
+
 def make_and_write_3d(wb: openpyxl.Workbook) -> openpyxl.Workbook:
     """
     Writes sheet '3d' to the workbook. Loads in data and does some basic organising first. 
@@ -493,56 +1157,38 @@ def make_and_write_3d(wb: openpyxl.Workbook) -> openpyxl.Workbook:
     Returns:
         openpyxl.Workbook: The workbook, with the sheet written.
     """    
-    breakdowns_set = {
-        "national_count_by_time_between_booking_and_appt",
-        "by_ccg_and_time_between_booking_and_appt",
-        "by_stp_and_time_between_booking_and_appt",
-        "by_region_and_time_between_booking_and_appt",
-    }
-
-    appointments_pivot = "time_between_booking_and_appt"
-    pivoted_column_list = [
-        "Same Day",
-        "1 Day",
-        "2 to 7 Days",
-        "8 to 14 Days",
-        "15 to 21 Days",
-        "22 to 28 Days",
-        "More than 28 Days",
-        "Unknown / Data Quality",
-    ]
-    df = combine_appts_with_practices(
-        breakdowns_set=breakdowns_set,
-        appointments_pivot=appointments_pivot,
-        pivoted_column_list=pivoted_column_list,
+    wb = write_table_to_sheet(
+        wb=wb, sheet_name="Table 3d", table_data=make_table_3d()
     )
-
-    wb = write_table_to_sheet(wb=wb, sheet_name="Table 3d", table_data=df)
     return wb
 
 
-def make_and_write_3e(wb: openpyxl.Workbook) -> openpyxl.Workbook:
-    """
-    Writes sheet '3e' to the workbook. Loads in data and does some basic organising first. 
+# The breakdowns and columns of the appointments data read by make_table_3e() and make_table_4()
+table_3e_read = (["by_ccg_and_appt_mode"], ["appt_mode", "geog_name", "geog_code", "geog_ons_code"])
+table_4_read = (["national_count", "by_region", "by_stp", "by_ccg"], ["geog_code", "geog_ons_code", "geog_name"])
 
-    Args:
-        wb (openpyxl.Workbook): The workbook loaded from template
+
+def make_table_3e() -> pd.DataFrame:
+    """
+    Makes the table for sheet '3e'. Loads in data and does some basic organising first.
 
     Returns:
-        openpyxl.Workbook: The workbook, with the sheet written.
-    """    
+        pd.DataFrame: The table, with its columns in the same order as the template
+    """
 
     # Ingest the data
-    df_appts = config.get_appointments_data()
+    df_appts = config.get_appointments_data(breakdowns=table_3e_read[0], columns=table_3e_read[1])
 
     # Prepare the practices data
-    df_list_size = df_list_size[
-        ["geog_ons_code", "open_practice_count", "included_practice_count"]
-    ]
-    df_list_size = df_list_size.set_index("geog_ons_code")
+    df_list_size = get_practices_by_geography()[["count_of_open_practice", "count_of_included_practice"]]
+    df_list_size = df_list_size.rename(
+        columns={
+            "count_of_open_practice": "open_practice_count",
+            "count_of_included_practice": "included_practice_count",
+        }
+    )
 
     # Prepare the appointments data
-    df_appts = df_appts[df_appts["breakdown"] == "by_ccg_and_appt_mode"]
     df_appts = df_appts[
         [
             "appt_mode",
@@ -552,17 +1198,16 @@ def make_and_write_3e(wb: openpyxl.Workbook) -> openpyxl.Workbook:
             "appt_count",
         ]
     ]
-    df_geogs = df_appts[["geog_name", "geog_code", "geog_ons_code"]].set_index(
+    df_geogs = df_appts[["geog_name", "geog_code", "geog_ons_code"]].drop_duplicates().set_index(
         "geog_ons_code"
     )
-    df_appts = df_appts.pivot_table(
-        index="geog_ons_code",
-        columns="appt_mode",
-        values="appt_count",
-    ).fillna(0)
-    df_appts["total"] = df_appts.sum(axis=1)
-    df_appts = df_appts.reset_index(level=0)
-    df_appts = df_appts.set_index("geog_ons_code")
+    df_appts = sum_by_category(
+        df_appts,
+        "geog_ons_code",
+        "appt_mode",
+        geography_tables["Table 3c"]["categories"],
+        total_column="total",
+    )
     df_appts = df_appts.join(df_geogs, how="inner")
 
     # Combine the appointments and practices data
@@ -587,15 +1232,12 @@ def make_and_write_3e(wb: openpyxl.Workbook) -> openpyxl.Workbook:
             "Unknown",
         ]
     ]
-
-    # Write the data to sheet
-    wb = write_table_to_sheet(wb=wb, sheet_name="Table 3e", table_data=df_combined)
-    return wb
+    return df_combined
 
 
-def make_and_write_table_4(wb: openpyxl.Workbook) -> openpyxl.Workbook:    
+def make_and_write_3e(wb: openpyxl.Workbook) -> openpyxl.Workbook:
     """
-    Writes sheet '4' to the workbook. Loads in data and does some basic organising first. 
+    Writes sheet '3e' to the workbook. Loads in data and does some basic organising first. 
 
     Args:
         wb (openpyxl.Workbook): The workbook loaded from template
@@ -603,18 +1245,24 @@ def make_and_write_table_4(wb: openpyxl.Workbook) -> openpyxl.Workbook:
     Returns:
         openpyxl.Workbook: The workbook, with the sheet written.
     """    
+    wb = write_table_to_sheet(
+        wb=wb, sheet_name="Table 3e", table_data=make_table_3e()
+    )
+    return wb
+
 
-    df_appts = config.get_appointments_data()
+def make_table_4() -> pd.DataFrame:
+    """
+    Makes the table for sheet '4'. Loads in data and does some basic organising first.
+
+    Returns:
+        pd.DataFrame: The table, with its columns in the same order as the template
+    """
+
+    df_appts = config.get_appointments_data(breakdowns=table_4_read[0], columns=table_4_read[1])
     df_prac_data = config.get_practices_data()
 
     # Prepare the appointments data
-    t4_set = {
-        "national_count",
-        "by_region",
-        "by_stp",
-        "by_ccg",
-    }
-    df_appts = df_appts[df_appts["breakdown"].isin(t4_set)]
     df_appts = df_appts[["geog_code", "geog_ons_code", "geog_name", "appt_count"]]
 
     # Prepare list size data
@@ -625,11 +1273,7 @@ def make_and_write_table_4(wb: openpyxl.Workbook) -> openpyxl.Workbook:
     df_combined.reset_index(inplace=True)
 
     # Sort and format the data
-    custom_dict = {'National': 0, 'Region': 1, 'STP': 2, 'CCG': 3}
-    df_combined['rank'] = df_combined['geog_type'].map(custom_dict)
-
-    df_combined.sort_values(by=['rank', 'geog_code'], ascending = [True, True], inplace=True)
-    df_combined.drop(columns = ['rank'], inplace=True)
+    df_combined = geography.sort_by_geography(df_combined)
 
     df_combined["filler_col"] = ""
     column_list = [
@@ -642,14 +1286,12 @@ def make_and_write_table_4(wb: openpyxl.Workbook) -> openpyxl.Workbook:
         "patient_list_size"
     ] 
     df_combined = df_combined[column_list]
-
-    wb = write_table_to_sheet(wb=wb, sheet_name="Table 4", table_data=df_combined)
-    return wb
+    return df_combined
 
 
-def make_and_write_table_5(wb: openpyxl.Workbook) -> openpyxl.Workbook:
+def make_and_write_table_4(wb: openpyxl.Workbook) -> openpyxl.Workbook:    
     """
-    Writes sheet 5 to the workbook. Loads in data and does some basic organising first. 
+    Writes sheet '4' to the workbook. Loads in data and does some basic organising first. 
 
     Args:
         wb (openpyxl.Workbook): The workbook loaded from template
@@ -657,6 +1299,19 @@ def make_and_write_table_5(wb: openpyxl.Workbook) -> openpyxl.Workbook:
     Returns:
         openpyxl.Workbook: The workbook, with the sheet written.
     """    
+    wb = write_table_to_sheet(
+        wb=wb, sheet_name="Table 4", table_data=make_table_4()
+    )
+    return wb
+
+
+def make_table_5() -> pd.DataFrame:
+    """
+    Makes the table for sheet '5'. Loads in data and does some basic organising first.
+
+    Returns:
+        pd.DataFrame: The table, with its columns in the same order as the template
+    """
 
     table1_data = config.get_table1_data()
     list_of_months = get_list_of_months()
@@ -676,12 +1331,275 @@ def make_and_write_table_5(wb: openpyxl.Workbook) -> openpyxl.Workbook:
     
     # Merge data on month
     df_table_5 = df_weekday_appts.merge(df_coverage, how = 'inner', on = 'month')
-    
-    wb = write_table_to_sheet(wb=wb, sheet_name="Table 5", table_data=df_table_5)
+    return df_table_5
+
 
+def make_and_write_table_5(wb: openpyxl.Workbook) -> openpyxl.Workbook:
+    """
+    Writes sheet 5 to the workbook. Loads in data and does some basic organising first. 
+
+    Args:
+        wb (openpyxl.Workbook): The workbook loaded from template
+
+    Returns:
+        openpyxl.Workbook: The workbook, with the sheet written.
+    """    
+    wb = write_table_to_sheet(
+        wb=wb, sheet_name="Table 5", table_data=make_table_5()
+    )
     return wb
 
 
+# region TABLE PIPELINE
+# Workbooks are built in two phases. First every table is made, by the make_table functions above, which only read
+# data and return a dataframe; as they don't touch the workbook, any number of them can run at once.
+# Then the finished tables are written to the workbook, one sheet at a time.
+
+table_makers = {
+    "Easy A": make_table_easy_a,
+    "Easy B": make_table_easy_b,
+    "Table 2a": make_table_2a,
+    "Table 2b": make_table_2b,
+    "Table 2c": make_table_2c,
+    "Table 2d": make_table_2d,
+    "Table 3a": make_table_3a,
+    "Table 3b": make_table_3b,
+    "Table 3c": make_table_3c,
+    "Table 3d": make_table_3d,
+    "Table 3e": make_table_3e,
+    "Table 4": make_table_4,
+    "Table 5": make_table_5,
+}
+
+
+# The read of the appointments data, as (breakdowns, columns), which each table in `table_makers` makes when it's made by
+# itself, by sheet name. Tables in `table_groups` give their reads with the group's "get_read" function instead.
+# prepare_tables() plans these reads ahead (see get_appointments_reads()), so every table which reads the appointments
+# data with config.get_appointments_data(breakdowns, columns) needs listing here or in its group.
+table_reads = {
+    "Table 3e": table_3e_read,
+    "Table 4": table_4_read,
+}
+
+
+# Groups of tables which share their data, each with the function which makes any set of its tables at once, and the
+# function which gives the reads of the appointments data that makes. When more than one table from a group is wanted,
+# prepare_tables() makes them together, rather than each with its own maker from `table_makers`.
+table_groups = {
+    "daily": {
+        "tables": daily_tables,
+        "make_tables": make_daily_tables,
+        "get_read": get_daily_tables_read,
+    },
+    "geography": {
+        "tables": geography_tables,
+        "make_tables": make_geography_tables,
+        "get_read": get_geography_sheets_read,
+    },
+}
+
+
+def make_single_table(sheet_name: str, make_table: Callable) -> Dict[str, object]:
+    return {sheet_name: make_table()}
+
+
+def get_table_tasks(makers: Dict[str, Callable]) -> Dict[Tuple[str, ...], Callable]:
+    """
+    Works out how to make a set of tables. The tables wanted from each of `table_groups` are made together, as long as
+    their makers are the ones in `table_makers`; every other table is made by itself.
+
+    Args:
+        makers (Dict[str, Callable]): The function which makes each table, by sheet name
+
+    Returns:
+        Dict[Tuple[str, ...], Callable]: The function which makes each set of tables, returning them by sheet name,
+            keyed by the sheet names it makes. These are module-level, so can be sent to a worker process.
+    """
+    tasks = {}
+    group_sheets = {}
+    for sheet_name, make_table in makers.items():
+        group_name = next(
+            (
+                group_name
+                for group_name, group in table_groups.items()
+                if sheet_name in group["tables"] and make_table is table_makers.get(sheet_name)
+            ),
+            None,
+        )
+        if group_name is None:
+            tasks[(sheet_name,)] = functools.partial(make_single_table, sheet_name, make_table)
+        else:
+            group_sheets.setdefault(group_name, []).append(sheet_name)
+    for group_name, sheet_names in group_sheets.items():
+        tasks[tuple(sheet_names)] = functools.partial(table_groups[group_name]["make_tables"], sheet_names)
+    return tasks
+
+
+def get_appointments_reads(sheet_sets: list, makers: Dict[str, Callable]) -> list:
+    """
+    Lists the reads of the appointments data which the given sets of sheets make, as (breakdowns, columns), so that
+    they can be planned with config.plan_appointments_reads() and, with chunked reading on, gathered in one pass.
+    The reads come from `table_groups` and `table_reads`, so are only known for the makers in `table_makers`.
+
+    Args:
+        sheet_sets (list): The sheet names of each set of tables made together, as from get_table_tasks()
+        makers (Dict[str, Callable]): The function which makes each table, by sheet name
+    """
+    reads = []
+    for sheet_names in sheet_sets:
+        if not all(makers[sheet_name] is table_makers.get(sheet_name) for sheet_name in sheet_names):
+            continue
+        group = next(
+            (group for group in table_groups.values() if all(name in group["tables"] for name in sheet_names)),
+            None,
+        )
+        if group is not None:
+            reads.append(group["get_read"](list(sheet_names)))
+        else:
+            reads += [table_reads[sheet_name] for sheet_name in sheet_names if sheet_name in table_reads]
+    return reads
+
+
+def run_table_maker(make_tables: Callable) -> Tuple[Dict[str, object], dict, dict]:
+    """
+    Makes a set of tables, measuring how long it takes and recording the data it reads.
+    This is module-level so that it can be sent to a worker process.
+
+    Args:
+        make_tables (Callable): The function which makes the tables, returning them by sheet name
+
+    Returns:
+        Tuple[Dict[str, object], dict, dict]: The tables, the record of making them from instrumentation.measure_stage()
+            (which hasn't been added to the run report), and the data they read, as recorded by config.record_data_inputs()
+    """
+    with config.record_data_inputs() as data_inputs:
+        with instrumentation.measure_stage("make_table", add_to_report=False) as stage:
+            tables = make_tables()
+            sizes = [instrumentation.count_cells(table) for table in tables.values()]
+            stage["rows"], stage["cells"] = sum(rows for rows, _ in sizes), sum(cells for _, cells in sizes)
+    return tables, stage, data_inputs
+
+
+def prepare_tables(
+    makers: Dict[str, Callable],
+    workers: int = None,
+    use_processes: bool = None,
+    data_inputs: dict = None,
+) -> Tuple[Dict[str, object], Dict[str, float]]:
+    """
+    Makes a set of tables, several at once if there is more than one worker. Tables which share their data are made
+    together (see get_table_tasks()), and share the time it took equally between them.
+
+    Args:
+        makers (Dict[str, Callable]): The function which makes each table, by sheet name
+        workers (int, optional): The number of tables to make at once. Defaults to config.get_table_workers().
+        use_processes (bool, optional): Whether to make the tables in worker processes rather than threads.
+            Defaults to whether config.get_table_executor() is 'process'.
+        data_inputs (dict, optional): If given, the data each table read is added to this, by sheet name.
+
+    Returns:
+        Tuple[Dict[str, object], Dict[str, float]]: The tables, and the number of seconds each took to make,
+            both by sheet name and in the same order as `makers`
+    """
+    workers = config.get_table_workers() if workers is None else workers
+    if use_processes is None:
+        use_processes = config.get_table_executor() == "process"
+    tasks = get_table_tasks(makers)
+    config.plan_appointments_reads(get_appointments_reads(list(tasks), makers))
+
+    if workers <= 1 or len(tasks) <= 1:
+        results = {sheet_names: run_table_maker(make_tables) for sheet_names, make_tables in tasks.items()}
+    else:
+        executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+        with executor_class(max_workers=min(workers, len(tasks))) as executor:
+            futures = {
+                sheet_names: executor.submit(run_table_maker, make_tables)
+                for sheet_names, make_tables in tasks.items()
+            }
+            results = {sheet_names: future.result() for sheet_names, future in futures.items()}
+
+    made_tables, timings = {}, {}
+    for sheet_names, (task_tables, stage, inputs) in results.items():
+        stage["sheet_name"] = ", ".join(sheet_names)
+        instrumentation.add_stage(stage)
+        for sheet_name in sheet_names:
+            made_tables[sheet_name] = task_tables[sheet_name]
+            timings[sheet_name] = stage["seconds"] / len(sheet_names)
+            if data_inputs is not None:
+                data_inputs[sheet_name] = inputs
+    tables = {sheet_name: made_tables[sheet_name] for sheet_name in makers}
+    timings = {sheet_name: timings[sheet_name] for sheet_name in makers}
+    return tables, timings
+
+
+def load_template(template_path: Path) -> openpyxl.Workbook:
+    with instrumentation.measure_stage("load_template"):
+        if config.use_template_cache():
+            return template_cache.load_template(template_path)
+        return openpyxl.load_workbook(template_path)
+
+
+def start_loading_template(template_path: Path) -> Callable[[], openpyxl.Workbook]:
+    """
+    Starts loading a template with openpyxl in a background thread, so that it is parsed while the tables are made.
+    This is only done with config.load_template_in_background() and the openpyxl output engine on, and outside
+    incremental builds, which may not need the template at all; otherwise the template is loaded when it's asked for.
+
+    Args:
+        template_path (Path): The template to load
+
+    Returns:
+        Callable[[], openpyxl.Workbook]: Gives the loaded workbook, waiting for it to finish loading if need be. It can
+            only be called once, as the workbook is written to.
+    """
+    if not (
+        config.load_template_in_background()
+        and config.get_output_engine() == "openpyxl"
+        and not config.use_incremental_build()
+    ):
+        return lambda: load_template(template_path)
+
+    executor = ThreadPoolExecutor(max_workers=1)
+    future = executor.submit(load_template, template_path)
+    executor.shutdown(wait=False)
+
+    def wait_for_template() -> openpyxl.Workbook:
+        with instrumentation.measure_stage("wait_for_template"):
+            return future.result()
+
+    return wait_for_template
+
+
+def write_tables(wb: openpyxl.Workbook, tables: Dict[str, pd.DataFrame]) -> openpyxl.Workbook:
+    """
+    Writes a set of finished tables to their sheets, in order
+
+    Args:
+        wb (openpyxl.Workbook): The workbook loaded from template
+        tables (Dict[str, pd.DataFrame]): The tables to write, by sheet name
+
+    Returns:
+        openpyxl.Workbook: The workbook, with the tables written
+    """
+    for sheet_name, table_data in tables.items():
+        wb = write_table_to_sheet(wb=wb, sheet_name=sheet_name, table_data=table_data)
+    return wb
+
+
+def print_table_timings(project_name: str, timings: Dict[str, float]) -> None:
+    """
+    Prints how long each table took to make, slowest first
+
+    Args:
+        project_name (str): The project the tables belong to
+        timings (Dict[str, float]): The number of seconds each table took to make, by sheet name
+    """
+    print(f"{project_name}: time taken to make each table")
+    for sheet_name, seconds in sorted(timings.items(), key=lambda item: item[1], reverse=True):
+        print(f"    {sheet_name}: {seconds:.3f}s")
+    return None
+
+
 def find_cell_by_tag(
     wb: openpyxl.Workbook, sheet: openpyxl.worksheet, tag: str
 ) -> Tuple:
@@ -696,16 +1614,7 @@ def find_cell_by_tag(
     Returns:
         index of cell containing tag
     """
-    max_search = 1000
-    ws = wb[sheet]
-    iter = 0
-    while iter <= max_search:
-        for row in ws.iter_rows():
-            for cell in row:
-                iter += 1
-                if cell.value == tag:
-                    return openpyxl.utils.cell.coordinate_to_tuple(cell.coordinate)
-    return None
+    return lookup_tag(ws=wb[sheet], tag=tag)
 
 
 # This is a style which can be useful when encountering formatting conflicts. Not currently in use but worth keeping